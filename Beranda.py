@@ -1,14 +1,17 @@
 # Beranda.py
 import streamlit as st
 import plotly.express as px
+from datetime import datetime, timezone, timedelta
 
 # Impor semua fondasi dari utils
 from utils.config import config
-from utils.database import get_history_df
-from utils.layout import apply_global_styles, render_page_header, render_sidebar_footer, section_divider, render_summary_dashboard
+from utils.database import get_history_change_token, cached_rollup_timeseries, cached_rollup_counts
+from utils.aggregates import cached_dashboard_aggregates
+from utils.layout import apply_global_styles, render_page_header, render_sidebar_footer, section_divider, render_summary_dashboard, render_trend_dashboard
 from utils.segmentation import load_segmentation_model
 from utils.classification import load_classification_model
-from utils.system import cleanup_temp_files
+from utils.system import get_temp_janitor
+from utils.retention import get_retention_worker
 
 # --- 1. Konfigurasi Halaman & Inisialisasi ---
 
@@ -18,8 +21,10 @@ st.set_page_config(
     layout="wide"
 )
 
-# Jalankan fungsi pembersihan file sementara saat aplikasi dimulai
-cleanup_temp_files(age_hours=1)
+# Mulai pembersih folder temp di latar (sekali per proses, bukan di setiap rerun)
+get_temp_janitor()
+# Mulai retensi arsip bertingkat di latar (sekali per proses, laju I/O dibatasi)
+get_retention_worker()
 
 # Terapkan semua gaya dan komponen layout
 apply_global_styles()
@@ -90,5 +95,26 @@ for i in range(0, len(nav_items), 2):
                 """, unsafe_allow_html=True)
 
 # --- 3. Dasbor Statistik dari Database ---
-df_history = get_history_df()
-render_summary_dashboard(df_history, title="Dasbor Statistik Analisis Keseluruhan")
\ No newline at end of file
+# Token perubahan riwayat: agregat & grafik hanya dihitung ulang jika ada entri baru/terhapus
+history_token = get_history_change_token()
+render_summary_dashboard(cached_dashboard_aggregates(history_token), title="Dasbor Statistik Analisis Keseluruhan")
+
+# --- 4. Tren Waktu dari Tabel Rollup ---
+section_divider("Tren Tutupan Awan", "📉")
+granularity_options = {"Per Menit": "minute", "Per Jam": "hour", "Per Hari": "day"}
+range_options = {"24 Jam Terakhir": timedelta(hours=24), "7 Hari Terakhir": timedelta(days=7),
+                 "30 Hari Terakhir": timedelta(days=30), "Semua Waktu": None}
+col_granularity, col_range = st.columns(2)
+with col_granularity:
+    granularity_label = st.selectbox("Resolusi waktu:", list(granularity_options.keys()), index=1)
+with col_range:
+    range_label = st.selectbox("Rentang waktu:", list(range_options.keys()), index=1)
+
+# Timestamp analisis disimpan dalam waktu lokal UTC+7, jadi batas awal dihitung di zona yang sama
+range_delta = range_options[range_label]
+range_start = (datetime.now(timezone(timedelta(hours=7))) - range_delta).strftime('%Y-%m-%dT%H:%M') if range_delta else None
+granularity = granularity_options[granularity_label]
+render_trend_dashboard(
+    cached_rollup_timeseries(history_token, granularity=granularity, start=range_start),
+    cached_rollup_counts(history_token, dimension="okta", granularity=granularity, start=range_start)
+)
@@ -8,6 +8,8 @@ import tempfile
 import subprocess
 import time
 import pandas as pd
+from concurrent.futures import wait
+from functools import partial
 from PIL import Image
 from datetime import datetime, timezone, timedelta
 from streamlit_drawable_canvas import st_canvas
@@ -15,14 +17,20 @@ from typing import List, Dict, Any, IO, Tuple
 
 # Impor semua fondasi dari utils
 from utils.config import config
-from utils.database import add_history_entry, find_history, get_pipeline_version_hash
+from utils.database import add_history_entry, find_history_many, get_pipeline_version_hash
+from utils.aggregates import compute_aggregates_from_df
 from utils.layout import apply_global_styles, render_page_header, render_sidebar_footer, section_divider, render_result, render_summary_dashboard
 from utils.media import extract_media_from_zip, load_demo_files, fetch_media_from_url, get_preview_as_pil, get_video_metadata 
 from utils.processing import get_file_hash, get_analysis_hash, analyze_single_image, create_enhanced_overlay
-from utils.segmentation import load_segmentation_model, canvas_to_mask
+from utils.segmentation import load_segmentation_model, canvas_to_roi_geometry
 from utils.classification import load_classification_model
 from utils.download import download_controller
-from utils.system import cleanup_temp_files
+from utils.system import get_temp_janitor
+from utils.blobstore import store_blob_from_file, link_blob
+from utils.artifacts import get_artifact_extension, submit_artifact, submit_mask, submit_original_image, flush_artifacts, flush_then
+from utils.thumbnails import get_upload_thumbnail, get_result_thumbnail
+from utils.display import get_result_display
+from utils.storage import publish_artifacts
 
 # --- Fungsi Helper Spesifik Halaman ---
 def _find_executable(name: str) -> str:
@@ -54,6 +62,8 @@ if "video_previews" not in st.session_state:
     st.session_state.video_previews = {}
 if "video_durations" not in st.session_state:
     st.session_state.video_durations = {}
+if "file_hashes" not in st.session_state:
+    st.session_state.file_hashes = {} # id(berkas di antrean) -> SHA-256, dihitung sekali saat berkas masuk
 if "processed_urls" not in st.session_state:
     st.session_state.processed_urls = set()
 if "staged_url_items" not in st.session_state:
@@ -65,8 +75,8 @@ if st.session_state.toast_message:
     st.toast(message, icon=icon)
     st.session_state.toast_message = None # Hapus setelah ditampilkan
  
-# Panggil pembersihan, terapkan layout, muat model
-cleanup_temp_files()
+# Mulai pembersih temp di latar, terapkan layout, muat model
+get_temp_janitor()
 apply_global_styles()
 render_sidebar_footer()
 @st.cache_resource
@@ -102,9 +112,19 @@ section_divider("Langkah 1: Unggah Citra Langit", "📤")
 
 seed = st.session_state.widget_seed
 
+def get_queued_file_hash(file: IO[bytes]) -> str:
+    """
+    Hash konten berkas di antrean dari session state. Berkas dihash sekali saat masuk antrean
+    (bisa hingga 200 MB), bukan di setiap rerun.
+    """
+    file_hash = st.session_state.file_hashes.get(id(file))
+    if file_hash is None:
+        file_hash = st.session_state.file_hashes[id(file)] = get_file_hash(file)
+    return file_hash
+
 def add_files_to_queue(files_to_add: List[IO[bytes]]):
     """Callback terpusat untuk menambahkan file ke antrean dengan aman dan anti-duplikat."""
-    current_hashes = {get_file_hash(f) for f in st.session_state.files_to_process}
+    current_hashes = {get_queued_file_hash(f) for f in st.session_state.files_to_process}
     added_count = 0
     duplicate_count = 0 # Tambahkan penghitung duplikat
 
@@ -125,8 +145,12 @@ def add_files_to_queue(files_to_add: List[IO[bytes]]):
                     preview, duration = get_video_metadata(file)
                     st.session_state.video_previews[file_hash] = preview
                     st.session_state.video_durations[file_hash] = duration
+                else:
+                    # Thumbnail antrean dibuat sekali saat berkas masuk, bukan di setiap rerun
+                    get_upload_thumbnail(file, file_hash)
                 
                 st.session_state.files_to_process.append(file)
+                st.session_state.file_hashes[id(file)] = file_hash
                 current_hashes.add(file_hash)
                 added_count += 1
             else:
@@ -145,7 +169,7 @@ def remove_file_from_queue(index_to_remove):
     """
     # Ambil file yang akan dihapus dari antrean utama
     file_to_remove = st.session_state.files_to_process.pop(index_to_remove)
-    file_hash_to_del = get_file_hash(file_to_remove)
+    file_hash_to_del = st.session_state.file_hashes.pop(id(file_to_remove), None)
     
     # Hapus data terkait (konfigurasi dan pratinjau video)
     st.session_state.configurations.pop(file_to_remove.name, None)
@@ -157,6 +181,7 @@ def remove_file_from_queue(index_to_remove):
 def clear_queue():
     """Menghapus semua file dari antrean dan state terkait."""
     st.session_state.files_to_process.clear()
+    st.session_state.file_hashes.clear()
     st.session_state.configurations.clear()
     st.session_state.video_previews.clear()
     st.session_state.processed_urls.clear()
@@ -343,7 +368,7 @@ else:
                         if is_video:
                             st.video(file)
                         else:
-                            st.image(file, use_container_width=True)
+                            st.image(get_upload_thumbnail(file, get_queued_file_hash(file)) or file, use_container_width=True)
                     except Exception as e:
                         st.warning(f"⚠️ Gagal menampilkan pratinjau.")
                     
@@ -353,7 +378,7 @@ else:
                     with col_action:
                         st.button(
                             "🗑️",
-                            key=f"del_{get_file_hash(file)}",
+                            key=f"del_{get_queued_file_hash(file)}",
                             on_click=remove_file_from_queue,
                             args=(i,),
                             use_container_width=True,
@@ -431,7 +456,7 @@ if st.session_state.files_to_process:
                 )
                 
                 if is_video:
-                    file_hash = get_file_hash(file)
+                    file_hash = get_queued_file_hash(file)
                     
                     # Ambil durasi dari state, beri nilai default 60 jika tidak ada
                     max_duration = st.session_state.video_durations.get(file_hash, 60.0)
@@ -462,7 +487,7 @@ if st.session_state.files_to_process:
                     # Dapatkan background image langsung dari session_state atau file
                     is_video = file.name.lower().endswith(tuple(config['analysis']['video_extensions']))
                     if is_video:
-                        bg_image = st.session_state.video_previews.get(get_file_hash(file))
+                        bg_image = st.session_state.video_previews.get(get_queued_file_hash(file))
                     else:
                         file.seek(0)
                         bg_image = Image.open(file)
@@ -507,9 +532,23 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
     # Hapus semua hasil sebelumnya saat analisis baru dimulai
     st.session_state.analysis_results = []
     analysis_start_time = time.time()
-    files_to_run = st.session_state.files_to_process.copy()
 
-    # Pra-Kalkulasi Total Langkah Analisis
+    # Pisahkan antrean menjadi berkas yang sudah ada di cache dan yang perlu dianalisis (satu query batch).
+    # Rencana ini hanya disusun saat tombol ditekan, bukan di setiap rerun.
+    pipeline_hash = get_pipeline_version_hash()
+    queue_plan = []
+    for file in st.session_state.files_to_process:
+        file_config = st.session_state.configurations.get(file.name, {'roi_method': 'Otomatis', 'interval': 5, 'canvas': None})
+        file_hash = get_queued_file_hash(file)
+        queue_plan.append((file, file_config, file_hash, get_analysis_hash(file_hash, pipeline_hash, file_config)))
+    cached_results = find_history_many([plan[3] for plan in queue_plan])
+
+    if cached_results:
+        num_cached = sum(1 for plan in queue_plan if plan[3] in cached_results)
+        st.info(f"🗄️ {num_cached} dari {len(queue_plan)} berkas sudah pernah dianalisis dan akan diambil dari cache. Hanya {len(queue_plan) - num_cached} berkas yang akan diproses.")
+    files_to_run = [plan[0] for plan in queue_plan if plan[3] not in cached_results]
+
+    # Pra-Kalkulasi Total Langkah Analisis (hanya untuk berkas yang benar-benar dianalisis)
     total_steps = 0
     with st.spinner("Menghitung total langkah analisis..."):
         for file in files_to_run:
@@ -539,24 +578,15 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
     # Eksekusi Analisis dengan Progress Bar yang Akurat
     progress_bar = st.progress(0, "⏳ Memulai analisis...")
     step_counter = 0
-    pipeline_hash = get_pipeline_version_hash()
+    total_steps = max(1, total_steps)
     newly_analyzed_results = []
+    pending_writes = [] # Future dari thread penulis database
+    display_futures = [] # Future pembuatan turunan tampilan untuk kartu hasil
     
-    for i, file in enumerate(files_to_run):
-        # (Logika hash dan cek cache tetap sama)
-        file_config = st.session_state.configurations.get(file.name, {'roi_method': 'Otomatis', 'interval': 5, 'canvas': None})
-        file_hash = get_file_hash(file)
-        analysis_hash = get_analysis_hash(file_hash, pipeline_hash, file_config)
-
-        cached_result = find_history(analysis_hash)
+    for file, file_config, file_hash, analysis_hash in queue_plan:
+        cached_result = cached_results.get(analysis_hash)
         if cached_result:
-            # Jika dari cache, perbarui progress sesuai jumlah langkahnya
-            if cached_result['media_type'] == 'video':
-                # Perkiraan kasar jika data lama tidak punya info frame
-                step_counter += max(1, total_steps // len(files_to_run)) 
-            else:
-                step_counter += 1
-            progress_bar.progress(min(1.0, step_counter / total_steps), f"Mengambil dari cache: {file.name}")
+            # Hasil cache tidak dihitung sebagai langkah analisis
             st.toast(f"Hasil '{file.name}' ditemukan di cache.", icon="🗄️")
             newly_analyzed_results.append(dict(cached_result))
             continue
@@ -565,14 +595,14 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
         st.toast(f"Mulai memproses '{file.name}'...", icon="🧠")
         is_video = file.name.lower().endswith(tuple(config['analysis']['video_extensions']))
 
-        user_roi_mask = None
+        user_roi = None
         if file_config['roi_method'] != 'Otomatis' and file_config.get('canvas'):
             try:
                 if is_video:
                     preview_img = st.session_state.video_previews.get(file_hash)
-                    if preview_img: user_roi_mask = canvas_to_mask(file_config['canvas'], preview_img.height, preview_img.width)
+                    if preview_img: user_roi = canvas_to_roi_geometry(file_config['canvas'], preview_img.height, preview_img.width)
                 else:
-                    img_temp = Image.open(file); user_roi_mask = canvas_to_mask(file_config['canvas'], img_temp.height, img_temp.width)
+                    img_temp = Image.open(file); user_roi = canvas_to_roi_geometry(file_config['canvas'], img_temp.height, img_temp.width)
             except Exception as e:
                 st.warning(f"Gagal membuat ROI manual untuk '{file.name}': {e}. Menggunakan ROI otomatis.")
 
@@ -598,42 +628,39 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
 
                 # Baca gambar dari file, konversi ke RGB, dan analisis
                 img = Image.open(file).convert("RGB")
-                analysis_data = analyze_single_image(img, seg_model, cls_model, user_roi_mask)
+                analysis_data = analyze_single_image(img, seg_model, cls_model, user_roi)
 
                 # `timestamp_name` sekarang menjadi nama FOLDER unik untuk analisis ini
                 timestamp_name = f"{datetime.now(timezone(timedelta(hours=7))).strftime('%Y%m%d%H%M%S%f')}UTC_{os.path.splitext(file.name)[0]}"
 
-                # Buat path lengkap ke dalam subfolder unik           
-                original_path = os.path.join(config['paths']['original_archive'], timestamp_name, f"{timestamp_name}_original.png")
-                mask_path = os.path.join(config['paths']['mask_archive'], timestamp_name, f"{timestamp_name}_mask.png")
-                overlay_path = os.path.join(config['paths']['overlay_archive'], timestamp_name, f"{timestamp_name}_overlay.png")
+                # Buat path lengkap ke dalam subfolder unik (ekstensi mengikuti codec tiap artefak)
+                original_path = os.path.join(config['paths']['original_archive'], timestamp_name, f"{timestamp_name}_original{get_artifact_extension('original')}")
+                mask_path = os.path.join(config['paths']['mask_archive'], timestamp_name, f"{timestamp_name}_mask{get_artifact_extension('mask')}")
 
-                # Buat semua direktori yang diperlukan (termasuk subfolder timestamp_name)
-                for p in [original_path, mask_path, overlay_path]:
-                    os.makedirs(os.path.dirname(p), exist_ok=True)
-
-                # Simpan gambar asli, mask, dan overlay ke disk
-                overlay_img = create_enhanced_overlay(img, analysis_data['segmentation_mask'], analysis_data['roi_mask'])
-                img.save(original_path)
-                Image.fromarray(analysis_data['segmentation_mask'] * 255).save(mask_path)
-                overlay_img.save(overlay_path)
+                # Simpan gambar asli dan mask di latar belakang (di luar jalur inferensi).
+                # Citra asli disimpan sekali per file_hash di blob store, lalu ditautkan ke folder analisis.
+                # Overlay tidak disimpan: dirender saat ditampilkan/diekspor (lihat utils/overlays.py).
+                artifact_futures = [
+                    submit_original_image(img, file_hash, original_path),
+                    submit_mask(analysis_data, mask_path),
+                ]
 
                 # Ubah path absolut menjadi path relatif dari direktori kerja utama.
                 # Ganti semua separator `\` menjadi `/` untuk konsistensi lintas platform.
                 relative_original = os.path.relpath(original_path).replace("\\", "/")
                 relative_mask = os.path.relpath(mask_path).replace("\\", "/")
-                relative_overlay = os.path.relpath(overlay_path).replace("\\", "/")
                 
                 # Simpan path yang sudah bersih dan relatif ke database
                 db_entry.update({
                     **analysis_data, 
                     "original_path": relative_original, 
                     "mask_path": relative_mask, 
-                    "overlay_path": relative_overlay
+                    "overlay_path": None
                 })
 
             else: # --- B. PROSES VIDEO LENGKAP ---
                 temp_dir = tempfile.mkdtemp()
+                sticker_futures = [] # Penulisan frame stiker overlay di latar belakang
                 try:
                     # Simpan file video dari memori ke disk sementara untuk diproses
                     temp_video_path = os.path.join(temp_dir, file.name)
@@ -675,7 +702,7 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
 
                         # Analisis frame tunggal
                         img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                        analysis_data = analyze_single_image(img, seg_model, cls_model, user_roi_mask)
+                        analysis_data = analyze_single_image(img, seg_model, cls_model, user_roi)
                         results_per_frame.append(analysis_data)
 
                         # Buat gambar overlay dan langsung simpan ke disk
@@ -685,7 +712,7 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                             roi_mask=analysis_data['roi_mask'],
                             as_sticker=True
                         )
-                        sticker_img.save(os.path.join(temp_overlay_dir, f"sticker_{idx:06d}.png"), "PNG")
+                        sticker_futures.append(submit_artifact("sticker", sticker_img, os.path.join(temp_overlay_dir, f"sticker_{idx:06d}.png")))
 
                     if not results_per_frame:
                         raise ValueError("Tidak ada frame yang dapat diproses dari video.")
@@ -719,14 +746,18 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                     db_entry.update({
                         "cloud_coverage": avg_coverage, "okta_value": final_okta,
                         "sky_condition": final_sky_condition, "dominant_cloud_type": final_dominant_cloud,
-                        "classification_details": "; ".join(details_list)
+                        "classification_details": "; ".join(details_list),
+                        # Rata-rata confidence per kelas (0-1) untuk tabel class_confidences
+                        "cloud_type_confidences": {cloud: conf / 100 for cloud, conf in sorted_clouds}
                     })
 
                     # `timestamp_name` sekarang menjadi nama FOLDER unik untuk analisis ini
                     timestamp_name = f"{datetime.now(timezone(timedelta(hours=7))).strftime('%Y%m%d%H%M%S%f')}UTC_{os.path.splitext(file.name)[0]}"
 
-                    # Buat path lengkap ke dalam subfolder unik untuk setiap jenis artefak
-                    original_path = os.path.join(config['paths']['original_archive'], timestamp_name, f"{timestamp_name}_original.mp4")
+                    # Buat path lengkap ke dalam subfolder unik untuk setiap jenis artefak.
+                    # Video asli disimpan apa adanya, jadi ekstensinya mengikuti berkas sumber (.mov, .avi, dll.)
+                    source_extension = os.path.splitext(file.name)[1].lower()
+                    original_path = os.path.join(config['paths']['original_archive'], timestamp_name, f"{timestamp_name}_original{source_extension}")
                     overlay_path = os.path.join(config['paths']['overlay_archive'], timestamp_name, f"{timestamp_name}_overlay.mp4")
                     archive_mask_dir = os.path.join(config['paths']['mask_archive'], timestamp_name)
 
@@ -736,8 +767,11 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                     # Buat direktori untuk mask video secara eksplisit
                     os.makedirs(archive_mask_dir, exist_ok=True)
 
-                    # Simpan video asli ke arsip
-                    shutil.copy(temp_video_path, original_path)
+                    # Simpan video asli ke blob store (sekali per file_hash), lalu tautkan ke arsip analisis
+                    link_blob(store_blob_from_file(temp_video_path, file_hash, source_extension), original_path)
+
+                    # Semua frame stiker harus sudah di disk sebelum FFmpeg membacanya
+                    flush_artifacts(sticker_futures)
 
                     # Hitung framerate untuk stream overlay
                     video_duration = frame_count / fps if fps > 0 else 0
@@ -753,6 +787,7 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                         '-c:v', 'libx264',
                         '-pix_fmt', 'yuv420p',
                         '-preset', 'veryfast',
+                        '-movflags', '+faststart', # Atom moov di depan: browser bisa memutar sebelum unduhan selesai
                         overlay_path
                     ]
 
@@ -762,9 +797,11 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                         st.code(result.stderr)
                         overlay_path = None
 
-                    # Simpan frame-frame mask ke arsip
-                    for idx, result_data in enumerate(results_per_frame):
-                        Image.fromarray(result_data['segmentation_mask'] * 255).save(os.path.join(archive_mask_dir, f"mask_{idx:06d}.png"))
+                    # Simpan frame-frame mask ke arsip di latar belakang
+                    artifact_futures = [
+                        submit_mask(result_data, os.path.join(archive_mask_dir, f"mask_{idx:06d}{get_artifact_extension('mask')}"))
+                        for idx, result_data in enumerate(results_per_frame)
+                    ]
 
                     # Update entri database dengan path yang sudah bersih dan relatif
                     db_entry.update({
@@ -775,15 +812,32 @@ if st.button("🪄 Proses Semua Berkas dalam Antrean", type="primary", use_conta
                 
                 finally:
                     # Pastikan direktori sementara selalu dibersihkan, bahkan jika terjadi error
+                    # (tunggu penulisan stiker yang mungkin masih berjalan terlebih dahulu)
+                    wait(sticker_futures)
                     shutil.rmtree(temp_dir)
                             
             db_entry["analysis_duration_sec"] = time.time() - analysis_start_time
-            add_history_entry(db_entry)
+            # Artefak diunggah ke backend penyimpanan (no-op untuk disk lokal) begitu selesai ditulis (flush)
+            published = flush_then(artifact_futures, partial(publish_artifacts, db_entry))
+            # Entri database baru di-commit setelah semua artefaknya tersimpan
+            pending_writes.append(flush_then([published], partial(add_history_entry, db_entry)))
+            # Thumbnail pratinjau riwayat dibuat di latar begitu artefak tersimpan
+            flush_then([published], partial(get_result_thumbnail, db_entry))
+            # Turunan tampilan (citra 1280px, video faststart) disiapkan sekarang, bukan saat kartu hasil dirender
+            display_futures.append(flush_then([published], partial(get_result_display, db_entry)))
             newly_analyzed_results.append(db_entry)
 
         except Exception as e:
             st.error(f"Gagal memproses file '{file.name}': {e}")
     
+    # Pastikan semua entri sudah di-commit ke database sebelum melaporkan selesai
+    wait(pending_writes)
+    wait(display_futures)
+    for future in pending_writes:
+        if future.exception():
+            st.warning(f"Sebagian hasil gagal disimpan ke riwayat: {future.exception()}")
+            break
+
     progress_bar.empty()
     st.toast("Semua berkas telah selesai dianalisis!", icon="🎉")
     st.success(f"Analisis total selesai dalam {time.time() - analysis_start_time:.2f} detik!")
@@ -800,7 +854,7 @@ if st.session_state.analysis_results:
     # Ubah hasil sesi menjadi DataFrame
     df_session_results = pd.DataFrame(st.session_state.analysis_results)
     # Panggil fungsi dasbor universal untuk merangkum sesi ini
-    render_summary_dashboard(df_session_results, title="Rangkuman Sesi Analisis")
+    render_summary_dashboard(compute_aggregates_from_df(df_session_results), title="Rangkuman Sesi Analisis")
 
     # Buat seksi terpisah khusus untuk tombol unduh
     section_divider("Langkah 4: Unduh Laporan & Data", "📥")
@@ -3,7 +3,6 @@ import streamlit as st
 import os
 import cv2
 import time
-import tempfile
 import yt_dlp
 import yt_dlp.utils
 import numpy as np
@@ -12,6 +11,7 @@ import re
 import streamlit.components.v1 as components
 from PIL import Image
 from datetime import datetime, timezone, timedelta
+from functools import partial
 from streamlit_drawable_canvas import st_canvas
 from typing import Dict, Any, Optional
 from urllib.parse import urlparse
@@ -19,13 +19,19 @@ from urllib.parse import urlparse
 # Impor dari semua utilitas yang relevan
 from utils.config import config
 from utils.database import add_history_entry, get_pipeline_version_hash
+from utils.aggregates import compute_aggregates_from_df
 from utils.layout import apply_global_styles, render_page_header, render_sidebar_footer, section_divider, render_result, render_summary_dashboard
 from utils.media import fetch_live_stream_source
-from utils.processing import get_file_hash, get_analysis_hash, analyze_single_image, create_enhanced_overlay
-from utils.segmentation import load_segmentation_model, canvas_to_mask
+from utils.processing import get_frame_hash, get_frame_fingerprint, get_fingerprint_distance, get_analysis_hash, analyze_single_image
+from utils.segmentation import load_segmentation_model, canvas_to_mask, canvas_to_roi_geometry
 from utils.classification import load_classification_model
-from utils.system import cleanup_temp_files
+from utils.system import get_temp_janitor
+from utils.retention import get_retention_worker
+from utils.scheduler import AdaptiveScheduler
 from utils.download import download_controller
+from utils.artifacts import get_artifact_extension, submit_artifact, submit_mask, flush_artifacts, flush_then
+from utils.thumbnails import get_result_thumbnail
+from utils.storage import publish_artifacts
 
 # Fungsi helper untuk memastikan aplikasi berjalan stabil di lingkungan cloud.
 def get_frame_from_stream(cap: cv2.VideoCapture) -> Optional[np.ndarray]:
@@ -42,6 +48,21 @@ def get_frame_from_stream(cap: cv2.VideoCapture) -> Optional[np.ndarray]:
         print(f"Error saat membaca frame dari stream: {e}")
         return None
 
+LIVE_CONFIG = config.get('live_monitoring', {})
+
+def render_cadence(placeholder: Any, stats: Dict[str, Any]) -> None:
+    """Menampilkan perbandingan kadensi yang diminta vs. yang benar-benar tercapai."""
+    achieved = stats.get("achieved_interval")
+    latency = stats.get("latency_ema")
+    placeholder.caption(
+        f"⏱️ **Kadensi** — diminta: {stats['requested_interval']:.0f} dtk · "
+        f"efektif: {stats['effective_interval']:.1f} dtk · "
+        f"tercapai: {f'{achieved:.1f} dtk' if achieved else '-'} · "
+        f"latensi rata-rata: {f'{latency:.2f} dtk' if latency else '-'} · "
+        f"beban node: {stats['node_load']:.2f}/CPU · "
+        f"siklus di-drop: {stats['dropped_ticks']}"
+    )
+
 # --- 1. Konfigurasi Halaman & Inisialisasi State ---
 st.set_page_config(page_title=f"Live Monitoring - {config['app']['title']}", layout="wide")
 # Inisialisasi state yang terpusat dan bersih untuk halaman ini
@@ -69,8 +90,9 @@ if st.session_state.toast_message:
     st.toast(message, icon=icon)
     st.session_state.toast_message = None # Hapus setelah ditampilkan
 
-# Panggil pembersihan, terapkan layout, muat model
-cleanup_temp_files()
+# Mulai pembersih temp di latar, terapkan layout, muat model
+get_temp_janitor()
+get_retention_worker() # Retensi arsip berjalan di latar dengan laju I/O terbatas
 apply_global_styles()
 render_sidebar_footer()
 @st.cache_resource
@@ -305,9 +327,12 @@ if st.button(button_text, type="primary", use_container_width=True, disabled=is_
 
 # --- BLOK TAMPILAN DAN PEMROSESAN UTAMA ---
 info_placeholder = st.empty()
+cadence_placeholder = st.empty()
 result_placeholder = st.empty()
         
 if not st.session_state.live.get("running") and st.session_state.live.get("last_result"):
+    if st.session_state.live.get("cadence"):
+        render_cadence(cadence_placeholder, st.session_state.live["cadence"])
     with result_placeholder.container():
         render_result(st.session_state.live.get("last_result"))
 
@@ -327,8 +352,20 @@ if st.session_state.live.get("running"):
     consecutive_failures = 0
     MAX_FAILURES = 3
 
+    # State deteksi frame beku: sidik jari frame terakhir yang benar-benar dianalisis
+    fingerprint_size = LIVE_CONFIG.get('fingerprint_size', 32)
+    stale_threshold = LIVE_CONFIG.get('stale_diff_threshold', 2.0)
+    max_stale_ticks = LIVE_CONFIG.get('max_stale_ticks', 5)
+    previous_fingerprint = None
+    stale_ticks = 0
+
+    # Penjadwal adaptif: meregangkan interval / men-drop siklus saat node jenuh
+    scheduler = AdaptiveScheduler(st.session_state.live.get("interval", 10))
+
     while st.session_state.live.get("running"):
         loop_start_time = time.time()
+        scheduler.requested_interval = st.session_state.live.get("interval", 10)
+        scheduler.start_tick()
         
         info_placeholder.info(f"Membuka koneksi baru ke stream untuk mendapatkan frame termutakhir...", icon="🔗")
         
@@ -357,6 +394,40 @@ if st.session_state.live.get("running"):
             continue
 
         consecutive_failures = 0
+
+        # --- Cek frame beku/duplikat sebelum menjalankan model ---
+        fingerprint = get_frame_fingerprint(frame, fingerprint_size)
+        last_result = st.session_state.live.get("last_result")
+        is_stale = (
+            previous_fingerprint is not None and last_result is not None
+            and get_fingerprint_distance(fingerprint, previous_fingerprint) < stale_threshold
+        )
+        if is_stale:
+            stale_ticks += 1
+            stale_result = {**last_result, "is_stale": True}
+            st.session_state.live["last_result"] = stale_result
+            with result_placeholder.container():
+                render_result(stale_result)
+
+            if stale_ticks >= max_stale_ticks:
+                # Stream dianggap beku: minta URL stream baru (URL HLS sering kedaluwarsa)
+                info_placeholder.warning(f"Stream tidak berubah selama {stale_ticks} siklus dan dianggap beku. Menyambung ulang...", icon="🧊")
+                refreshed_info, _ = fetch_live_stream_source(source_info["display_url"])
+                if refreshed_info and refreshed_info.get("src"):
+                    source_info = refreshed_info
+                    stream_url = refreshed_info["src"]
+                    st.session_state.live["source_info"] = refreshed_info
+                stale_ticks = 0
+            else:
+                info_placeholder.info(f"Frame identik dengan analisis sebelumnya ({stale_ticks}/{max_stale_ticks}). Analisis dilewati.", icon="🧊")
+
+            sleep_duration = scheduler.next_sleep()
+            if sleep_duration > 0:
+                time.sleep(sleep_duration)
+            continue
+
+        stale_ticks = 0
+        previous_fingerprint = fingerprint
         info_placeholder.info(f"Frame berhasil diambil. Memulai analisis...", icon="🔬")
         
         # --- MULAI BLOK ANALISIS ---
@@ -368,47 +439,39 @@ if st.session_state.live.get("running"):
             "interval": st.session_state.live.get("interval", 10)
         }
 
-        user_roi_mask = None
+        user_roi = None
         if "Manual" in live_config["roi_method"]:
-            canvas_data = live_config["canvas"]
-            if canvas_data and canvas_data.json_data and canvas_data.json_data.get("objects"):
-                user_roi_mask = canvas_to_mask(canvas_data, pil_frame.height, pil_frame.width)
-            else:
-                user_roi_mask = np.zeros((pil_frame.height, pil_frame.width), dtype=np.uint8)
+            # Kanvas kosong menghasilkan geometri tanpa bentuk (ROI kosong)
+            user_roi = canvas_to_roi_geometry(live_config["canvas"], pil_frame.height, pil_frame.width)
         
-        analysis_data = analyze_single_image(pil_frame, seg_model, cls_model, user_roi_mask)
+        analysis_data = analyze_single_image(pil_frame, seg_model, cls_model, user_roi)
 
-        with tempfile.NamedTemporaryFile(delete=True, suffix=".png") as tmp:
-            pil_frame.save(tmp, format="PNG")
-            tmp.seek(0)
-            file_hash = get_file_hash(tmp)
-            analysis_hash = get_analysis_hash(file_hash, pipeline_hash, live_config)
-            file_size = tmp.tell()
+        # Hash dihitung langsung dari buffer frame mentah (tanpa encode PNG sementara)
+        file_hash = get_frame_hash(frame)
+        analysis_hash = get_analysis_hash(file_hash, pipeline_hash, live_config)
 
         is_saving_permanently = st.session_state.live["save_to_history"]
         sufix = "live_monitoring" if is_saving_permanently else "unsaved_live"
         timestamp_name = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}UTC_{sufix}"
 
         if is_saving_permanently:
-            base_original_dir, base_mask_dir, base_overlay_dir = (config['paths']['original_archive'], config['paths']['mask_archive'], config['paths']['overlay_archive'])
+            base_original_dir, base_mask_dir = (config['paths']['original_archive'], config['paths']['mask_archive'])
         else:
             temp_session_dir = os.path.join(config['paths']['temp_dir'], "live_session_artefacts")
-            base_original_dir, base_mask_dir, base_overlay_dir = (os.path.join(temp_session_dir, "original"), os.path.join(temp_session_dir, "masks"), os.path.join(temp_session_dir, "overlays"))
+            base_original_dir, base_mask_dir = (os.path.join(temp_session_dir, "original"), os.path.join(temp_session_dir, "masks"))
 
-        original_path = os.path.join(base_original_dir, timestamp_name, f"{timestamp_name}_original.png")
-        mask_path = os.path.join(base_mask_dir, timestamp_name, f"{timestamp_name}_mask.png")
-        overlay_path = os.path.join(base_overlay_dir, timestamp_name, f"{timestamp_name}_overlay.png")
+        original_path = os.path.join(base_original_dir, timestamp_name, f"{timestamp_name}_original{get_artifact_extension('original')}")
+        mask_path = os.path.join(base_mask_dir, timestamp_name, f"{timestamp_name}_mask{get_artifact_extension('mask')}")
 
-        for p in [original_path, mask_path, overlay_path]:
-            os.makedirs(os.path.dirname(p), exist_ok=True)
-        pil_frame.save(original_path, "PNG")
-        Image.fromarray(analysis_data['segmentation_mask'] * 255).save(mask_path)
-        overlay_img = create_enhanced_overlay(pil_frame, analysis_data['segmentation_mask'], analysis_data['roi_mask'])
-        overlay_img.save(overlay_path)
+        # Encode & tulis citra asli dan mask secara paralel di pool penulis artefak.
+        # Overlay tidak dibuat per frame: dirender hanya saat frame ditampilkan/diekspor.
+        artifact_futures = [
+            submit_artifact("original", pil_frame, original_path),
+            submit_mask(analysis_data, mask_path),
+        ]
 
         relative_original = os.path.relpath(original_path).replace("\\", "/")
         relative_mask = os.path.relpath(mask_path).replace("\\", "/")
-        relative_overlay = os.path.relpath(overlay_path).replace("\\", "/")
 
         analysis_duration = time.time() - loop_start_time
         db_entry = {
@@ -418,25 +481,36 @@ if st.session_state.live.get("running"):
             "analysis_hash": analysis_hash,
             "source_filename": f"Live Frame ({datetime.now():%Y-%m-%d %H:%M:%S} UTC){' (Unsaved)' if not is_saving_permanently else ''}",
             "media_type": "live_frame",
-            "file_size_bytes": file_size,
             "analyzed_at": datetime.now(timezone(timedelta(hours=7))).isoformat(),
             "analysis_duration_sec": analysis_duration,
             "original_path": relative_original,
             "mask_path": relative_mask,
-            "overlay_path": relative_overlay,
+            "overlay_path": None,
         }
         
-        if is_saving_permanently:
-            add_history_entry(db_entry)
-        
+        # Flush: artefak harus sudah di disk sebelum entri di-commit dan hasil ditampilkan
+        flush_artifacts(artifact_futures)
+        # Ukuran berkas asli yang tersimpan (setelah encode), bukan ukuran buffer frame mentah
+        db_entry["file_size_bytes"] = os.path.getsize(original_path)
         st.session_state.live["session_results"].append(db_entry)
         st.session_state.live["last_result"] = db_entry
 
         with result_placeholder.container():
             render_result(db_entry)
 
-        interval = st.session_state.live.get("interval", 10)
-        sleep_duration = interval - analysis_duration
+        if is_saving_permanently:
+            # Unggah ke backend penyimpanan (no-op untuk disk lokal) di latar setelah hasil ditampilkan
+            # (salinan lokal dipindah ke cache baca); entri di-commit setelah unggahan selesai
+            published = flush_then(artifact_futures, partial(publish_artifacts, db_entry))
+            flush_then([published], partial(add_history_entry, db_entry))
+            # Thumbnail pratinjau riwayat dibuat di latar, di luar jalur monitoring
+            flush_then([published], partial(get_result_thumbnail, db_entry))
+
+        scheduler.end_tick(analysis_duration)
+        sleep_duration = scheduler.next_sleep()
+        cadence_stats = scheduler.get_stats()
+        st.session_state.live["cadence"] = cadence_stats
+        render_cadence(cadence_placeholder, cadence_stats)
 
         if sleep_duration > 0:
             info_placeholder.info(f"Analisis selesai dalam {analysis_duration:.2f} detik. Menunggu {sleep_duration:.2f} detik untuk siklus berikutnya...", icon="⏱️")
@@ -449,7 +523,7 @@ if st.session_state.live.get("running"):
 if st.session_state.live.get("session_results") and not st.session_state.live.get("running"):
     df_session_results = pd.DataFrame(st.session_state.live["session_results"])
     
-    render_summary_dashboard(df_session_results, title="Rangkuman Sesi Monitoring")
+    render_summary_dashboard(compute_aggregates_from_df(df_session_results), title="Rangkuman Sesi Monitoring")
     
     section_divider("Unduh Hasil Sesi Ini", "📥")
     download_controller(st.session_state.live["session_results"], context="live")
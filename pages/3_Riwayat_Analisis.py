@@ -1,20 +1,21 @@
 # pages/3_Riwayat_Analisis.py
 import streamlit as st
 import pandas as pd
-import os
-import shutil
 
 # Impor semua fondasi dari utils
 from utils.config import config
-from utils.database import get_history_df, delete_history_entries, get_paths_for_deletion
+from utils.database import get_history_change_token, get_history_location_count, cached_query_history, cached_count_history, get_distinct_values, delete_history_entries, count_pending_artifact_deletions
+from utils.aggregates import cached_dashboard_aggregates
 from utils.layout import apply_global_styles, render_page_header, render_sidebar_footer, section_divider, render_summary_dashboard
-from utils.media import get_preview_as_base64
+from utils.thumbnails import get_result_thumbnail, get_thumbnail_as_base64
 from utils.download import download_controller
+from utils.gc import get_artifact_collector, reconcile_archive
     
 # --- 1. Konfigurasi Halaman & Inisialisasi ---
 st.set_page_config(page_title=f"Riwayat Analisis - {config['app']['title']}", layout="wide")
 apply_global_styles()
 render_sidebar_footer()
+get_artifact_collector() # Pastikan pengumpul artefak latar berjalan (melanjutkan antrean yang tertunda)
 
 # Inisialisasi state untuk konfirmasi hapus
 if "confirm_delete" not in st.session_state:
@@ -30,16 +31,23 @@ if st.session_state.toast_message:
 render_page_header("Riwayat Analisis")
 st.write("Kelola, lihat detail, dan ekspor semua hasil analisis yang telah tersimpan di dalam sistem.")
 
-# Ambil data langsung dari database terpusat
-df_history = get_history_df()
-
 section_divider("Tabel Data Riwayat", "🗂️")
 
-if df_history.empty:
+# Token perubahan riwayat: query & agregat di bawah di-cache dan hanya dihitung ulang jika data berubah
+history_token = get_history_change_token()
+if history_token[0] == 0:
     st.info("Belum ada riwayat analisis yang tersimpan. Silakan lakukan analisis di halaman 'Deteksi Awan' atau 'Live Monitoring'.")
     st.stop()
 
-# --- 3. Filter & Kontrol Tabel ---
+# --- 3. Pencarian, Filter & Kontrol Tabel ---
+# Pencarian teks penuh atas nama file, kondisi langit, jenis awan, dan detail klasifikasi
+search_text = st.text_input(
+    "🔍 Cari riwayat:",
+    placeholder="Contoh: nama kamera, tanggal pada nama file, atau jenis awan",
+    help="Setiap kata dicocokkan sebagai awalan kata, misal 'cam 2025' menemukan 'cam01_20250501.jpg'."
+)
+
+# Filter, sortir, dan paginasi dijalankan di database; halaman hanya memuat baris yang terlihat
 with st.expander("🔎 Filter & Sortir Data", expanded=False):
     # Kolom untuk filter
     filter_cols = {
@@ -57,28 +65,47 @@ with st.expander("🔎 Filter & Sortir Data", expanded=False):
         "Nilai Okta": "okta_value"
     }
 
-    filtered_df = df_history.copy()
-    
-    # Terapkan filter
+    # Kumpulkan filter
+    active_filters = {}
     for label, col_name in filter_cols.items():
-        if col_name in filtered_df.columns:
-            options = sorted(filtered_df[col_name].dropna().unique())
-            selected = st.multiselect(f"Filter berdasarkan {label}:", options)
-            if selected:
-                filtered_df = filtered_df[filtered_df[col_name].isin(selected)]
+        selected = st.multiselect(f"Filter berdasarkan {label}:", get_distinct_values(col_name))
+        if selected:
+            active_filters[col_name] = selected
 
-    # Terapkan sortir
+    # Tentukan sortir
     sort_col_label = st.selectbox("Urutkan berdasarkan:", list(sortable_cols.keys()))
-    sort_ascending = st.radio("Urutan:", ["Terbaru (Turun)", "Terdahulu (Naik)"], horizontal=True) == "Terlama (Naik)"
-    filtered_df = filtered_df.sort_values(by=sortable_cols[sort_col_label], ascending=sort_ascending)
+    sort_ascending = st.radio("Urutan:", ["Terbaru (Turun)", "Terdahulu (Naik)"], horizontal=True) == "Terdahulu (Naik)"
+
+# Kontrol paginasi
+total_rows = cached_count_history(history_token, filters=active_filters, search=search_text)
+page_col1, page_col2, page_col3 = st.columns([0.3, 0.3, 0.4])
+with page_col1:
+    page_size = st.selectbox("Baris per halaman:", [25, 50, 100, 200], index=1)
+total_pages = max(1, -(-total_rows // page_size))
+with page_col2:
+    page_number = st.number_input("Halaman:", min_value=1, max_value=total_pages, value=1, step=1)
+with page_col3:
+    st.caption(f"Menampilkan halaman {page_number} dari {total_pages} ({total_rows} entri cocok dengan filter & pencarian).")
+
+# Baris tabel memuat path artefak, jadi cache-nya juga usang saat retensi memindahkan artefak
+filtered_df = cached_query_history(
+    history_token + (get_history_location_count(),),
+    filters=active_filters,
+    sort_by=sortable_cols[sort_col_label],
+    ascending=sort_ascending,
+    limit=page_size,
+    offset=(page_number - 1) * page_size,
+    search=search_text
+)
 
 # --- 4. Tampilan Tabel Interaktif dengan st.dataframe ---
-st.info("Pilih baris pada tabel di bawah dengan mengklik kotak centang untuk melakukan aksi.")
+st.info("Pilih baris pada tabel di bawah dengan mengklik kotak centang untuk melakukan aksi. Seleksi berlaku untuk halaman yang sedang ditampilkan.")
 
-# Buat kolom pratinjau PADA 'filtered_df' SETELAH SEMUA FILTER SELESAI
+# Buat kolom pratinjau hanya untuk baris pada halaman yang terlihat
 if not filtered_df.empty:
     with st.spinner("Mempersiapkan pratinjau gambar..."):
-        filtered_df["preview"] = filtered_df["overlay_path"].apply(get_preview_as_base64)
+        # Thumbnail dibaca dari store (dibuat saat analisis) hanya untuk baris yang terlihat
+        filtered_df["preview"] = filtered_df.apply(lambda row: get_thumbnail_as_base64(get_result_thumbnail(row.to_dict())), axis=1)
 else:
     # Buat kolom kosong jika hasil filter kosong untuk mencegah error
     filtered_df["preview"] = None
@@ -194,16 +221,16 @@ selected_data = filtered_df.loc[selected_ids].to_dict('records')
 # --- 5. Dasbor Statistik Dinamis ---
 # Tentukan data mana yang akan ditampilkan di dasbor
 if selected_ids:
-    # Jika ada baris yang dipilih, gunakan data yang sudah diseleksi
-    df_for_dashboard = filtered_df.loc[selected_ids]
+    # Jika ada baris yang dipilih, agregasi hanya untuk ID yang diseleksi
+    dashboard_aggregates = cached_dashboard_aggregates(history_token, ids=selected_ids)
     dashboard_title = f"Dasbor Statistik untuk {len(selected_ids)} Item Terpilih"
 else:
-    # Jika tidak ada yang dipilih, gunakan semua data yang sudah difilter
-    df_for_dashboard = filtered_df
+    # Jika tidak ada yang dipilih, agregasi semua data yang cocok dengan filter & pencarian
+    dashboard_aggregates = cached_dashboard_aggregates(history_token, filters=active_filters, search=search_text)
     dashboard_title = "Dasbor Statistik Riwayat Analisis"
 
-# Panggil fungsi dasbor universal dengan data yang sesuai
-render_summary_dashboard(df_for_dashboard, title=dashboard_title)
+# Panggil fungsi dasbor universal dengan agregat yang sesuai
+render_summary_dashboard(dashboard_aggregates, title=dashboard_title)
 
 # --- 6. Panel Aksi untuk Data Terpilih ---
 section_divider(f"Aksi untuk Data Terpilih ({len(selected_ids)} item)", "⚙️")
@@ -226,30 +253,11 @@ else:
             st.warning(f"Anda akan menghapus **{len(selected_ids)} entri** riwayat beserta semua file terkait secara permanen. Yakin ingin melanjutkan?")
             c1, c2 = st.columns(2)
             if c1.button("✅ Ya, Hapus", use_container_width=True):
-                with st.spinner("Menghapus data dan file artefak..."):
-                    # 1. Ambil semua path file/folder dari database
-                    paths_from_db = get_paths_for_deletion(selected_ids)
-                    
-                    # 2. Kumpulkan semua DIREKTORI INDUK yang unik untuk dihapus
-                    dirs_to_delete = set()
-                    for path in paths_from_db:
-                        # Path bisa berupa file atau direktori (untuk mask video)
-                        # os.path.dirname() akan mengambil folder induknya
-                        parent_dir = os.path.dirname(path)
-                        # Pastikan kita tidak mencoba menghapus folder arsip utama
-                        if parent_dir and "archive" in parent_dir:
-                            dirs_to_delete.add(parent_dir)
-                    
-                    # 3. Hapus setiap direktori unik beserta seluruh isinya
-                    for dir_path in dirs_to_delete:
-                        try:
-                            if os.path.exists(dir_path):
-                                shutil.rmtree(dir_path)
-                        except Exception as e:
-                            st.warning(f"Gagal menghapus folder {os.path.basename(dir_path)}: {e}")
-                    
-                    # 4. Hapus entri dari database
+                with st.spinner("Menghapus data riwayat..."):
+                    # Entri dihapus dan artefaknya dimasukkan ke antrean dalam satu transaksi;
+                    # berkas dihapus di latar oleh pengumpul artefak (utils/gc.py)
                     delete_history_entries(selected_ids)
+                    get_artifact_collector().wake()
                     
                     st.session_state.confirm_delete = False
                     st.session_state.toast_message = (f"Berhasil menghapus {len(selected_ids)} entri.", "✅")
@@ -257,4 +265,28 @@ else:
             
             if c2.button("❌ Batal", use_container_width=True):
                 st.session_state.confirm_delete = False
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+# --- 7. Pemeliharaan Arsip ---
+section_divider("Pemeliharaan Arsip", "🧹")
+with st.expander("Antrean penghapusan & artefak yatim", expanded=False):
+    st.caption(f"Berkas menunggu dihapus di latar: **{count_pending_artifact_deletions()}** entri antrean.")
+    st.write("Pindai arsip untuk menemukan folder analisis, arsip tar, blob, thumbnail, dan objek bucket yang tidak lagi direferensikan riwayat (misal sisa analisis yang gagal). Pemindaian bersifat *dry-run* dan tidak menghapus apa pun.")
+    if st.button("🔍 Pindai Artefak Yatim (Dry-run)"):
+        with st.spinner("Mencocokkan arsip dengan database..."):
+            st.session_state.gc_report = reconcile_archive(dry_run=True)
+
+    report = st.session_state.get("gc_report")
+    if report:
+        orphans = report["orphan_dirs"] + report["orphan_archives"] + report["orphan_blobs"] + report["orphan_thumbnails"] + report["orphan_objects"]
+        st.info(f"Ditemukan {len(report['orphan_dirs'])} folder analisis, {len(report['orphan_archives'])} arsip tar, {len(report['orphan_blobs'])} blob, {len(report['orphan_thumbnails'])} thumbnail, dan {len(report['orphan_objects'])} objek bucket yatim ({report['total_bytes'] / (1024 * 1024):.1f} MB).")
+        if orphans:
+            st.dataframe(pd.DataFrame({"path": orphans}), use_container_width=True, hide_index=True)
+            if st.button("🗑️ Hapus Artefak Yatim", type="primary"):
+                with st.spinner("Menghapus artefak yatim..."):
+                    result = reconcile_archive(dry_run=False)
+                st.session_state.gc_report = None
+                st.session_state.toast_message = (f"{result['removed']} artefak yatim dihapus.", "🧹")
+                st.rerun()
+        for error in report["errors"]:
+            st.warning(error)
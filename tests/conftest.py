@@ -0,0 +1,48 @@
+# tests/conftest.py
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Modul utils membaca config.yaml dan membuat database relatif terhadap direktori kerja saat
+# diimpor; pengujian dijalankan di direktori sementara agar data repositori tidak tersentuh
+_WORKDIR = tempfile.mkdtemp(prefix="abcd-tests-")
+shutil.copy(os.path.join(ROOT, "config.yaml"), _WORKDIR)
+os.chdir(_WORKDIR)
+
+
+@pytest.fixture
+def make_entry():
+    """Pembuat entri riwayat lengkap (semua kolom `_INSERT_HISTORY_QUERY`) dengan hash unik."""
+
+    def _make(days_ago: float = 0, **overrides):
+        analyzed_at = datetime.now(timezone(timedelta(hours=7))) - timedelta(days=days_ago)
+        entry = {
+            "analysis_hash": uuid.uuid4().hex,
+            "pipeline_version_hash": "test-pipeline",
+            "file_hash": uuid.uuid4().hex,
+            "source_filename": "sky.jpg",
+            "media_type": "image",
+            "file_size_bytes": 1024,
+            "analyzed_at": analyzed_at.isoformat(),
+            "analysis_duration_sec": 0.5,
+            "cloud_coverage": 40.0,
+            "okta_value": 3,
+            "sky_condition": "Partly Cloudy",
+            "dominant_cloud_type": "Cumulus",
+            "classification_details": "Cumulus (81.00%)",
+            "original_path": None,
+            "mask_path": None,
+            "overlay_path": None,
+        }
+        entry.update(overrides)
+        return entry
+
+    return _make
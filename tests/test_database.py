@@ -0,0 +1,83 @@
+# tests/test_database.py
+# Pengujian migrasi skema, rollup inkremental, dan thread penulis riwayat
+import sqlite3
+
+from utils import database
+
+
+def _rollup_rows(bucket_prefix):
+    conn = database.get_db_connection()
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE bucket_start LIKE ?", (f"{bucket_prefix}%",)).fetchone()[0]
+        for table in ("rollup_coverage", "rollup_okta", "rollup_cloud_type")
+    }
+
+
+def test_migrations_upgrade_baseline_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "baseline.db"))
+    conn.row_factory = sqlite3.Row
+    # Database v0: tabel history asli tanpa tabel schema_version, sudah berisi data
+    database._migration_base_schema(conn)
+    conn.execute("""
+        INSERT INTO history (pipeline_version_hash, file_hash, analysis_hash, source_filename, media_type,
+                             analyzed_at, cloud_coverage, okta_value, dominant_cloud_type, classification_details)
+        VALUES ('p', 'f', 'a', 'old.jpg', 'image', '2020-05-06T07:08:09+07:00', 55.0, 4, 'Cumulus',
+                'Cumulus (70.00%); Cirrus / Cirrostratus (20.00%)')
+    """)
+    conn.commit()
+
+    database.apply_migrations(conn)
+
+    assert database.get_schema_version(conn) == database.MIGRATIONS[-1][0]
+    row = conn.execute("SELECT analyzed_at_epoch, storage_tier FROM history").fetchone()
+    assert row["analyzed_at_epoch"] == 1588723689
+    assert row["storage_tier"] == 0
+    # Rollup dan confidence per kelas diisi dari data lama
+    assert tuple(conn.execute(
+        "SELECT sample_count, coverage_sum FROM rollup_coverage WHERE granularity = 'day'"
+    ).fetchone()) == (1, 55.0)
+    confidences = conn.execute("SELECT class_index, confidence FROM class_confidences ORDER BY class_index")
+    assert [tuple(row) for row in confidences] == [(0, 0.7), (2, 0.2)]
+    assert database.get_history_delete_count(conn) == 0
+    assert database.get_history_location_count(conn) == 0
+
+    # Menjalankan ulang tidak menerapkan apa pun lagi
+    applied = conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0]
+    database.apply_migrations(conn)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == applied == len(database.MIGRATIONS)
+    conn.close()
+
+
+def test_rollups_return_to_zero_after_delete(make_entry):
+    entries = [
+        make_entry(analyzed_at="2001-02-03T04:05:00+07:00", okta_value=2, cloud_coverage=20.0),
+        make_entry(analyzed_at="2001-02-03T04:35:00+07:00", okta_value=6, cloud_coverage=70.0,
+                   dominant_cloud_type="Cirrus / Cirrostratus"),
+    ]
+    ids = database.add_history_entries(entries).result(timeout=10)
+
+    timeseries = database.get_rollup_timeseries("hour", start="2001-02-03T00:00", end="2001-02-04T00:00")
+    assert timeseries["sample_count"].tolist() == [2]
+    assert timeseries["mean_coverage"].tolist() == [45.0]
+    assert _rollup_rows("2001-")["rollup_okta"] == 6 # 2 nilai Okta x 3 granularitas
+
+    delete_count = database.get_history_delete_count()
+    database.delete_history_entries(ids)
+
+    assert _rollup_rows("2001-") == {"rollup_coverage": 0, "rollup_okta": 0, "rollup_cloud_type": 0}
+    assert database.get_rollup_timeseries("hour", start="2001-02-03T00:00", end="2001-02-04T00:00").empty
+    assert database.get_history_delete_count() == delete_count + 2
+
+
+def test_duplicate_analysis_hash_resolves_to_none(make_entry):
+    entry = make_entry(analyzed_at="2002-03-04T05:06:00+07:00")
+
+    first_id = database.add_history_entry(entry).result(timeout=10)
+    assert isinstance(first_id, int)
+    assert database.add_history_entry(dict(entry, source_filename="again.jpg")).result(timeout=10) is None
+
+    found = database.find_history(entry["analysis_hash"])
+    assert found["id"] == first_id and found["source_filename"] == "sky.jpg"
+    # Duplikat tidak ikut dihitung di rollup
+    timeseries = database.get_rollup_timeseries("day", start="2002-03-04T00:00", end="2002-03-05T00:00")
+    assert timeseries["sample_count"].tolist() == [1]
@@ -0,0 +1,56 @@
+# tests/test_masks.py
+# Pengujian format mask ringkas (.npz): simpan lalu rekonstruksi resolusi penuh
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# utils.masks memakai penggambar ROI dari modul segmentasi (butuh torch/timm)
+masks = pytest.importorskip("utils.masks")
+
+
+def _analysis_data(model_mask, image_size, roi_geometry):
+    full_mask = np.kron(model_mask, np.ones((2, 2), dtype=np.uint8))
+    return {
+        "segmentation_mask_model": model_mask,
+        "segmentation_mask": full_mask,
+        "image_size": list(image_size),
+        "roi_geometry": roi_geometry,
+    }
+
+
+def test_packed_mask_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    model_mask = (rng.random((4, 6)) > 0.5).astype(np.uint8)
+    roi_geometry = {"size": [8, 12], "shapes": [{"type": "rect", "x": 2, "y": 1, "w": 8, "h": 6}]}
+    data = _analysis_data(model_mask, (8, 12), roi_geometry)
+
+    path = masks.save_packed_mask(data, str(tmp_path / "a1" / "a1_mask.npz"))
+    mask, roi_mask = masks.load_mask_and_roi(path)
+
+    expected_roi = np.zeros((8, 12), dtype=np.uint8)
+    expected_roi[1:7, 2:10] = 1
+    assert mask.dtype == np.uint8 and mask.shape == (8, 12)
+    np.testing.assert_array_equal(roi_mask, expected_roi)
+    np.testing.assert_array_equal(mask, data["segmentation_mask"] * expected_roi)
+    # Ditulis atomik: tidak ada berkas sementara yang tertinggal
+    assert not list(tmp_path.glob("a1/*.tmp"))
+
+
+def test_raster_mask_has_no_roi_and_png_export(tmp_path):
+    raster = np.zeros((5, 7), dtype=np.uint8)
+    raster[1:4, 2:6] = 255
+    path = str(tmp_path / "legacy_mask.png")
+    Image.fromarray(raster).save(path)
+
+    mask, roi_mask = masks.load_mask_and_roi(path)
+    assert roi_mask is None
+    np.testing.assert_array_equal(mask, raster // 255)
+
+    packed = masks.save_packed_mask(
+        _analysis_data(np.eye(3, dtype=np.uint8), (6, 6), {"size": [6, 6], "shapes": [{"type": "full"}]}),
+        str(tmp_path / "eye_mask.npz")
+    )
+    with Image.open(io.BytesIO(masks.mask_to_png_bytes(packed))) as img:
+        np.testing.assert_array_equal(np.array(img), np.kron(np.eye(3, dtype=np.uint8), np.ones((2, 2), dtype=np.uint8)) * 255)
@@ -0,0 +1,89 @@
+# tests/test_retention.py
+# Pengujian perpindahan tingkat penyimpanan (lengkap -> ringkas -> dikemas) oleh retensi arsip
+import os
+import time
+import uuid
+
+import pytest
+from PIL import Image
+
+from utils import database, retention
+from utils.blobstore import link_blob, store_blob_from_file
+from utils.config import config
+from utils.gc import PACKED_SEPARATOR
+
+
+@pytest.fixture(autouse=True)
+def _fast_retention(monkeypatch):
+    monkeypatch.setitem(retention.RETENTION_CONFIG, "io_rate_mb_per_sec", 0)
+    monkeypatch.setitem(retention.RETENTION_CONFIG, "full_days", 30)
+    monkeypatch.setitem(retention.RETENTION_CONFIG, "pack_days", 180)
+    monkeypatch.setitem(retention.RETENTION_CONFIG, "downsample_max_side", 32)
+
+
+def _artifact_path(kind, name, suffix):
+    return f"{config['paths'][kind]}/{name}/{name}_{suffix}"
+
+
+def _save_image(path, size=(96, 64)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, (30, 120, 200)).save(path)
+    return path
+
+
+def test_retention_moves_entries_through_tiers(make_entry):
+    compact_name, packed_name, video_name = (f"ret_{uuid.uuid4().hex[:8]}" for _ in range(3))
+
+    # Citra 60 hari: citra asli diperkecil, overlay dibuang, mask dipertahankan
+    compact = make_entry(
+        days_ago=60,
+        original_path=_save_image(_artifact_path("original_archive", compact_name, "original.png")),
+        mask_path=_save_image(_artifact_path("mask_archive", compact_name, "mask.png")),
+        overlay_path=_save_image(_artifact_path("overlay_archive", compact_name, "overlay.jpg")),
+    )
+    # Video 60 hari: berkas asli (tautan ke blob) tidak disentuh dan blobnya tetap direferensikan
+    source = _save_image(f"temp/{video_name}.png")
+    blob_path = store_blob_from_file(source, compact["file_hash"][::-1], ".mp4")
+    video = make_entry(
+        days_ago=60, media_type="video", file_hash=compact["file_hash"][::-1],
+        original_path=link_blob(blob_path, _artifact_path("original_archive", video_name, "original.mp4")),
+    )
+    # Citra 200 hari: diringkas lalu dikemas ke arsip tar harian
+    packed = make_entry(
+        days_ago=200,
+        original_path=_save_image(_artifact_path("original_archive", packed_name, "original.png")),
+        mask_path=_save_image(_artifact_path("mask_archive", packed_name, "mask.png")),
+    )
+    database.add_history_entries([compact, video, packed]).result(timeout=10)
+    # Blob sudah lewat masa tenggang, jadi hanya jumlah referensinya yang menahannya
+    old = time.time() - 2 * 86400
+    os.utime(blob_path, (old, old))
+
+    stats = retention.run_retention_pass()
+    assert stats["compacted"] >= 2 and stats["packed"] >= 1
+
+    row = database.find_history(compact["analysis_hash"])
+    assert row["storage_tier"] == retention.TIER_COMPACT
+    assert row["original_path"].endswith("_original_small.jpg")
+    with Image.open(row["original_path"]) as img:
+        assert max(img.size) == 32
+    assert not os.path.exists(compact["original_path"])
+    assert row["overlay_path"] is None and not os.path.exists(os.path.dirname(compact["overlay_path"]))
+    assert row["mask_path"] == compact["mask_path"] and os.path.exists(row["mask_path"])
+
+    row = database.find_history(video["analysis_hash"])
+    assert row["storage_tier"] == retention.TIER_COMPACT
+    assert row["original_path"] == video["original_path"]
+    assert os.path.exists(blob_path) and os.path.exists(row["original_path"])
+
+    row = database.find_history(packed["analysis_hash"])
+    assert row["storage_tier"] == retention.TIER_PACKED
+    for key in ("original_path", "mask_path"):
+        assert PACKED_SEPARATOR in row[key]
+        assert not os.path.exists(os.path.dirname(packed[key]))
+        local_path = retention.resolve_artifact_path(row[key])
+        assert local_path and os.path.isfile(local_path)
+    assert retention.resolve_artifact_path(row["original_path"]).endswith("_original_small.jpg")
+
+    # Putaran berikutnya tidak menemukan apa pun lagi
+    assert retention.run_retention_pass() == {"compacted": 0, "packed": 0}
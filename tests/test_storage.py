@@ -0,0 +1,206 @@
+# tests/test_storage.py
+# Pengujian backend penyimpanan objek terhadap klien S3 palsu di memori (pengganti MinIO lokal)
+import io
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils import gc, storage
+from utils.blobstore import get_blob_path, link_blob, store_blob_from_file
+
+
+class _NotFound(Exception):
+    """Meniru botocore ClientError untuk objek yang tidak ada."""
+
+    def __init__(self, key):
+        super().__init__(f"Not Found: {key}")
+        self.response = {"Error": {"Code": "404"}}
+
+
+class _Paginator:
+    def __init__(self, client):
+        self._client = client
+
+    def paginate(self, Bucket, Prefix=""):
+        keys = sorted(key for key in self._client.objects if key.startswith(Prefix))
+        # Halaman kecil agar penelusuran multi-halaman ikut teruji
+        for start in range(0, len(keys), 2):
+            yield {"Contents": [self._client.describe(key) for key in keys[start:start + 2]]}
+
+
+class FakeS3:
+    """Subset API klien boto3 S3 yang dipakai `S3Storage`, disimpan di memori."""
+
+    def __init__(self):
+        self.objects = {}  # key -> (data, metadata, last_modified)
+        self.uploads = []
+        self.now = datetime.now(timezone.utc)
+
+    def _put(self, key, data, metadata=None):
+        self.objects[key] = (data, dict(metadata or {}), self.now)
+
+    def _get(self, key):
+        if key not in self.objects:
+            raise _NotFound(key)
+        return self.objects[key]
+
+    def describe(self, key):
+        data, _, last_modified = self.objects[key]
+        return {"Key": key, "Size": len(data), "LastModified": last_modified}
+
+    def head_object(self, Bucket, Key):
+        _, metadata, _ = self._get(Key)
+        return {"Metadata": metadata}
+
+    def get_object(self, Bucket, Key):
+        data, metadata, _ = self._get(Key)
+        return {"Body": io.BytesIO(data), "Metadata": metadata}
+
+    def put_object(self, Bucket, Key, Body=b"", Metadata=None):
+        self._put(Key, Body, Metadata)
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        with open(Filename, "rb") as f:
+            self._put(Key, f.read())
+        self.uploads.append(Key)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        self._put(Key, Fileobj.read())
+        self.uploads.append(Key)
+
+    def download_file(self, Bucket, Key, Filename, Config=None):
+        data, _, _ = self._get(Key)
+        with open(Filename, "wb") as f:
+            f.write(data)
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, MetadataDirective="COPY"):
+        data, metadata, _ = self._get(CopySource["Key"])
+        self._put(Key, data, Metadata if MetadataDirective == "REPLACE" else metadata)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return _Paginator(self)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def client():
+    return FakeS3()
+
+
+@pytest.fixture
+def s3(tmp_path, monkeypatch, client):
+    monkeypatch.chdir(tmp_path)
+    backend = storage.S3Storage(bucket="test", prefix="env", cache_dir="cache", client=client)
+    monkeypatch.setattr(storage, "get_storage", lambda: backend)
+    monkeypatch.setattr(gc, "get_storage", lambda: backend)
+    return backend
+
+
+def test_publish_moves_file_to_cache_and_reads_through(s3, client):
+    path = _write("data/archive/masks/a1/a1_mask.png", b"mask")
+    s3.publish(path)
+
+    assert client.objects["env/data/archive/masks/a1/a1_mask.png"][0] == b"mask"
+    assert not os.path.exists(path)
+    assert s3.exists(path)
+
+    # Salinan tergusur dari cache baca: diunduh ulang saat dibutuhkan
+    shutil.rmtree("cache")
+    local_path = s3.get_local_path(path)
+    with open(local_path, "rb") as f:
+        assert f.read() == b"mask"
+    with s3.open_read(path) as f:
+        assert f.read() == b"mask"
+
+
+def test_directory_artifact_roundtrip_and_delete(s3, client):
+    folder = "data/archive/masks/v1"
+    for idx in range(3):
+        _write(os.path.join(folder, f"mask_{idx:06d}.png"), bytes([idx]))
+    s3.publish(folder)
+    shutil.rmtree("cache")
+
+    assert s3.exists(folder)
+    local_dir = s3.get_local_path(folder)
+    assert sorted(os.listdir(local_dir)) == ["mask_000000.png", "mask_000001.png", "mask_000002.png"]
+
+    s3.delete(folder)
+    assert not client.objects
+    assert not s3.exists(folder)
+    assert s3.get_local_path(folder) is None
+
+
+def test_open_write_uploads_on_exit(s3, client):
+    with s3.open_write("data/archive/overlays/o1/o1.jpg") as f:
+        f.write(b"overlay")
+    assert client.objects["env/data/archive/overlays/o1/o1.jpg"][0] == b"overlay"
+
+
+def test_linked_original_is_uploaded_once_per_content(s3, client):
+    source = _write("upload.jpg", b"same bytes")
+    file_hash = "ab" * 32
+    entries = []
+    for name in ("t1", "t2"):
+        original_path = f"data/archive/original/{name}/{name}_original.jpg"
+        link_blob(store_blob_from_file(source, file_hash, ".jpg"), original_path)
+        entries.append({"file_hash": file_hash, "original_path": original_path})
+
+    for entry in entries:
+        storage.publish_artifacts(entry)
+
+    blob_key = "env/" + get_blob_path(file_hash, ".jpg")
+    assert client.uploads.count(blob_key) == 1
+    assert client.objects[blob_key][0] == b"same bytes"
+    # Kunci per analisis hanya berisi objek penunjuk kosong
+    for entry in entries:
+        data, metadata, _ = client.objects["env/" + entry["original_path"]]
+        assert data == b"" and metadata["blob-key"] == blob_key
+
+    shutil.rmtree("cache")
+    with open(s3.get_local_path(entries[1]["original_path"]), "rb") as f:
+        assert f.read() == b"same bytes"
+    with s3.open_read(entries[0]["original_path"]) as f:
+        assert f.read() == b"same bytes"
+
+
+def test_reconcile_finds_unreferenced_bucket_objects(s3, client):
+    orphan = "data/archive/masks/crashed/crashed_mask.png"
+    blob = get_blob_path("cd" * 32, ".jpg")
+    client.now -= timedelta(hours=2)
+    client.put_object(Bucket="test", Key="env/" + orphan, Body=b"x")
+    client.put_object(Bucket="test", Key="env/" + blob, Body=b"yy")
+    # Objek yang masih dalam masa tenggang (baru diunggah) tidak dianggap yatim
+    client.now += timedelta(hours=2)
+    client.put_object(Bucket="test", Key="env/data/archive/masks/running/m.png", Body=b"z")
+
+    report = gc.reconcile_archive(dry_run=True, grace_minutes=60)
+    assert sorted(report["orphan_objects"]) == sorted([orphan, blob])
+    assert report["total_bytes"] == 3
+
+    gc.reconcile_archive(dry_run=False, grace_minutes=60)
+    assert list(client.objects) == ["env/data/archive/masks/running/m.png"]
+
+
+def test_unreferenced_blob_objects_are_released_after_grace(s3, client):
+    old_hash, fresh_hash = "ef" * 32, "12" * 32
+    client.now -= timedelta(days=1)
+    client.put_object(Bucket="test", Key="env/" + get_blob_path(old_hash, ".mp4"), Body=b"old")
+    client.now += timedelta(days=1)
+    # Blob yang baru disentuh mungkin sedang dipakai entri replika lain yang belum di-commit
+    client.put_object(Bucket="test", Key="env/" + get_blob_path(fresh_hash, ".mp4"), Body=b"new")
+
+    gc._release_remote_blobs([old_hash, fresh_hash])
+    assert list(client.objects) == ["env/" + get_blob_path(fresh_hash, ".mp4")]
@@ -0,0 +1,113 @@
+# utils/aggregates.py
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Impor koneksi & penyusun filter dari modul database
+from .database import get_db_connection, build_history_where
+
+# Jumlah bin histogram tutupan awan (0-100% dibagi rata)
+COVERAGE_BINS = 10
+_BIN_WIDTH = 100 / COVERAGE_BINS
+
+def _empty_aggregates() -> Dict[str, Any]:
+    """Struktur agregat kosong yang dipahami oleh `render_summary_dashboard`."""
+    return {
+        "total": 0,
+        "media_type_counts": {},
+        "coverage_histogram": [0] * COVERAGE_BINS,
+        "cloud_type_counts": {},
+    }
+
+def get_dashboard_aggregates(
+    filters: Optional[Dict[str, List[Any]]] = None,
+    ids: Optional[List[int]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    search: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Menghitung agregat dasbor langsung di SQLite menggunakan GROUP BY,
+    sehingga biaya sebanding dengan jumlah bin, bukan jumlah baris riwayat.
+
+    Args:
+        filters (dict, optional): Filter kolom, lihat `build_history_where`.
+        ids (list, optional): Batasi agregasi ke ID tertentu.
+        start (datetime, optional): Batas bawah waktu analisis (inklusif).
+        end (datetime, optional): Batas atas waktu analisis (eksklusif).
+        search (str, optional): Teks pencarian bebas (nama file, jenis awan, dll.).
+
+    Returns:
+        Dict[str, Any]: total, media_type_counts, coverage_histogram, cloud_type_counts.
+    """
+    aggregates = _empty_aggregates()
+    conn = get_db_connection()
+    if not conn:
+        return aggregates
+
+    where, params = build_history_where(filters, ids, search)
+    # Rentang waktu memakai kolom epoch yang ter-index
+    time_clauses = []
+    if start is not None:
+        time_clauses.append("analyzed_at_epoch >= ?")
+        params.append(int(start.timestamp()))
+    if end is not None:
+        time_clauses.append("analyzed_at_epoch < ?")
+        params.append(int(end.timestamp()))
+    if time_clauses:
+        where = (f"{where} AND " if where else "WHERE ") + " AND ".join(time_clauses)
+
+    rows = conn.execute(f"SELECT media_type, COUNT(*) FROM history {where} GROUP BY media_type", params)
+    for media_type, count in rows:
+        aggregates["media_type_counts"][media_type or "unknown"] = count
+    aggregates["total"] = sum(aggregates["media_type_counts"].values())
+    if not aggregates["total"]:
+        return aggregates
+
+    # Nilai 100% dimasukkan ke bin terakhir
+    coverage_where = f"{where} AND cloud_coverage IS NOT NULL" if where else "WHERE cloud_coverage IS NOT NULL"
+    rows = conn.execute(f"""
+        SELECT MIN(CAST(cloud_coverage / ? AS INTEGER), ?) AS bin, COUNT(*)
+        FROM history {coverage_where} GROUP BY bin
+    """, [_BIN_WIDTH, COVERAGE_BINS - 1] + params)
+    for bin_index, count in rows:
+        aggregates["coverage_histogram"][max(0, bin_index)] += count
+
+    type_where = f"{where} AND dominant_cloud_type IS NOT NULL" if where else "WHERE dominant_cloud_type IS NOT NULL"
+    rows = conn.execute(f"""
+        SELECT dominant_cloud_type, COUNT(*) FROM history {type_where}
+        GROUP BY dominant_cloud_type ORDER BY COUNT(*) DESC
+    """, params)
+    aggregates["cloud_type_counts"] = {cloud_type: count for cloud_type, count in rows}
+    return aggregates
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_dashboard_aggregates(change_token: Tuple[int, int], **kwargs) -> Dict[str, Any]:
+    """
+    `get_dashboard_aggregates` yang di-cache per token perubahan riwayat
+    (`get_history_change_token`); dihitung ulang hanya jika data berubah.
+    """
+    return get_dashboard_aggregates(**kwargs)
+
+def compute_aggregates_from_df(data: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Menghitung agregat dasbor dari DataFrame di memori (misal hasil satu sesi analisis)
+    dengan struktur yang sama seperti `get_dashboard_aggregates`.
+    """
+    aggregates = _empty_aggregates()
+    if data.empty:
+        return aggregates
+
+    aggregates["total"] = len(data)
+    if "media_type" in data:
+        aggregates["media_type_counts"] = data["media_type"].fillna("unknown").value_counts().to_dict()
+    if "cloud_coverage" in data:
+        coverage = pd.to_numeric(data["cloud_coverage"], errors="coerce").dropna()
+        bins = np.clip((coverage // _BIN_WIDTH).astype(int), 0, COVERAGE_BINS - 1)
+        aggregates["coverage_histogram"] = np.bincount(bins, minlength=COVERAGE_BINS).tolist()
+    if "dominant_cloud_type" in data:
+        aggregates["cloud_type_counts"] = data["dominant_cloud_type"].dropna().value_counts().to_dict()
+    return aggregates
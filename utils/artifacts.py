@@ -0,0 +1,144 @@
+# utils/artifacts.py
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Union
+
+import numpy as np
+import streamlit as st
+from PIL import Image
+
+# Impor konfigurasi terpusat dan blob store berkas asli
+from .config import config
+from .blobstore import store_blob_from_image, link_blob
+from .masks import PACKED_MASK_EXTENSION, save_packed_mask
+
+# Ambil konfigurasi yang relevan
+ARTIFACT_CONFIG = config.get('artifacts', {})
+
+# Codec bawaan jika config tidak menyebutkan jenis artefak tertentu
+_DEFAULT_CODEC = {"format": "PNG", "compress_level": 1}
+_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "PACKED": PACKED_MASK_EXTENSION}
+
+def get_codec(kind: str) -> Dict[str, Any]:
+    """Mengembalikan konfigurasi codec (format + parameter save Pillow) untuk jenis artefak."""
+    codec = dict(ARTIFACT_CONFIG.get('codecs', {}).get(kind) or _DEFAULT_CODEC)
+    codec["format"] = codec.get("format", "PNG").upper()
+    return codec
+
+def get_artifact_extension(kind: str) -> str:
+    """Ekstensi berkas (misal '.png', '.jpg') sesuai codec jenis artefak."""
+    return _EXTENSIONS.get(get_codec(kind)["format"], ".png")
+
+def save_artifact(kind: str, image: Union[Image.Image, np.ndarray], path: str) -> str:
+    """
+    Meng-encode dan menyimpan satu artefak secara sinkron memakai codec jenisnya.
+    Berkas ditulis ke path sementara lalu di-rename agar pembaca tidak melihat berkas setengah jadi.
+    """
+    codec = get_codec(kind)
+    image_format = codec.pop("format")
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    # JPEG tidak mendukung kanal alpha
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    image.save(tmp_path, format=image_format, **codec)
+    os.replace(tmp_path, path)
+    return path
+
+def save_original_image(image: Image.Image, file_hash: str, path: str) -> str:
+    """Menyimpan citra asli ke blob store (sekali per file_hash) memakai codec 'original', lalu menautkannya ke path."""
+    codec = get_codec("original")
+    codec.pop("format")
+    blob_path = store_blob_from_image(image, file_hash, get_artifact_extension("original"), **codec)
+    return link_blob(blob_path, path)
+
+@st.cache_resource
+def _get_artifact_pool() -> ThreadPoolExecutor:
+    """Pool thread penulis artefak, satu untuk seluruh proses."""
+    return ThreadPoolExecutor(
+        max_workers=int(ARTIFACT_CONFIG.get('writer_workers', 4)),
+        thread_name_prefix="artifact-writer"
+    )
+
+@st.cache_resource
+def _get_post_flush_pool() -> ThreadPoolExecutor:
+    """
+    Pool kecil terpisah untuk tugas lanjutan `flush_then` (unggah, FFmpeg, thumbnail), agar
+    tugas berat tidak berjalan di thread skrip Streamlit maupun menempati slot penulis artefak.
+    """
+    return ThreadPoolExecutor(
+        max_workers=int(ARTIFACT_CONFIG.get('post_flush_workers', 2)),
+        thread_name_prefix="artifact-post-flush"
+    )
+
+def submit_artifact(kind: str, image: Union[Image.Image, np.ndarray], path: str) -> Future:
+    """Menjadwalkan penyimpanan artefak di latar belakang. Mengembalikan Future berisi path."""
+    return _get_artifact_pool().submit(save_artifact, kind, image, path)
+
+def submit_original_image(image: Image.Image, file_hash: str, path: str) -> Future:
+    """Menjadwalkan `save_original_image` di latar belakang."""
+    return _get_artifact_pool().submit(save_original_image, image, file_hash, path)
+
+def submit_mask(analysis_data: Dict[str, Any], path: str) -> Future:
+    """
+    Menjadwalkan penyimpanan mask segmentasi sesuai codec 'mask': format 'PACKED' memakai
+    mask ringkas resolusi model (lihat utils/masks.py), format lain memakai raster 0/255.
+    """
+    if get_codec("mask")["format"] == "PACKED":
+        return _get_artifact_pool().submit(save_packed_mask, analysis_data, path)
+    return submit_artifact("mask", analysis_data['segmentation_mask'] * 255, path)
+
+def flush_artifacts(futures: List[Future]) -> List[Any]:
+    """
+    Menunggu semua artefak selesai ditulis. Melempar exception pertama jika ada yang gagal,
+    sehingga entri database tidak pernah menunjuk ke berkas yang belum/tidak ada.
+    """
+    return [future.result() for future in futures]
+
+def flush_then(futures: List[Future], func: Callable[[], Any]) -> Future:
+    """
+    Menjalankan `func` (misal `add_history_entry`) hanya setelah semua artefak berhasil ditulis,
+    tanpa memblokir pemanggil. `func` selalu dijadwalkan ke pool post-flush, tidak pernah dipanggil
+    langsung dari callback Future (yang bisa berjalan di thread skrip atau di thread penulis artefak).
+    Mengembalikan Future yang membawa hasil `func`; jika `func` mengembalikan Future (misal dari
+    thread penulis database), hasil akhirnya ikut diteruskan.
+    """
+    result_future: Future = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _forward(inner: Future):
+        if inner.exception():
+            result_future.set_exception(inner.exception())
+        else:
+            result_future.set_result(inner.result())
+
+    def _run():
+        try:
+            flush_artifacts(futures)
+            result = func()
+        except Exception as e:
+            result_future.set_exception(e)
+            return
+        if isinstance(result, Future):
+            result.add_done_callback(_forward)
+        else:
+            result_future.set_result(result)
+
+    def _on_done(_):
+        # Dipanggil sekali per artefak; `func` dijalankan saat artefak terakhir selesai
+        with lock:
+            remaining[0] -= 1
+            is_last = remaining[0] == 0
+        if is_last:
+            _get_post_flush_pool().submit(_run)
+
+    if not futures:
+        _get_post_flush_pool().submit(_run)
+    for future in futures:
+        future.add_done_callback(_on_done)
+    return result_future
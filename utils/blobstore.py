@@ -0,0 +1,142 @@
+# utils/blobstore.py
+import os
+import time
+import shutil
+import threading
+import uuid
+from typing import Dict, Iterable, List, Set
+from PIL import Image
+
+# Impor konfigurasi terpusat dan fondasi database
+from .config import config
+from .database import get_file_hash_refcounts
+
+# Direktori blob: setiap berkas asli disimpan SEKALI, dialamatkan oleh hash kontennya
+BLOB_DIR = config.get('paths', {}).get('blob_archive', 'data/archive/blobs')
+# Blob yang baru disimpan/dipakai ulang belum tentu sudah direferensikan entri riwayat yang
+# di-commit (analisis masih berjalan); blob semuda ini tidak dilepas (disapu rekonsiliasi nanti)
+GRACE_SECONDS = float(config.get('gc', {}).get('orphan_grace_minutes', 60)) * 60
+
+# Cek-dan-tandai blob saat disimpan serta cek-dan-hapus saat dilepas berjalan atomik terhadap satu sama lain
+_blob_lock = threading.Lock()
+# Waktu terakhir blob dipakai ulang (path -> epoch). Disimpan di memori, bukan sebagai mtime blob:
+# blob berbagi inode dengan berkas asli yang menautkannya, dan mtime berkas asli menjadi bagian
+# kunci cache overlay, thumbnail, dan turunan tampilan
+_pending_blobs: Dict[str, float] = {}
+
+def get_blob_path(file_hash: str, extension: str) -> str:
+    """
+    Mengembalikan path blob untuk sebuah hash konten, dipecah ke subfolder dua tingkat
+    (misal 'ab/cd/abcd...png') agar satu direktori tidak berisi jutaan berkas.
+    """
+    return os.path.join(BLOB_DIR, file_hash[:2], file_hash[2:4], f"{file_hash}{extension}")
+
+def _publish(tmp_path: str, blob_path: str) -> str:
+    """Memindahkan berkas sementara ke lokasi blob secara atomik (aman untuk penulis bersamaan)."""
+    os.replace(tmp_path, blob_path)
+    return blob_path
+
+def _tmp_path_for(blob_path: str) -> str:
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    return f"{blob_path}.{uuid.uuid4().hex}.tmp"
+
+def _reuse_existing(blob_path: str) -> bool:
+    """
+    True jika blob sudah ada. Blob yang dipakai ulang dicatat sebagai tertunda di bawah kunci
+    yang sama dengan `release_blobs`, sehingga tidak dihapus selama masa tenggang, yaitu sebelum
+    entri riwayat yang menautkannya sempat di-commit.
+    """
+    with _blob_lock:
+        if not os.path.isfile(blob_path):
+            return False
+        _pending_blobs[blob_path] = time.time()
+        return True
+
+def _prune_pending_blobs():
+    """Membuang catatan pemakaian ulang yang sudah melewati masa tenggang. Panggil di bawah `_blob_lock`."""
+    cutoff = time.time() - GRACE_SECONDS
+    for path, touched_at in list(_pending_blobs.items()):
+        if touched_at <= cutoff:
+            del _pending_blobs[path]
+
+def get_pending_blobs() -> Set[str]:
+    """Path blob yang dipakai ulang dalam masa tenggang (untuk rekonsiliasi arsip, utils/gc.py)."""
+    with _blob_lock:
+        _prune_pending_blobs()
+        return set(_pending_blobs)
+
+def store_blob_from_file(source_path: str, file_hash: str, extension: str) -> str:
+    """Menyimpan salinan berkas ke blob store jika belum ada. Mengembalikan path blob."""
+    blob_path = get_blob_path(file_hash, extension)
+    if _reuse_existing(blob_path):
+        return blob_path
+    tmp_path = _tmp_path_for(blob_path)
+    shutil.copyfile(source_path, tmp_path)
+    return _publish(tmp_path, blob_path)
+
+def store_blob_from_image(image: Image.Image, file_hash: str, extension: str = ".png", **save_params) -> str:
+    """Meng-encode dan menyimpan citra ke blob store hanya jika blob belum ada."""
+    blob_path = get_blob_path(file_hash, extension)
+    if _reuse_existing(blob_path):
+        return blob_path
+    tmp_path = _tmp_path_for(blob_path)
+    image.save(tmp_path, format=Image.registered_extensions().get(extension.lower(), "PNG"), **save_params)
+    return _publish(tmp_path, blob_path)
+
+def link_blob(blob_path: str, dest_path: str) -> str:
+    """
+    Menautkan blob ke path arsip per-analisis tanpa menyalin data.
+    Urutan: hardlink -> symlink relatif -> salinan biasa (jika filesystem tidak mendukung tautan).
+    Symlink hanya dibuat jika blob benar-benar ada, karena symlink ke target yang hilang
+    tetap "berhasil" dibuat dan menggantung tanpa error.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(blob_path, dest_path)
+    except OSError:
+        if not os.path.isfile(blob_path):
+            raise FileNotFoundError(f"Blob tidak ditemukan: {blob_path}")
+        try:
+            os.symlink(os.path.relpath(blob_path, os.path.dirname(dest_path)), dest_path)
+        except OSError:
+            shutil.copyfile(blob_path, dest_path)
+    return dest_path
+
+def release_blobs(file_hashes: Iterable[str]) -> List[str]:
+    """
+    Menghapus blob yang sudah tidak direferensikan oleh entri riwayat mana pun.
+    Panggil SETELAH entri riwayat dihapus. Jumlah referensi dihitung dari kolom
+    'file_hash' di tabel history (ter-index), jadi tidak ada penghitung terpisah yang bisa melenceng.
+    Blob yang disimpan/dipakai ulang dalam masa tenggang dilewati: analisis yang sedang berjalan
+    mungkin sudah menautkannya tetapi belum meng-commit entri riwayatnya. Blob tersebut
+    dihapus oleh rekonsiliasi arsip (utils/gc.py) jika tetap tanpa referensi.
+
+    Returns:
+        List[str]: Path blob yang dihapus.
+    """
+    unique_hashes = {h for h in file_hashes if h}
+    refcounts = get_file_hash_refcounts(list(unique_hashes))
+    removed = []
+    for file_hash in unique_hashes:
+        if refcounts.get(file_hash, 0) > 0:
+            continue
+        shard_dir = os.path.dirname(get_blob_path(file_hash, ""))
+        if not os.path.isdir(shard_dir):
+            continue
+        cutoff = time.time() - GRACE_SECONDS
+        for name in os.listdir(shard_dir):
+            if not name.startswith(file_hash):
+                continue
+            path = os.path.join(shard_dir, name)
+            with _blob_lock:
+                try:
+                    _prune_pending_blobs()
+                    if path in _pending_blobs or os.path.getmtime(path) > cutoff:
+                        continue
+                    os.remove(path)
+                    removed.append(path)
+                except OSError as e:
+                    print(f"Gagal menghapus blob {name}: {e}")
+    return removed
@@ -4,7 +4,13 @@ import pandas as pd
 import os
 import hashlib
 import json
-from typing import Dict, Any, List, Optional
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
 import streamlit as st
 
 # Impor konfigurasi yang sudah dimuat
@@ -12,6 +18,15 @@ from .config import config
 
 # Ambil path database dari file konfigurasi
 DB_PATH = config.get('paths', {}).get('database_file', 'data/history.db')
+DB_CONFIG = config.get('database', {})
+
+# Granularitas tabel rollup: (panjang prefiks ISO 'analyzed_at', akhiran pelengkap).
+# Semua bucket_start berformat 'YYYY-MM-DDTHH:MM' (waktu lokal) agar mudah diurutkan.
+ROLLUP_GRANULARITIES = {
+    "minute": (16, ""),
+    "hour": (13, ":00"),
+    "day": (10, "T00:00"),
+}
 
 def get_pipeline_version_hash() -> str:
     """Membuat 'sidik jari' untuk versi pipeline analisis saat ini."""
@@ -29,20 +44,92 @@ def get_pipeline_version_hash() -> str:
         st.error(f"Kunci konfigurasi hilang untuk membuat hash pipeline: {e}.")
         return "invalid_config"
 
+# Pool koneksi: setiap thread memakai satu koneksi miliknya sendiri selama hidup. Streamlit
+# menjalankan setiap rerun di thread baru, jadi koneksi milik thread yang sudah selesai
+# diambil kembali ke pool idle (dibatasi 'database.pool_size') untuk dipakai thread berikutnya;
+# sisanya ditutup. Koneksi dibuat dengan check_same_thread=False karena berpindah pemilik,
+# tetapi pada satu waktu hanya dipakai oleh satu thread.
+_thread_local = threading.local()
+_pool_lock = threading.Lock()
+_idle_connections: List[sqlite3.Connection] = []
+_connection_owners: Dict[threading.Thread, sqlite3.Connection] = {}
+
+def _create_connection() -> sqlite3.Connection:
+    """Membuka koneksi SQLite baru dengan mode WAL dan pragma yang sudah disetel."""
+    busy_timeout_ms = int(DB_CONFIG.get('busy_timeout_ms', 5000))
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=busy_timeout_ms / 1000,
+        cached_statements=int(DB_CONFIG.get('cached_statements', 128)),
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL: pembaca tidak memblokir penulis (dan sebaliknya)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL sudah aman di mode WAL dan jauh lebih cepat daripada FULL
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_CONFIG.get('cache_size_kb', 20000))}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Aktifkan foreign key agar ON DELETE CASCADE (misal class_confidences) berlaku
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+def _release_connection(conn: sqlite3.Connection):
+    """Mengembalikan koneksi ke pool idle, atau menutupnya jika pool sudah penuh (panggil dengan _pool_lock)."""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        if len(_idle_connections) < int(DB_CONFIG.get('pool_size', 8)):
+            _idle_connections.append(conn)
+        else:
+            conn.close()
+    except sqlite3.Error:
+        pass # Koneksi rusak tidak dikembalikan ke pool
+
+def _reclaim_dead_thread_connections():
+    """Mengambil kembali koneksi milik thread yang sudah selesai (panggil dengan _pool_lock)."""
+    for thread in [t for t in _connection_owners if not t.is_alive()]:
+        _release_connection(_connection_owners.pop(thread))
+
 def get_db_connection() -> Optional[sqlite3.Connection]:
-    """Membuat dan mengembalikan koneksi ke database SQLite."""
+    """
+    Mengembalikan koneksi SQLite milik thread saat ini (diambil dari pool atau dibuat sekali per thread).
+    Koneksi tidak ditutup oleh blok `with`; blok tersebut hanya melakukan commit/rollback.
+    """
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None:
+        return conn
     try:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        with _pool_lock:
+            _reclaim_dead_thread_connections()
+            conn = _idle_connections.pop() if _idle_connections else None
+        if conn is None:
+            conn = _create_connection()
+        with _pool_lock:
+            _connection_owners[threading.current_thread()] = conn
+        _thread_local.conn = conn
         return conn
     except Exception as e:
         st.error(f"Gagal terhubung ke database di {DB_PATH}: {e}")
         return None
 
-def init_db():
-    """Menginisialisasi tabel 'history'."""
-    query = """
+def close_db_connection():
+    """Menutup koneksi milik thread saat ini (jika ada) dan mengeluarkannya dari pool."""
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None:
+        with _pool_lock:
+            _connection_owners.pop(threading.current_thread(), None)
+        conn.close()
+        _thread_local.conn = None
+
+# --- Migrasi Skema ---
+# Setiap migrasi dijalankan sekali, berurutan, dan dicatat di tabel 'schema_version'.
+# Migrasi baru cukup ditambahkan di akhir daftar MIGRATIONS dengan nomor versi berikutnya.
+
+def _migration_base_schema(conn: sqlite3.Connection):
+    """Versi 1: tabel 'history' dasar."""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS history (
         -- Kunci & Versi
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -73,12 +160,367 @@ def init_db():
 
         -- Constraint untuk memastikan setiap analisis unik
         UNIQUE(analysis_hash)
-    );
+    )
+    """)
+
+def _migration_rollup_tables(conn: sqlite3.Connection):
+    """Versi 2: tabel rollup deret waktu (diisi dari data lama jika perlu)."""
+    # Rollup deret waktu: rata-rata tutupan awan per bucket & tipe media
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_coverage (
+        granularity TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        sample_count INTEGER NOT NULL DEFAULT 0,
+        coverage_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, bucket_start, media_type)
+    )
+    """)
+    # Rollup distribusi nilai Okta per bucket & tipe media
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_okta (
+        granularity TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        okta_value INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, bucket_start, media_type, okta_value)
+    )
+    """)
+    # Rollup jumlah jenis awan dominan per bucket & tipe media
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_cloud_type (
+        granularity TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        media_type TEXT NOT NULL,
+        dominant_cloud_type TEXT NOT NULL,
+        sample_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, bucket_start, media_type, dominant_cloud_type)
+    )
+    """)
+    # Isi rollup dari data lama jika tabel rollup masih kosong
+    has_history = conn.execute("SELECT EXISTS(SELECT 1 FROM history)").fetchone()[0]
+    has_rollup = conn.execute("SELECT EXISTS(SELECT 1 FROM rollup_okta)").fetchone()[0]
+    if has_history and not has_rollup:
+        rebuild_rollups(conn)
+
+def _migration_analyzed_at_epoch(conn: sqlite3.Connection):
+    """Versi 3: kolom epoch integer untuk 'analyzed_at' agar query rentang waktu memakai index."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(history)")}
+    if "analyzed_at_epoch" not in columns:
+        conn.execute("ALTER TABLE history ADD COLUMN analyzed_at_epoch INTEGER")
+    # strftime('%s') milik SQLite memahami offset zona waktu ISO (misal '+07:00')
+    conn.execute("UPDATE history SET analyzed_at_epoch = CAST(strftime('%s', analyzed_at) AS INTEGER) WHERE analyzed_at_epoch IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_analyzed_at_epoch ON history(analyzed_at_epoch)")
+
+def _migration_history_indexes(conn: sqlite3.Connection):
+    """Versi 4: index sekunder untuk kolom yang sering difilter dan diurutkan."""
+    # Index komposit (filter, waktu) agar filter + urut waktu cukup dengan satu index seek
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_media_type ON history(media_type, analyzed_at_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_sky_condition ON history(sky_condition, analyzed_at_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_dominant_cloud_type ON history(dominant_cloud_type, analyzed_at_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_file_hash ON history(file_hash)")
+    conn.execute("ANALYZE")
+
+# Pola satu bagian string 'classification_details', misal "Cumulus (81.23%)"
+_CONFIDENCE_DETAIL_PATTERN = re.compile(r"^\s*(.+?)\s*\((\d+(?:\.\d+)?)%\)\s*$")
+
+def _migration_class_confidences(conn: sqlite3.Connection):
+    """Versi 5: tabel confidence per kelas (ternormalisasi), diisi dari 'classification_details' lama."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS class_confidences (
+        history_id INTEGER NOT NULL REFERENCES history(id) ON DELETE CASCADE,
+        class_index INTEGER NOT NULL,
+        confidence REAL NOT NULL,
+        PRIMARY KEY (history_id, class_index)
+    ) WITHOUT ROWID
+    """)
+    # Index per kelas agar query seperti "Cumulonimbus > 0.6" cukup dengan range scan
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_class_confidences_class ON class_confidences(class_index, confidence)")
+
+    rows = conn.execute("SELECT id, classification_details FROM history WHERE classification_details IS NOT NULL")
+    backfill = []
+    for history_id, details in rows:
+        confidences = {}
+        for part in details.split(";"):
+            match = _CONFIDENCE_DETAIL_PATTERN.match(part)
+            if match:
+                confidences[match.group(1)] = float(match.group(2)) / 100
+        backfill.extend((history_id, class_index, confidence) for class_index, confidence in _to_class_rows(confidences))
+    conn.executemany("INSERT OR IGNORE INTO class_confidences (history_id, class_index, confidence) VALUES (?, ?, ?)", backfill)
+
+# Kolom teks riwayat yang diindeks untuk pencarian teks penuh
+FTS_COLUMNS = ("source_filename", "sky_condition", "dominant_cloud_type", "classification_details")
+
+def _create_history_fts_update_trigger(conn: sqlite3.Connection):
     """
-    with get_db_connection() as conn:
-        if conn:
-            conn.cursor().execute(query)
-            conn.commit()
+    Trigger sinkronisasi FTS saat baris diperbarui. Hanya aktif jika kolom yang di-index
+    berubah, sehingga UPDATE lain (path artefak, tingkat penyimpanan) tidak menulis ulang index.
+    """
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_update AFTER UPDATE OF {columns} ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        INSERT INTO history_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END
+    """)
+
+def _migration_history_fts(conn: sqlite3.Connection):
+    """
+    Versi 6: index teks penuh FTS5 (external content) atas kolom teks riwayat,
+    disinkronkan oleh trigger. Dilewati jika SQLite tidak dikompilasi dengan FTS5;
+    pencarian kemudian jatuh ke LIKE biasa.
+    """
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    try:
+        conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+            {columns}, content='history', content_rowid='id', prefix='2 3'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"FTS5 tidak tersedia, pencarian riwayat memakai LIKE: {e}")
+        return
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts (rowid, {columns}) VALUES (new.id, {new_values});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts (history_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+    END
+    """)
+    _create_history_fts_update_trigger(conn)
+    # Indeks seluruh data lama
+    conn.execute("INSERT INTO history_fts (history_fts) VALUES ('rebuild')")
+
+def _migration_history_meta(conn: sqlite3.Connection):
+    """
+    Versi 7: tabel penghitung meta riwayat. 'delete_count' dinaikkan oleh trigger
+    setiap kali baris history dihapus, sehingga cache turunan tahu kapan harus
+    dibangun ulang.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS history_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO history_meta (key, value) VALUES ('delete_count', 0)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS history_meta_delete AFTER DELETE ON history BEGIN
+        UPDATE history_meta SET value = value + 1 WHERE key = 'delete_count';
+    END
+    """)
+
+def _migration_artifact_deletions(conn: sqlite3.Connection):
+    """
+    Versi 8: antrean penghapusan artefak. Baris riwayat dihapus dan artefaknya
+    dimasukkan ke antrean dalam SATU transaksi; berkasnya dihapus oleh pengumpul
+    latar belakang (utils/gc.py). 'path' berisi path artefak, 'file_hash' berisi
+    hash blob yang perlu dicek ulang jumlah referensinya.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS artifact_deletions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT,
+        file_hash TEXT,
+        queued_at INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT
+    )
+    """)
+
+def _migration_storage_tier(conn: sqlite3.Connection):
+    """
+    Versi 9: kolom 'storage_tier' untuk retensi bertingkat (utils/retention.py):
+    0 = artefak lengkap, 1 = ringkas (citra asli diperkecil, overlay dibuang),
+    2 = dikemas ke arsip tar harian. Baris & statistik tetap bisa di-query di semua tingkat.
+    """
+    conn.execute("ALTER TABLE history ADD COLUMN storage_tier INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_tier_epoch ON history (storage_tier, analyzed_at_epoch)")
+
+def _migration_location_count(conn: sqlite3.Connection):
+    """
+    Versi 10: penghitung 'location_count' di history_meta, dinaikkan setiap kali path
+    artefak dipindahkan (retensi). Terpisah dari 'delete_count' agar cache yang tidak
+    memuat path (agregat, rollup, jumlah baris) tidak ikut dibangun ulang.
+    """
+    conn.execute("INSERT OR IGNORE INTO history_meta (key, value) VALUES ('location_count', 0)")
+
+def _migration_history_fts_update_columns(conn: sqlite3.Connection):
+    """
+    Versi 11: trigger update FTS dibatasi ke kolom yang di-index (AFTER UPDATE OF ...).
+    Dilewati jika tabel FTS tidak ada (SQLite tanpa FTS5).
+    """
+    if not _has_history_fts(conn):
+        return
+    conn.execute("DROP TRIGGER IF EXISTS history_fts_update")
+    _create_history_fts_update_trigger(conn)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "Tabel history dasar", _migration_base_schema),
+    (2, "Tabel rollup deret waktu", _migration_rollup_tables),
+    (3, "Kolom analyzed_at_epoch", _migration_analyzed_at_epoch),
+    (4, "Index sekunder tabel history", _migration_history_indexes),
+    (5, "Tabel confidence per kelas", _migration_class_confidences),
+    (6, "Index teks penuh riwayat (FTS5)", _migration_history_fts),
+    (7, "Tabel meta penghitung penghapusan", _migration_history_meta),
+    (8, "Antrean penghapusan artefak", _migration_artifact_deletions),
+    (9, "Kolom tingkat penyimpanan (retensi)", _migration_storage_tier),
+    (10, "Penghitung perpindahan lokasi artefak", _migration_location_count),
+    (11, "Trigger update FTS hanya untuk kolom ter-index", _migration_history_fts_update_columns),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Mengembalikan versi skema database saat ini (0 jika belum pernah dimigrasi)."""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def init_db():
+    """Menginisialisasi database dan menjalankan semua migrasi skema yang belum diterapkan."""
+    conn = get_db_connection()
+    if conn:
+        apply_migrations(conn)
+
+def apply_migrations(conn: sqlite3.Connection):
+    """Menjalankan semua migrasi yang belum diterapkan pada koneksi yang diberikan."""
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+        """)
+
+    current_version = get_schema_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        # Setiap migrasi berjalan dalam transaksinya sendiri bersama pencatatan versinya
+        with conn:
+            migrate(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, datetime('now'))",
+                (version, description)
+            )
+        print(f"Migrasi database diterapkan: v{version} - {description}")
+
+def get_history_delete_count(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Mengembalikan jumlah total baris history yang pernah dihapus (penanda invalidasi cache)."""
+    conn = conn or get_db_connection()
+    if not conn:
+        return 0
+    row = conn.execute("SELECT value FROM history_meta WHERE key = 'delete_count'").fetchone()
+    return row[0] if row else 0
+
+def get_history_location_count(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Mengembalikan jumlah pembaruan lokasi artefak (penanda invalidasi cache yang memuat path)."""
+    conn = conn or get_db_connection()
+    if not conn:
+        return 0
+    row = conn.execute("SELECT value FROM history_meta WHERE key = 'location_count'").fetchone()
+    return row[0] if row else 0
+
+def get_class_names() -> List[str]:
+    """Daftar nama kelas klasifikasi; posisi dalam daftar menjadi 'class_index' di database."""
+    return list(config.get('models', {}).get('classification', {}).get('class_names', []))
+
+def _to_class_rows(confidences: Optional[Dict[str, Any]]) -> List[Tuple[int, float]]:
+    """Mengubah {label: confidence} menjadi [(class_index, confidence)], melewati label tak dikenal & NaN."""
+    class_index = {name: i for i, name in enumerate(get_class_names())}
+    rows = []
+    for label, confidence in (confidences or {}).items():
+        if label not in class_index or confidence is None:
+            continue
+        confidence = float(confidence)
+        if confidence == confidence: # Lewati NaN
+            rows.append((class_index[label], confidence))
+    return rows
+
+def _to_epoch(analyzed_at: Any) -> Optional[int]:
+    """Mengonversi timestamp ISO menjadi detik epoch (UTC) untuk kolom 'analyzed_at_epoch'."""
+    try:
+        return int(datetime.fromisoformat(str(analyzed_at)).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def _get_bucket_start(analyzed_at: str, granularity: str) -> str:
+    """Memotong timestamp ISO 'analyzed_at' menjadi awal bucket rollup."""
+    length, suffix = ROLLUP_GRANULARITIES[granularity]
+    return str(analyzed_at)[:length] + suffix
+
+def _apply_rollups(cursor: sqlite3.Cursor, entry: Dict[str, Any], sign: int = 1):
+    """
+    Memperbarui semua tabel rollup secara inkremental untuk satu entri.
+    `sign` bernilai 1 saat entri ditambahkan dan -1 saat entri dihapus; bucket yang menjadi
+    kosong dibuang sekali oleh pemanggil setelah seluruh entri diproses.
+    """
+    analyzed_at = entry.get("analyzed_at")
+    if not analyzed_at:
+        return
+    media_type = entry.get("media_type") or "unknown"
+    coverage = entry.get("cloud_coverage")
+    okta = entry.get("okta_value")
+    cloud_type = entry.get("dominant_cloud_type")
+
+    for granularity in ROLLUP_GRANULARITIES:
+        bucket = _get_bucket_start(analyzed_at, granularity)
+        if coverage is not None and pd.notna(coverage):
+            cursor.execute("""
+                INSERT INTO rollup_coverage (granularity, bucket_start, media_type, sample_count, coverage_sum)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(granularity, bucket_start, media_type) DO UPDATE SET
+                    sample_count = sample_count + excluded.sample_count,
+                    coverage_sum = coverage_sum + excluded.coverage_sum
+            """, (granularity, bucket, media_type, sign, sign * float(coverage)))
+        if okta is not None and pd.notna(okta):
+            cursor.execute("""
+                INSERT INTO rollup_okta (granularity, bucket_start, media_type, okta_value, sample_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(granularity, bucket_start, media_type, okta_value) DO UPDATE SET
+                    sample_count = sample_count + excluded.sample_count
+            """, (granularity, bucket, media_type, int(okta), sign))
+        if cloud_type:
+            cursor.execute("""
+                INSERT INTO rollup_cloud_type (granularity, bucket_start, media_type, dominant_cloud_type, sample_count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(granularity, bucket_start, media_type, dominant_cloud_type) DO UPDATE SET
+                    sample_count = sample_count + excluded.sample_count
+            """, (granularity, bucket, media_type, cloud_type, sign))
+
+def rebuild_rollups(conn: sqlite3.Connection):
+    """
+    Membangun ulang seluruh tabel rollup dari tabel history (untuk data lama).
+    Commit menjadi tanggung jawab pemanggil.
+    """
+    cursor = conn.cursor()
+    for table in ("rollup_coverage", "rollup_okta", "rollup_cloud_type"):
+        cursor.execute(f"DELETE FROM {table}")
+    for granularity, (length, suffix) in ROLLUP_GRANULARITIES.items():
+        bucket_expr = f"substr(analyzed_at, 1, {length}) || '{suffix}'"
+        media_expr = "COALESCE(media_type, 'unknown')"
+        cursor.execute(f"""
+            INSERT INTO rollup_coverage (granularity, bucket_start, media_type, sample_count, coverage_sum)
+            SELECT ?, {bucket_expr}, {media_expr}, COUNT(*), SUM(cloud_coverage)
+            FROM history WHERE cloud_coverage IS NOT NULL GROUP BY 2, 3
+        """, (granularity,))
+        cursor.execute(f"""
+            INSERT INTO rollup_okta (granularity, bucket_start, media_type, okta_value, sample_count)
+            SELECT ?, {bucket_expr}, {media_expr}, okta_value, COUNT(*)
+            FROM history WHERE okta_value IS NOT NULL GROUP BY 2, 3, 4
+        """, (granularity,))
+        cursor.execute(f"""
+            INSERT INTO rollup_cloud_type (granularity, bucket_start, media_type, dominant_cloud_type, sample_count)
+            SELECT ?, {bucket_expr}, {media_expr}, dominant_cloud_type, COUNT(*)
+            FROM history WHERE dominant_cloud_type IS NOT NULL AND dominant_cloud_type != '' GROUP BY 2, 3, 4
+        """, (granularity,))
 
 def find_history(analysis_hash: str) -> Optional[Dict[str, Any]]:
     """Mencari entri riwayat berdasarkan HASH ANALISIS yang unik."""
@@ -89,52 +531,663 @@ def find_history(analysis_hash: str) -> Optional[Dict[str, Any]]:
             row = conn.cursor().execute(query, (analysis_hash,)).fetchone()
             return dict(row) if row else None
 
-def add_history_entry(entry: Dict[str, Any]):
-    """Menambahkan satu entri hasil analisis ke dalam tabel history."""
-    # DIUBAH: Query INSERT sekarang menyertakan analysis_hash
-    query = """
-    INSERT OR IGNORE INTO history (
-        analysis_hash, pipeline_version_hash, file_hash, source_filename, media_type, file_size_bytes,
-        analyzed_at, analysis_duration_sec, cloud_coverage, okta_value, sky_condition,
-        dominant_cloud_type, classification_details, original_path, mask_path, overlay_path
-    ) VALUES (
-        :analysis_hash, :pipeline_version_hash, :file_hash, :source_filename, :media_type, :file_size_bytes,
-        :analyzed_at, :analysis_duration_sec, :cloud_coverage, :okta_value, :sky_condition,
-        :dominant_cloud_type, :classification_details, :original_path, :mask_path, :overlay_path
+# Batas aman jumlah parameter per query (SQLite lama membatasi 999 variabel)
+_SQL_PARAM_CHUNK_SIZE = 500
+
+def find_history_many(analysis_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Mencari banyak entri riwayat sekaligus berdasarkan HASH ANALISIS.
+    Menggunakan query `IN (...)` per potongan (chunk) alih-alih satu query per hash.
+    Mengembalikan dict {analysis_hash: entri} hanya untuk hash yang ditemukan.
+    """
+    unique_hashes = list(dict.fromkeys(analysis_hashes))
+    found = {}
+    conn = get_db_connection()
+    if not conn or not unique_hashes:
+        return found
+
+    for i in range(0, len(unique_hashes), _SQL_PARAM_CHUNK_SIZE):
+        chunk = unique_hashes[i:i + _SQL_PARAM_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        query = f"SELECT * FROM history WHERE analysis_hash IN ({placeholders})"
+        for row in conn.execute(query, chunk):
+            found[row["analysis_hash"]] = dict(row)
+    return found
+
+# Query INSERT untuk satu entri riwayat (dipakai oleh thread penulis)
+_INSERT_HISTORY_QUERY = """
+INSERT OR IGNORE INTO history (
+    analysis_hash, pipeline_version_hash, file_hash, source_filename, media_type, file_size_bytes,
+    analyzed_at, analyzed_at_epoch, analysis_duration_sec, cloud_coverage, okta_value, sky_condition,
+    dominant_cloud_type, classification_details, original_path, mask_path, overlay_path
+) VALUES (
+    :analysis_hash, :pipeline_version_hash, :file_hash, :source_filename, :media_type, :file_size_bytes,
+    :analyzed_at, :analyzed_at_epoch, :analysis_duration_sec, :cloud_coverage, :okta_value, :sky_condition,
+    :dominant_cloud_type, :classification_details, :original_path, :mask_path, :overlay_path
+)
+"""
+
+def _insert_history_entry(cursor: sqlite3.Cursor, entry: Dict[str, Any]) -> Optional[int]:
+    """Menyisipkan satu entri di dalam transaksi yang sedang berjalan. Mengembalikan ID baris baru."""
+    entry = {**entry, "analyzed_at_epoch": _to_epoch(entry.get("analyzed_at"))}
+    cursor.execute(_INSERT_HISTORY_QUERY, entry)
+    # Rollup hanya diperbarui jika baris benar-benar ditambahkan (bukan duplikat)
+    if cursor.rowcount != 1:
+        return None
+    history_id = cursor.lastrowid
+    _apply_rollups(cursor, entry, sign=1)
+    # Confidence per kelas disimpan ternormalisasi (satu baris per kelas) dalam transaksi yang sama
+    cursor.executemany(
+        "INSERT INTO class_confidences (history_id, class_index, confidence) VALUES (?, ?, ?)",
+        [(history_id, class_index, confidence) for class_index, confidence in _to_class_rows(entry.get("cloud_type_confidences"))]
     )
+    return history_id
+
+# Jeda sebelum thread penulis mencoba membuka koneksi lagi setelah gagal
+_WRITER_RETRY_DELAY_SEC = 1.0
+
+class _HistoryWriter:
     """
-    with get_db_connection() as conn:
+    Thread penulis tunggal yang memiliki satu-satunya koneksi tulis ke database.
+
+    Entri dari semua sesi dimasukkan ke antrean, lalu di-commit secara berkelompok
+    (group commit) berdasarkan jumlah atau jendela waktu. Dengan satu penulis,
+    error 'database is locked' antar-penulis tidak lagi terjadi.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[str, Any, Future]]" = queue.Queue()
+        self._batch_size = int(DB_CONFIG.get('writer_batch_size', 64))
+        self._batch_window = DB_CONFIG.get('writer_batch_window_ms', 50) / 1000
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit_entries(self, entries: List[Dict[str, Any]]) -> Future:
+        """Menjadwalkan penyisipan entri. Future berisi daftar ID (None untuk duplikat)."""
+        future: Future = Future()
+        self._queue.put(("entries", list(entries), future))
+        return future
+
+    def submit_job(self, job: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Menjadwalkan operasi tulis lain (misal hapus) yang dijalankan dalam transaksinya sendiri."""
+        future: Future = Future()
+        self._queue.put(("job", job, future))
+        return future
+
+    def _collect_batch(self) -> List[Tuple[str, Any, Future]]:
+        """Menunggu item pertama, lalu mengumpulkan item tambahan hingga batas jumlah atau jendela waktu tercapai."""
+        batch = [self._queue.get()]
+        entry_count = len(batch[0][1]) if batch[0][0] == "entries" else 0
+        deadline = time.monotonic() + self._batch_window
+        while entry_count < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item[0] == "entries":
+                entry_count += len(item[1])
+        return batch
+
+    def _run(self):
+        conn: Optional[sqlite3.Connection] = None
+        while True:
+            batch = self._collect_batch()
+            try:
+                # Koneksi dibuka (ulang) di dalam loop agar kegagalan tidak mematikan thread
+                if conn is None:
+                    conn = _create_connection()
+                self._process(conn, batch)
+            except Exception as e:
+                # Gagalkan semua Future yang belum selesai agar pemanggil tidak menunggu selamanya,
+                # lalu buang koneksi; batch berikutnya mencoba membuka koneksi baru
+                print(f"Thread penulis riwayat gagal memproses batch: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+                time.sleep(_WRITER_RETRY_DELAY_SEC)
+
+    def _process(self, conn: sqlite3.Connection, batch: List[Tuple[str, Any, Future]]):
+        entry_items = [item for item in batch if item[0] == "entries"]
+        if entry_items:
+            try:
+                # Group commit: semua entri dalam satu transaksi
+                with conn:
+                    cursor = conn.cursor()
+                    results = [[_insert_history_entry(cursor, e) for e in payload] for _, payload, _ in entry_items]
+                for (_, _, future), ids in zip(entry_items, results):
+                    future.set_result(ids)
+            except Exception:
+                # Jika satu entri gagal, ulangi per permintaan agar kegagalan tidak menular
+                for _, payload, future in entry_items:
+                    self._run_isolated(conn, future, lambda c, p=payload: [_insert_history_entry(c.cursor(), e) for e in p])
+
+        for kind, job, future in batch:
+            if kind == "job":
+                self._run_isolated(conn, future, job)
+
+    @staticmethod
+    def _run_isolated(conn: sqlite3.Connection, future: Future, job: Callable[[sqlite3.Connection], Any]):
+        try:
+            with conn:
+                result = job(conn)
+            future.set_result(result)
+        except Exception as e:
+            print(f"Gagal menulis ke database riwayat: {e}")
+            future.set_exception(e)
+
+@st.cache_resource
+def _get_history_writer() -> _HistoryWriter:
+    """Membuat thread penulis tunggal sekali per proses aplikasi."""
+    return _HistoryWriter()
+
+def add_history_entry(entry: Dict[str, Any]) -> Future:
+    """
+    Menambahkan satu entri hasil analisis ke dalam tabel history melalui thread penulis.
+
+    Returns:
+        Future: Selesai setelah entri di-commit; berisi ID baris baru (None jika duplikat).
+    """
+    batch_future = _get_history_writer().submit_entries([entry])
+    future: Future = Future()
+
+    def _unwrap(done: Future):
+        if done.exception():
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result()[0])
+    batch_future.add_done_callback(_unwrap)
+    return future
+
+def add_history_entries(entries: List[Dict[str, Any]]) -> Future:
+    """
+    Menambahkan banyak entri sekaligus dalam satu transaksi melalui thread penulis.
+
+    Returns:
+        Future: Selesai setelah semua entri di-commit; berisi daftar ID (None untuk duplikat).
+    """
+    return _get_history_writer().submit_entries(entries)
+
+# --- Change Feed Riwayat ---
+def get_history_change_token() -> Tuple[int, int]:
+    """
+    Mengembalikan token perubahan riwayat yang murah dihitung: (ID maksimum, jumlah penghapusan).
+    Token hanya berubah jika ada entri baru atau entri yang dihapus, sehingga dapat dipakai
+    sebagai kunci cache (`st.cache_data`) untuk melewati komputasi ulang saat data tidak berubah.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return (0, 0)
+    max_id = conn.execute("SELECT MAX(id) FROM history").fetchone()[0] or 0
+    return (max_id, get_history_delete_count(conn))
+
+def get_history_since(after_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Mengambil hanya entri yang lebih baru dari ID yang sudah dimiliki pemanggil.
+    Berguna untuk memperbarui data di memori secara inkremental (id selalu naik).
+    """
+    select_cols = "*" if columns is None else ", ".join(["id"] + [c for c in columns if c != "id"])
+    conn = get_db_connection()
+    if not conn:
+        return pd.DataFrame()
+    return pd.read_sql_query(f"SELECT {select_cols} FROM history WHERE id > ? ORDER BY id", conn, params=[int(after_id)], index_col="id")
+
+# --- API Query Riwayat Sisi Server (filter, sortir & paginasi di SQL) ---
+# Whitelist kolom untuk mencegah SQL injection melalui nama kolom dinamis
+HISTORY_FILTER_COLUMNS = ("media_type", "sky_condition", "dominant_cloud_type")
+HISTORY_SORT_COLUMNS = {
+    "analyzed_at": "analyzed_at_epoch", # Diurutkan lewat kolom epoch yang ter-index
+    "source_filename": "source_filename",
+    "media_type": "media_type",
+    "cloud_coverage": "cloud_coverage",
+    "okta_value": "okta_value",
+    "id": "id",
+}
+
+def _has_history_fts(conn: sqlite3.Connection) -> bool:
+    """Memeriksa apakah tabel FTS5 riwayat tersedia di database."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'history_fts'").fetchone()
+    return row is not None
+
+def _to_fts_query(text: str) -> str:
+    """
+    Mengubah teks bebas dari pengguna menjadi query FTS5 yang aman:
+    setiap kata dikutip (mencegah sintaks FTS tak sengaja) dan dicocokkan sebagai prefiks.
+    """
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{term}"*' for term in terms)
+
+def _build_search_clause(conn: sqlite3.Connection, text: str) -> Tuple[str, List[Any]]:
+    """Klausa pencarian teks: subquery FTS5 jika tersedia, atau LIKE sebagai cadangan."""
+    if _has_history_fts(conn):
+        fts_query = _to_fts_query(text)
+        if not fts_query:
+            return "", []
+        return "id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)", [fts_query]
+    pattern = f"%{text.strip()}%"
+    return "(" + " OR ".join(f"{c} LIKE ?" for c in FTS_COLUMNS) + ")", [pattern] * len(FTS_COLUMNS)
+
+def search_history_ids(text: str, limit: Optional[int] = None) -> List[int]:
+    """
+    Mencari ID riwayat yang cocok dengan teks (nama file, kondisi langit, jenis awan,
+    detail klasifikasi). Hasil diurutkan berdasarkan relevansi jika FTS5 tersedia.
+    """
+    conn = get_db_connection()
+    if not conn or not text.strip():
+        return []
+    if _has_history_fts(conn):
+        fts_query = _to_fts_query(text)
+        if not fts_query:
+            return []
+        query, params = "SELECT rowid FROM history_fts WHERE history_fts MATCH ? ORDER BY rank", [fts_query]
+    else:
+        clause, params = _build_search_clause(conn, text)
+        query = f"SELECT id FROM history WHERE {clause} ORDER BY id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return [row[0] for row in conn.execute(query, params)]
+
+def build_history_where(
+    filters: Optional[Dict[str, List[Any]]] = None,
+    ids: Optional[List[int]] = None,
+    search: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """
+    Menyusun klausa WHERE beserta parameternya dari filter kolom, daftar ID, dan teks pencarian.
+
+    Args:
+        filters (dict, optional): {kolom: [nilai, ...]}; kolom harus ada di HISTORY_FILTER_COLUMNS.
+        ids (list, optional): Batasi hasil ke ID tertentu.
+        search (str, optional): Teks pencarian bebas (lihat `search_history_ids`).
+
+    Returns:
+        Tuple[str, list]: Klausa (kosong atau diawali 'WHERE') dan daftar parameter.
+    """
+    clauses, params = [], []
+    for column, values in (filters or {}).items():
+        if column not in HISTORY_FILTER_COLUMNS:
+            raise ValueError(f"Kolom filter tidak dikenal: {column}")
+        if not values:
+            continue
+        clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    if ids is not None:
+        clauses.append(f"id IN ({', '.join('?' for _ in ids)})" if ids else "0")
+        params.extend(ids)
+    if search and search.strip():
+        conn = get_db_connection()
         if conn:
-            conn.cursor().execute(query, entry)
-            conn.commit()
+            clause, search_params = _build_search_clause(conn, search)
+            if clause:
+                clauses.append(clause)
+                params.extend(search_params)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def query_history(
+    filters: Optional[Dict[str, List[Any]]] = None,
+    sort_by: str = "analyzed_at",
+    ascending: bool = False,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    columns: Optional[List[str]] = None,
+    search: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Mengambil riwayat dengan filter, urutan, dan paginasi yang dijalankan di SQLite.
+
+    Args:
+        filters (dict, optional): Filter kolom, lihat `build_history_where`.
+        sort_by (str): Kunci di HISTORY_SORT_COLUMNS.
+        ascending (bool): Urutan naik jika True.
+        limit (int, optional): Jumlah baris maksimum (None = semua).
+        offset (int): Jumlah baris yang dilewati (untuk halaman berikutnya).
+        columns (list, optional): Kolom yang diambil (None = semua kolom).
+        search (str, optional): Teks pencarian bebas.
 
-def get_history_df() -> pd.DataFrame:
-    """Mengambil semua data riwayat dari database."""
+    Returns:
+        pd.DataFrame: Data riwayat dengan 'id' sebagai index.
+    """
+    if sort_by not in HISTORY_SORT_COLUMNS:
+        raise ValueError(f"Kolom sortir tidak dikenal: {sort_by}")
+    where, params = build_history_where(filters, search=search)
+    direction = "ASC" if ascending else "DESC"
+    # 'id' sebagai penentu urutan kedua agar paginasi stabil untuk nilai yang sama
+    select_cols = "*" if columns is None else ", ".join(["id"] + [c for c in columns if c != "id"])
+    query = f"SELECT {select_cols} FROM history {where} ORDER BY {HISTORY_SORT_COLUMNS[sort_by]} {direction}, id {direction}"
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params += [int(limit), int(offset)]
     try:
-        with get_db_connection() as conn:
-            return pd.read_sql_query("SELECT * FROM history", conn, index_col="id") if conn else pd.DataFrame()
-    except Exception:
+        conn = get_db_connection()
+        return pd.read_sql_query(query, conn, params=params, index_col="id") if conn else pd.DataFrame()
+    except Exception as e:
+        print(f"Error saat query riwayat: {e}")
         return pd.DataFrame()
 
+def count_history(filters: Optional[Dict[str, List[Any]]] = None, search: Optional[str] = None) -> int:
+    """Menghitung jumlah entri riwayat yang cocok dengan filter dan teks pencarian."""
+    where, params = build_history_where(filters, search=search)
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    return conn.execute(f"SELECT COUNT(*) FROM history {where}", params).fetchone()[0]
+
+# Versi ber-cache dari query riwayat. Argumen pertama adalah token perubahan
+# (`get_history_change_token`) sehingga cache otomatis usang tepat saat data berubah.
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_query_history(change_token: Tuple[int, ...], **kwargs) -> pd.DataFrame:
+    """`query_history` yang di-cache per token perubahan."""
+    return query_history(**kwargs)
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def cached_count_history(change_token: Tuple[int, int], **kwargs) -> int:
+    """`count_history` yang di-cache per token perubahan."""
+    return count_history(**kwargs)
+
+def get_distinct_values(column: str) -> List[Any]:
+    """Mengambil daftar nilai unik (terurut) sebuah kolom filter untuk opsi widget."""
+    if column not in HISTORY_FILTER_COLUMNS:
+        raise ValueError(f"Kolom filter tidak dikenal: {column}")
+    conn = get_db_connection()
+    if not conn:
+        return []
+    rows = conn.execute(f"SELECT DISTINCT {column} FROM history WHERE {column} IS NOT NULL ORDER BY {column}")
+    return [row[0] for row in rows]
+
+def find_history_ids_by_confidence(
+    class_name: str,
+    min_confidence: float,
+    max_confidence: float = 1.0,
+    filters: Optional[Dict[str, List[Any]]] = None
+) -> List[int]:
+    """
+    Mencari ID riwayat dengan confidence kelas tertentu di dalam rentang [min, max].
+    Contoh: semua frame dengan Cumulonimbus > 0.6.
+
+    Args:
+        class_name (str): Nama kelas sesuai `class_names` di config.
+        min_confidence (float): Batas bawah confidence (0-1).
+        max_confidence (float): Batas atas confidence (0-1).
+        filters (dict, optional): Filter kolom history tambahan, lihat `build_history_where`.
+    """
+    class_names = get_class_names()
+    if class_name not in class_names:
+        raise ValueError(f"Kelas tidak dikenal: {class_name}")
+    where, params = build_history_where(filters)
+    history_filter = f"AND history_id IN (SELECT id FROM history {where})" if where else ""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    rows = conn.execute(f"""
+        SELECT history_id FROM class_confidences
+        WHERE class_index = ? AND confidence BETWEEN ? AND ? {history_filter}
+        ORDER BY confidence DESC
+    """, [class_names.index(class_name), min_confidence, max_confidence] + params)
+    return [row[0] for row in rows]
+
+def get_class_confidences(ids: List[int]) -> Dict[int, Dict[str, float]]:
+    """Mengambil confidence per kelas (0-1) untuk daftar ID riwayat: {id: {nama_kelas: confidence}}."""
+    class_names = get_class_names()
+    result = {history_id: {} for history_id in ids}
+    conn = get_db_connection()
+    if not conn or not ids:
+        return result
+    for i in range(0, len(ids), _SQL_PARAM_CHUNK_SIZE):
+        chunk = ids[i:i + _SQL_PARAM_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT history_id, class_index, confidence FROM class_confidences WHERE history_id IN ({', '.join('?' for _ in chunk)})",
+            chunk
+        )
+        for history_id, class_index, confidence in rows:
+            if class_index < len(class_names):
+                result[history_id][class_names[class_index]] = confidence
+    return result
+
 def delete_history_entries(ids: List[int]):
-    """Menghapus entri riwayat berdasarkan daftar ID."""
+    """
+    Menghapus entri riwayat berdasarkan daftar ID (dijalankan oleh thread penulis).
+    Path artefak dan file_hash entri dimasukkan ke antrean 'artifact_deletions' dalam
+    transaksi yang sama; berkasnya dihapus di latar oleh pengumpul (utils/gc.py).
+    """
     if not ids: return
-    with get_db_connection() as conn:
-        if conn:
-            placeholders = ','.join('?' for _ in ids)
-            conn.cursor().execute(f"DELETE FROM history WHERE id IN ({placeholders})", ids)
-            conn.commit()
 
-def get_paths_for_deletion(ids: List[int]) -> List[str]:
-    """Mengambil semua path file yang terkait dengan ID entri yang akan dihapus."""
-    if not ids: return []
-    with get_db_connection() as conn:
-        if conn:
-            query = "SELECT original_path, mask_path, overlay_path FROM history WHERE id IN ({})".format(','.join('?' for _ in ids))
-            cursor = conn.cursor().execute(query, ids)
-            paths = {path for row in cursor.fetchall() for path in row if path and pd.notna(path)}
-            return list(paths)
-    return []
+    def _delete(conn: sqlite3.Connection):
+        # Dipecah per potongan agar jumlah parameter tidak melewati batas SQLite; semua potongan
+        # tetap dalam satu job penulis, sehingga satu transaksi
+        cursor = conn.cursor()
+        queued_at = int(time.time())
+        for i in range(0, len(ids), _SQL_PARAM_CHUNK_SIZE):
+            chunk = ids[i:i + _SQL_PARAM_CHUNK_SIZE]
+            placeholders = ','.join('?' for _ in chunk)
+            rows = cursor.execute(
+                f"SELECT analyzed_at, media_type, cloud_coverage, okta_value, dominant_cloud_type FROM history WHERE id IN ({placeholders})", chunk
+            ).fetchall()
+            for row in rows:
+                _apply_rollups(cursor, dict(row), sign=-1)
+            cursor.execute(f"""
+                INSERT INTO artifact_deletions (path, queued_at)
+                WITH doomed AS (SELECT original_path, mask_path, overlay_path FROM history WHERE id IN ({placeholders}))
+                SELECT path, ? FROM (
+                    SELECT original_path AS path FROM doomed
+                    UNION SELECT mask_path FROM doomed
+                    UNION SELECT overlay_path FROM doomed
+                ) WHERE path IS NOT NULL
+            """, chunk + [queued_at])
+            cursor.execute(f"""
+                INSERT INTO artifact_deletions (file_hash, queued_at)
+                SELECT DISTINCT file_hash, ? FROM history WHERE id IN ({placeholders}) AND file_hash IS NOT NULL
+            """, [queued_at] + chunk)
+            cursor.execute(f"DELETE FROM history WHERE id IN ({placeholders})", chunk)
+        # Buang bucket yang sudah kosong, sekali per penghapusan (bukan per entri)
+        for table in ("rollup_coverage", "rollup_okta", "rollup_cloud_type"):
+            cursor.execute(f"DELETE FROM {table} WHERE sample_count <= 0")
+
+    _get_history_writer().submit_job(_delete).result()
+
+def get_pending_artifact_deletions(limit: int = 200, max_attempts: int = 5) -> List[Dict[str, Any]]:
+    """Mengambil antrean penghapusan artefak tertua yang belum melebihi batas percobaan."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    rows = conn.execute(
+        "SELECT id, path, file_hash, attempts FROM artifact_deletions WHERE attempts < ? ORDER BY id LIMIT ?",
+        (max_attempts, limit)
+    )
+    return [dict(row) for row in rows]
+
+def count_pending_artifact_deletions() -> int:
+    """Jumlah entri di antrean penghapusan artefak (termasuk yang gagal berulang kali)."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    return conn.execute("SELECT COUNT(*) FROM artifact_deletions").fetchone()[0]
+
+def complete_artifact_deletions(done_ids: List[int], failures: Optional[Dict[int, str]] = None):
+    """
+    Menandai hasil satu batch penghapusan (dijalankan oleh thread penulis): entri yang
+    berhasil dikeluarkan dari antrean, entri yang gagal dicatat percobaan & error-nya.
+    """
+    failures = failures or {}
+    if not done_ids and not failures:
+        return
+
+    def _complete(conn: sqlite3.Connection):
+        for i in range(0, len(done_ids), _SQL_PARAM_CHUNK_SIZE):
+            chunk = done_ids[i:i + _SQL_PARAM_CHUNK_SIZE]
+            conn.execute(f"DELETE FROM artifact_deletions WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+        conn.executemany(
+            "UPDATE artifact_deletions SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            [(error, deletion_id) for deletion_id, error in failures.items()]
+        )
+
+    _get_history_writer().submit_job(_complete).result()
+
+def get_retention_candidates(target_tier: int, before_epoch: int, limit: int) -> List[Dict[str, Any]]:
+    """Entri yang dianalisis sebelum `before_epoch` dan tingkat penyimpanannya masih di bawah `target_tier` (tertua dulu)."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    rows = conn.execute("""
+        SELECT id, file_hash, media_type, analyzed_at, original_path, mask_path, overlay_path, storage_tier
+        FROM history WHERE storage_tier < ? AND analyzed_at_epoch < ?
+        ORDER BY analyzed_at_epoch, id LIMIT ?
+    """, (target_tier, before_epoch, limit))
+    return [dict(row) for row in rows]
+
+def update_artifact_locations(updates: List[Dict[str, Any]]):
+    """
+    Memperbarui path artefak & tingkat penyimpanan (dijalankan oleh thread penulis).
+    Setiap dict berisi id, original_path, mask_path, overlay_path, storage_tier.
+    Hanya penghitung 'location_count' yang dinaikkan: cache yang memuat path lama harus
+    dibangun ulang, sedangkan agregat & rollup (yang tidak berubah) tetap valid.
+    """
+    if not updates:
+        return
+
+    def _update(conn: sqlite3.Connection):
+        conn.executemany("""
+            UPDATE history SET original_path = :original_path, mask_path = :mask_path,
+                overlay_path = :overlay_path, storage_tier = :storage_tier
+            WHERE id = :id
+        """, updates)
+        conn.execute("UPDATE history_meta SET value = value + 1 WHERE key = 'location_count'")
+
+    _get_history_writer().submit_job(_update).result()
+
+def iter_history_artifact_paths() -> Iterator[Tuple[Optional[str], Optional[str], Optional[str]]]:
+    """Mengiterasi (original_path, mask_path, overlay_path) seluruh riwayat tanpa memuat semuanya ke memori."""
+    conn = get_db_connection()
+    if not conn:
+        return
+    cursor = conn.execute("SELECT original_path, mask_path, overlay_path FROM history")
+    while True:
+        rows = cursor.fetchmany(10000)
+        if not rows:
+            break
+        for row in rows:
+            yield tuple(row)
+
+def get_rollup_timeseries(
+    granularity: str = "hour",
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Mengambil deret waktu rata-rata tutupan awan dari tabel rollup.
+    Biaya query sebanding dengan jumlah bucket, bukan jumlah baris riwayat.
+
+    Args:
+        granularity (str): 'minute', 'hour', atau 'day'.
+        start (Optional[str]): Batas awal bucket (format 'YYYY-MM-DDTHH:MM'), inklusif.
+        end (Optional[str]): Batas akhir bucket (format 'YYYY-MM-DDTHH:MM'), eksklusif.
+
+    Returns:
+        pd.DataFrame: Kolom bucket_start, media_type, sample_count, mean_coverage.
+    """
+    query = """
+        SELECT bucket_start, media_type, sample_count, coverage_sum / sample_count AS mean_coverage
+        FROM rollup_coverage WHERE granularity = ?
+    """
+    params: List[Any] = [granularity]
+    if start:
+        query += " AND bucket_start >= ?"; params.append(start)
+    if end:
+        query += " AND bucket_start < ?"; params.append(end)
+    query += " ORDER BY bucket_start"
+    try:
+        with get_db_connection() as conn:
+            return pd.read_sql_query(query, conn, params=params) if conn else pd.DataFrame()
+    except Exception:
+        return pd.DataFrame()
+
+def get_rollup_counts(
+    dimension: str,
+    granularity: str = "day",
+    start: Optional[str] = None,
+    end: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Mengambil distribusi Okta ('okta') atau jenis awan dominan ('cloud_type')
+    per bucket waktu dari tabel rollup.
+
+    Returns:
+        pd.DataFrame: Kolom bucket_start, media_type, <dimensi>, sample_count.
+    """
+    table, column = {
+        "okta": ("rollup_okta", "okta_value"),
+        "cloud_type": ("rollup_cloud_type", "dominant_cloud_type"),
+    }[dimension]
+    query = f"SELECT bucket_start, media_type, {column}, sample_count FROM {table} WHERE granularity = ?"
+    params: List[Any] = [granularity]
+    if start:
+        query += " AND bucket_start >= ?"; params.append(start)
+    if end:
+        query += " AND bucket_start < ?"; params.append(end)
+    query += " ORDER BY bucket_start"
+    try:
+        with get_db_connection() as conn:
+            return pd.read_sql_query(query, conn, params=params) if conn else pd.DataFrame()
+    except Exception:
+        return pd.DataFrame()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_rollup_timeseries(change_token: Tuple[int, int], **kwargs) -> pd.DataFrame:
+    """`get_rollup_timeseries` yang di-cache per token perubahan."""
+    return get_rollup_timeseries(**kwargs)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_rollup_counts(change_token: Tuple[int, int], **kwargs) -> pd.DataFrame:
+    """`get_rollup_counts` yang di-cache per token perubahan."""
+    return get_rollup_counts(**kwargs)
+
+def get_file_hash_refcounts(file_hashes: List[str]) -> Dict[str, int]:
+    """
+    Menghitung jumlah entri riwayat yang mereferensikan setiap file_hash (jumlah referensi blob).
+    Entri tingkat 0 masih memakai blob asli, begitu pula entri video tingkat 1 karena peringkasan
+    hanya memperkecil citra dan membiarkan berkas asli video (utils/retention.py) tetap tertaut.
+    """
+    counts = {file_hash: 0 for file_hash in file_hashes}
+    conn = get_db_connection()
+    if not conn:
+        return counts
+    for i in range(0, len(file_hashes), _SQL_PARAM_CHUNK_SIZE):
+        chunk = file_hashes[i:i + _SQL_PARAM_CHUNK_SIZE]
+        rows = conn.execute(
+            f"SELECT file_hash, COUNT(*) FROM history WHERE file_hash IN ({', '.join('?' for _ in chunk)})"
+            " AND (storage_tier = 0 OR (storage_tier = 1 AND media_type = 'video')) GROUP BY file_hash", chunk
+        )
+        counts.update({file_hash: count for file_hash, count in rows})
+    return counts
+
+def get_packed_archive_refcounts(tar_paths: List[str], separator: str = "::") -> Dict[str, int]:
+    """
+    Menghitung jumlah entri riwayat yang masih menunjuk ke setiap arsip tar retensi
+    (path '<tar><separator><anggota>'). Arsip dengan nol referensi boleh dihapus.
+    """
+    counts = {tar_path: 0 for tar_path in tar_paths}
+    conn = get_db_connection()
+    if not conn:
+        return counts
+    for tar_path in tar_paths:
+        prefix = f"{tar_path}{separator}"
+        # substr (bukan LIKE) karena nama tar bisa memuat '_' yang bermakna wildcard di LIKE
+        counts[tar_path] = conn.execute("""
+            SELECT COUNT(*) FROM history WHERE storage_tier = 2 AND (
+                substr(original_path, 1, ?) = ? OR substr(mask_path, 1, ?) = ? OR substr(overlay_path, 1, ?) = ?
+            )
+        """, (len(prefix), prefix) * 3).fetchone()[0]
+    return counts
 
-# Inisialisasi DB saat modul diimpor untuk memastikan tabel selalu ada
+# Inisialisasi DB saat modul diimpor untuk memastikan direktori dan tabel selalu ada
+os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
 init_db()
\ No newline at end of file
@@ -0,0 +1,187 @@
+# utils/display.py
+import os
+import shutil
+import hashlib
+import struct
+import subprocess
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from PIL import Image
+
+# Impor konfigurasi terpusat dan utilitas artefak
+from .config import config
+from .artifacts import get_artifact_extension, save_artifact
+from .overlays import get_overlay_path
+from .system import evict_lru_cache
+from .retention import artifact_exists, is_packed_path, resolve_artifact_path
+
+# Ambil konfigurasi yang relevan
+DISPLAY_DIR = config.get('paths', {}).get('display_cache_dir', 'data/cache/display')
+ARTIFACT_CONFIG = config.get('artifacts', {})
+VIDEO_EXTENSIONS = tuple(config.get('analysis', {}).get('video_extensions', []))
+
+def _get_max_side() -> int:
+    return int(ARTIFACT_CONFIG.get('display_max_side', 1280))
+
+def _find_ffmpeg() -> Optional[str]:
+    """Path FFmpeg (folder 'bin/' lokal diprioritaskan, sama seperti halaman deteksi). None jika tidak ada."""
+    local_bin_path = os.path.join(os.getcwd(), 'bin', "ffmpeg.exe" if os.name == 'nt' else "ffmpeg")
+    if os.path.exists(local_bin_path):
+        return local_bin_path
+    return shutil.which("ffmpeg")
+
+def _get_store_path(path: str, extension: str, variant: str) -> str:
+    """
+    Path turunan tampilan untuk satu artefak. Kunci memuat mtime & ukuran sumber (artefak di
+    arsip tar retensi atau di penyimpanan objek tidak pernah ditulis ulang, jadi cukup path-nya)
+    serta varian turunannya.
+    """
+    if is_packed_path(path) or not os.path.exists(path):
+        source_key = path
+    else:
+        stat = os.stat(path)
+        source_key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    key = hashlib.sha256(f"{source_key}|{variant}".encode("utf-8")).hexdigest()
+    return os.path.join(DISPLAY_DIR, key[:2], f"{key}{extension}")
+
+def _get_cached(store_path: str) -> Optional[str]:
+    """Mengembalikan turunan yang sudah ada (dan menandainya baru diakses untuk urutan LRU)."""
+    try:
+        os.utime(store_path)
+        return store_path
+    except OSError:
+        return None
+
+def _evict_display_cache(keep_path: str):
+    evict_lru_cache(DISPLAY_DIR, ARTIFACT_CONFIG.get('display_cache_max_mb', 2048), keep_path)
+
+def _is_faststart(path: str) -> bool:
+    """
+    True jika berkas MP4/MOV sudah 'faststart' (atom 'moov' berada sebelum 'mdat'), sehingga
+    browser bisa mulai memutar tanpa mengunduh seluruh berkas. Hanya membaca header atom tingkat atas.
+    """
+    try:
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, box_type = struct.unpack(">I4s", header)
+                if box_type == b"moov":
+                    return True
+                if box_type == b"mdat":
+                    return False
+                if size == 1: # Ukuran 64-bit setelah header
+                    size = struct.unpack(">Q", f.read(8))[0]
+                    f.seek(size - 16, os.SEEK_CUR)
+                elif size < 8: # 0 = atom terakhir hingga akhir berkas, < 8 = berkas rusak
+                    return False
+                else:
+                    f.seek(size - 8, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return False
+
+def get_display_image(path: Optional[str]) -> Optional[str]:
+    """
+    Turunan tampilan citra: JPEG dengan sisi terpanjang <= 'display_max_side'. Citra yang
+    sudah cukup kecil dipakai apa adanya. None jika artefak tidak ada atau gagal dibaca.
+    """
+    if not artifact_exists(path):
+        return None
+    max_side = _get_max_side()
+    try:
+        store_path = _get_store_path(path, get_artifact_extension('display'), f"image:{max_side}")
+        if cached := _get_cached(store_path):
+            return cached
+
+        path = resolve_artifact_path(path)
+        if not (path and os.path.isfile(path)):
+            return None
+        with Image.open(path) as img:
+            if max(img.size) <= max_side:
+                return path
+            display_img = img.convert("RGB")
+        display_img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        save_artifact("display", display_img, store_path)
+        _evict_display_cache(store_path)
+        return store_path
+    except Exception as e:
+        print(f"Gagal membuat citra tampilan untuk '{path}': {e}")
+        return path
+
+def _get_video_commands(ffmpeg_path: str, source: str, target: str, low_bitrate: bool) -> List[List[str]]:
+    """Perintah FFmpeg yang dicoba berurutan: remux tanpa encode ulang dulu, lalu transkode H.264."""
+    transcode = [
+        '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '64k'
+    ]
+    if low_bitrate:
+        max_height = int(ARTIFACT_CONFIG.get('display_video_max_height', 720))
+        transcode = ['-vf', f"scale=-2:min({max_height}\\,ih)", '-crf', str(ARTIFACT_CONFIG.get('display_video_crf', 30))] + transcode
+    variants = [transcode] if low_bitrate else [['-c', 'copy'], transcode]
+    return [
+        [ffmpeg_path, '-y', '-i', source, *options, '-movflags', '+faststart', '-f', 'mp4', target]
+        for options in variants
+    ]
+
+def get_display_video(path: Optional[str]) -> Optional[str]:
+    """
+    Turunan tampilan video: MP4 'faststart' (moov di depan) agar pemutaran di browser dimulai
+    sebelum seluruh berkas terunduh, opsional dalam rendisi bitrate rendah
+    ('display_video_low_bitrate'). Video yang sudah faststart dipakai apa adanya.
+    Jika FFmpeg tidak tersedia atau gagal, video sumber dikembalikan.
+    """
+    if not artifact_exists(path):
+        return None
+    low_bitrate = bool(ARTIFACT_CONFIG.get('display_video_low_bitrate', False))
+    try:
+        store_path = _get_store_path(path, ".mp4", "video:low" if low_bitrate else "video")
+        if cached := _get_cached(store_path):
+            return cached
+
+        path = resolve_artifact_path(path)
+        if not (path and os.path.isfile(path)):
+            return None
+        if not low_bitrate and _is_faststart(path):
+            return path
+        ffmpeg_path = _find_ffmpeg()
+        if not ffmpeg_path:
+            return path
+
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        tmp_path = f"{store_path}.{threading.get_ident()}.tmp"
+        try:
+            for cmd in _get_video_commands(ffmpeg_path, path, tmp_path, low_bitrate):
+                result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+                if result.returncode == 0:
+                    os.replace(tmp_path, store_path)
+                    _evict_display_cache(store_path)
+                    return store_path
+            print(f"Gagal membuat video tampilan untuk '{path}': {result.stderr[-500:]}")
+            return path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    except Exception as e:
+        print(f"Gagal membuat video tampilan untuk '{path}': {e}")
+        return path
+
+def get_result_display(result_data: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pasangan (citra/video asli, overlay) beresolusi tampilan untuk kartu hasil. Artefak
+    resolusi penuh tidak diubah dan tetap dipakai untuk ekspor.
+
+    Returns:
+        Tuple: (path tampilan asli, path tampilan overlay); None jika tidak tersedia.
+    """
+    original_path = result_data.get('original_path')
+    overlay_path = result_data.get('overlay_path')
+    if original_path and original_path.lower().endswith(VIDEO_EXTENSIONS):
+        return get_display_video(original_path), get_display_video(overlay_path)
+
+    # Overlay yang tersimpan di arsip (entri lama) diperkecil; selebihnya dirender langsung pada resolusi tampilan
+    display_overlay = get_display_image(overlay_path)
+    if display_overlay is None:
+        display_overlay = get_overlay_path(result_data, max_side=_get_max_side())
+    return get_display_image(original_path), display_overlay
@@ -14,6 +14,10 @@ from typing import List, Dict, Any, Optional, Tuple
 # Impor konfigurasi terpusat
 from .config import config
 from .media import get_preview_as_pil
+from .masks import PACKED_MASK_EXTENSION, mask_to_png_bytes
+from .overlays import get_overlay_path
+from .thumbnails import get_thumbnail_path, get_result_thumbnail
+from .retention import PACKED_SEPARATOR, is_packed_path, resolve_artifact_path
 
 # Ambil seksi konfigurasi yang relevan untuk mempermudah akses
 PATHS = config.get('paths', {})
@@ -27,6 +31,29 @@ def _safe_text(text: Any) -> str:
     """Memastikan teks aman untuk FPDF dengan mengganti karakter non-latin."""
     return str(text).encode("latin-1", "replace").decode("latin-1")
 
+def _write_artifact_to_zip(zipf: zipfile.ZipFile, path: str, arcname: str):
+    """Menulis satu artefak ke ZIP; mask ringkas (.npz) dikonversi ke PNG saat ekspor."""
+    if path.lower().endswith(PACKED_MASK_EXTENSION):
+        zipf.writestr(os.path.splitext(arcname)[0] + ".png", mask_to_png_bytes(path))
+    else:
+        zipf.write(path, arcname)
+
+def _add_derived_overlay(zipf: zipfile.ZipFile, item: Dict[str, Any]):
+    """
+    Menambahkan overlay yang dirender saat dibutuhkan ke ZIP dengan arcname
+    'overlays/<folder analisis>/<nama>_overlay.<ext>', sejajar dengan artefak lainnya.
+    """
+    overlay_path = get_overlay_path(item)
+    original_path = item.get("original_path")
+    if not (overlay_path and original_path):
+        return
+    if is_packed_path(original_path):
+        original_path = original_path.split(PACKED_SEPARATOR, 1)[1]
+    folder_name = os.path.basename(os.path.dirname(original_path))
+    base_name = os.path.splitext(os.path.basename(original_path))[0].replace("_original", "_overlay")
+    arcname = os.path.join(os.path.basename(PATHS.get('overlay_archive', 'overlays')), folder_name, base_name + os.path.splitext(overlay_path)[1])
+    zipf.write(overlay_path, arcname)
+
 def _get_image_for_pdf(path: str, max_size: tuple = (512, 512)) -> Optional[Image.Image]:
     """
     Pembungkus (wrapper) yang mengambil gambar pratinjau untuk PDF
@@ -133,18 +160,28 @@ def export_zip(data: List[Dict[str, Any]]) -> str:
         for item in data:
             # Loop melalui setiap jenis artefak
             for key in ["original_path", "overlay_path", "mask_path"]:
-                path = item.get(key)
+                stored_path = item.get(key)
+                # Artefak yang sudah dikemas oleh retensi arsip diekstrak dulu (lihat utils/retention.py)
+                path = resolve_artifact_path(stored_path)
+                if key == "overlay_path" and not (path and os.path.exists(path)):
+                    # Overlay turunan: dirender dari cache dan diberi nama seperti artefak arsip
+                    _add_derived_overlay(zipf, item)
+                    continue
                 if not (path and os.path.exists(path)):
                     continue
 
                 # Cek apakah path berasal dari direktori sementara atau arsip
-                if temp_base_path in path:
+                if temp_base_path in stored_path:
                     base_to_strip = temp_base_path
                 else:
                     base_to_strip = archive_base_path
                 
-                # Buat path relatif (arcname) dengan benar
-                arcname = os.path.relpath(path, base_to_strip)
+                # Buat path relatif (arcname) dari path tersimpan, bukan path hasil resolve (bisa berada
+                # di cache penyimpanan/ekstraksi); anggota tar sudah relatif terhadap arsip
+                if is_packed_path(stored_path):
+                    arcname = stored_path.split(PACKED_SEPARATOR, 1)[1]
+                else:
+                    arcname = os.path.relpath(stored_path, base_to_strip)
 
                 if os.path.isdir(path):
                     # Tambahkan semua file di dalam direktori ini ke zip
@@ -154,11 +191,12 @@ def export_zip(data: List[Dict[str, Any]]) -> str:
                             # Buat path relatif dari file di dalam subfolder
                             relative_file_path = os.path.relpath(full_disk_path, path)
                             final_arcname = os.path.join(arcname, relative_file_path)
-                            zipf.write(full_disk_path, final_arcname)
+                            _write_artifact_to_zip(zipf, full_disk_path, final_arcname)
                 else:
                     # Kasus untuk file tunggal
-                    arcname = os.path.relpath(path, archive_base_path)
-                    zipf.write(path, arcname)
+                    if not is_packed_path(stored_path):
+                        arcname = os.path.relpath(stored_path, archive_base_path)
+                    _write_artifact_to_zip(zipf, path, arcname)
                     
     return zip_path
 
@@ -307,8 +345,9 @@ def export_pdf(data: List[Dict[str, Any]], user_name: str) -> str:
 
             # --- Gambar Pratinjau ---
             img_width, spacing, y_pos = 90, 10, pdf.get_y()
-            original_preview = _get_image_for_pdf(item.get("original_path"), max_size=(512, 512))
-            overlay_preview = _get_image_for_pdf(item.get("overlay_path"), max_size=(512, 512))
+            # Pratinjau dibaca dari store thumbnail, bukan dari artefak resolusi penuh
+            original_preview = _get_image_for_pdf(get_thumbnail_path(item.get("original_path")), max_size=(512, 512))
+            overlay_preview = _get_image_for_pdf(get_result_thumbnail(item), max_size=(512, 512))
             
             # Tentukan tinggi sel untuk judul
             caption_height = 10
@@ -0,0 +1,314 @@
+# utils/gc.py
+import os
+import time
+import hashlib
+import shutil
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+import streamlit as st
+
+# Impor konfigurasi terpusat, fondasi database, blob store, dan backend penyimpanan
+from .config import config
+from .database import (
+    get_pending_artifact_deletions, complete_artifact_deletions,
+    iter_history_artifact_paths, get_file_hash_refcounts, get_packed_archive_refcounts
+)
+from .blobstore import BLOB_DIR, GRACE_SECONDS, get_blob_path, get_pending_blobs, release_blobs
+from .storage import get_storage
+
+# Ambil konfigurasi yang relevan
+PATHS = config.get('paths', {})
+GC_CONFIG = config.get('gc', {})
+THUMBNAIL_DIR = PATHS.get('thumbnail_dir', 'data/cache/thumbnails')
+PACK_DIR = PATHS.get('packed_archive', 'data/archive/packed')
+_THUMBNAIL_GROUP_ROOT = os.path.join(THUMBNAIL_DIR, "results")
+
+# Pemisah path arsip tar retensi dan nama anggota di dalamnya, misal 'data/archive/packed/2025/2025-01-01_42.tar.gz::original/<ts>/x.jpg'
+PACKED_SEPARATOR = "::"
+
+def _get_archive_roots() -> List[str]:
+    """Direktori akar per jenis artefak; setiap analisis punya satu subfolder di bawahnya."""
+    keys = ['original_archive', 'mask_archive', 'overlay_archive']
+    return [PATHS[key] for key in keys if PATHS.get(key)]
+
+def _is_within(path: str, root: str) -> bool:
+    path, root = os.path.abspath(path), os.path.abspath(root)
+    return path.startswith(root + os.sep)
+
+def is_packed_path(path: Optional[str]) -> bool:
+    return bool(path) and PACKED_SEPARATOR in path
+
+def get_packed_archive(path: str) -> str:
+    """Path arsip tar yang memuat artefak dikemas ('<tar>::<anggota>' -> '<tar>')."""
+    return path.split(PACKED_SEPARATOR, 1)[0]
+
+def get_analysis_folder(path: str) -> Optional[str]:
+    """
+    Folder analisis (misal 'data/archive/masks/<timestamp_name>') yang memuat sebuah artefak.
+    Berlaku baik untuk path berkas maupun path direktori (mask video). None jika path
+    tidak berada di bawah akar arsip mana pun (termasuk artefak dikemas, yang berbagi satu
+    arsip tar; lihat `get_packed_archive`), sehingga akar arsip tidak pernah terhapus.
+    """
+    for root in _get_archive_roots():
+        if _is_within(path, root):
+            first_part = os.path.relpath(os.path.abspath(path), os.path.abspath(root)).split(os.sep)[0]
+            return os.path.join(root, first_part)
+    return None
+
+def get_thumbnail_group(path: str) -> str:
+    """
+    Folder thumbnail milik satu artefak, dikunci oleh path tersimpannya (seperti di database).
+    Thumbnail hasil analisis disimpan di sini sehingga ikut terhapus bersama artefaknya.
+    """
+    key = hashlib.sha256(path.encode("utf-8")).hexdigest()
+    return os.path.join(_THUMBNAIL_GROUP_ROOT, key[:2], key)
+
+def _remove_path(path: str):
+    """Menghapus berkas/direktori; path yang sudah tidak ada dianggap berhasil."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+def _get_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def _release_remote_blobs(file_hashes: List[str]):
+    """
+    Backend penyimpanan objek: menghapus objek blob di bucket yang sudah tidak direferensikan.
+    Objek yang baru diunggah/disentuh (masa tenggang) dilewati karena replika lain mungkin
+    sedang memakainya untuk entri yang belum di-commit.
+    """
+    storage = get_storage()
+    if not storage.is_remote:
+        return
+    cutoff = time.time() - GRACE_SECONDS
+    refcounts = get_file_hash_refcounts(list(set(file_hashes)))
+    for file_hash, count in refcounts.items():
+        if count == 0:
+            prefix = get_blob_path(file_hash, "")
+            storage.delete_objects([path for path, _, mtime in storage.iter_objects(prefix) if mtime <= cutoff])
+
+def process_artifact_deletions(batch_size: Optional[int] = None) -> int:
+    """
+    Memproses satu batch antrean 'artifact_deletions': menghapus folder analisis setiap
+    artefak (atau arsip tar retensi yang sudah tidak direferensikan entri mana pun), lalu
+    melepas blob yang sudah tidak direferensikan. Entri yang gagal dicoba ulang hingga `gc.max_attempts`.
+
+    Returns:
+        int: Jumlah entri antrean yang diproses.
+    """
+    pending = get_pending_artifact_deletions(
+        limit=int(batch_size or GC_CONFIG.get('batch_size', 200)),
+        max_attempts=int(GC_CONFIG.get('max_attempts', 5))
+    )
+    if not pending:
+        return 0
+
+    done_ids, failures = [], {}
+    blob_items = [item for item in pending if item["file_hash"]]
+    packed_items: Dict[str, List[int]] = {}
+    for item in pending:
+        if not item["path"]:
+            continue
+        try:
+            _remove_path(get_thumbnail_group(item["path"]))
+            if is_packed_path(item["path"]):
+                # Arsip tar dipakai bersama banyak entri; dihapus setelah referensi terakhirnya hilang
+                packed_items.setdefault(get_packed_archive(item["path"]), []).append(item["id"])
+                continue
+            folder = get_analysis_folder(item["path"])
+            # Artefak di luar arsip (misal temp) dihapus per berkas, bukan per folder.
+            # Backend penyimpanan objek juga menghapus salinan di bucket dan di cache bacanya.
+            get_storage().delete(folder or item["path"])
+            done_ids.append(item["id"])
+        except Exception as e:
+            failures[item["id"]] = str(e)
+
+    for tar_path, ids in packed_items.items():
+        try:
+            if get_packed_archive_refcounts([tar_path], PACKED_SEPARATOR)[tar_path] == 0:
+                get_storage().delete(tar_path)
+            done_ids.extend(ids)
+        except Exception as e:
+            failures.update({item_id: str(e) for item_id in ids})
+
+    if blob_items:
+        try:
+            release_blobs([item["file_hash"] for item in blob_items])
+            _release_remote_blobs([item["file_hash"] for item in blob_items])
+            done_ids.extend(item["id"] for item in blob_items)
+        except Exception as e:
+            failures.update({item["id"]: str(e) for item in blob_items})
+
+    complete_artifact_deletions(done_ids, failures)
+    return len(pending)
+
+def reconcile_archive(dry_run: bool = True, grace_minutes: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Mencocokkan pohon arsip dengan database dan mencari artefak yatim: folder analisis
+    yang tidak direferensikan entri riwayat mana pun (misal sisa analisis yang crash
+    sebelum commit), arsip tar retensi tanpa referensi, blob tanpa referensi, dan thumbnail
+    yang artefaknya sudah tidak ada (thumbnail unggahan antrean yang lama tidak diakses juga
+    disapu). Dengan backend penyimpanan objek, objek bucket yang tidak direferensikan juga
+    dicari. Artefak yang lebih muda dari masa tenggang dilewati agar analisis atau putaran
+    retensi yang sedang berjalan tidak ikut terhapus.
+
+    Args:
+        dry_run (bool): Jika True, hanya melaporkan tanpa menghapus apa pun.
+        grace_minutes (float, optional): Usia minimum artefak yatim (default dari config).
+
+    Returns:
+        Dict[str, Any]: orphan_dirs, orphan_archives, orphan_blobs, orphan_thumbnails, orphan_objects,
+            total_bytes, removed, errors.
+    """
+    grace_seconds = float(grace_minutes if grace_minutes is not None else GC_CONFIG.get('orphan_grace_minutes', 60)) * 60
+    cutoff = time.time() - grace_seconds
+    report = {
+        "orphan_dirs": [], "orphan_archives": [], "orphan_blobs": [], "orphan_thumbnails": [],
+        "orphan_objects": [], "total_bytes": 0, "removed": 0, "errors": []
+    }
+
+    # 1. Kumpulkan folder analisis, arsip tar, dan folder thumbnail yang direferensikan database
+    referenced: Set[str] = set()
+    referenced_archives: Set[str] = set()
+    referenced_thumbnails: Set[str] = set()
+    for paths in iter_history_artifact_paths():
+        for path in paths:
+            if not path:
+                continue
+            referenced_thumbnails.add(os.path.abspath(get_thumbnail_group(path)))
+            if is_packed_path(path):
+                referenced_archives.add(os.path.abspath(get_packed_archive(path)))
+                continue
+            folder = get_analysis_folder(path)
+            if folder:
+                referenced.add(os.path.abspath(folder))
+
+    # 2. Folder analisis di disk yang tidak direferensikan
+    for root in _get_archive_roots():
+        if not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            path = os.path.join(root, entry.name)
+            if os.path.abspath(path) in referenced or entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+            report["orphan_dirs"].append(path)
+
+    # 3. Arsip tar retensi (dan sisa '.tmp' dari putaran yang crash) yang tidak direferensikan
+    if os.path.isdir(PACK_DIR):
+        for root, _, files in os.walk(PACK_DIR):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.abspath(path) in referenced_archives or os.path.getmtime(path) > cutoff:
+                    continue
+                report["orphan_archives"].append(path)
+
+    # 4. Blob yang jumlah referensinya nol
+    blob_paths: Dict[str, List[str]] = {}
+    pending_blobs = get_pending_blobs()
+    if os.path.isdir(BLOB_DIR):
+        for root, _, files in os.walk(BLOB_DIR):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.getmtime(path) > cutoff or path in pending_blobs:
+                    continue
+                blob_paths.setdefault(name.split(".")[0], []).append(path)
+    refcounts = get_file_hash_refcounts(list(blob_paths))
+    for file_hash, paths in blob_paths.items():
+        if refcounts.get(file_hash, 0) == 0:
+            report["orphan_blobs"].extend(paths)
+
+    # 5. Folder thumbnail yang artefaknya sudah tidak direferensikan, dan thumbnail lain
+    #    (unggahan antrean, tata letak lama) yang lama tidak diakses
+    if os.path.isdir(THUMBNAIL_DIR):
+        for root, dirs, files in os.walk(THUMBNAIL_DIR):
+            if os.path.dirname(os.path.dirname(root)) == _THUMBNAIL_GROUP_ROOT:
+                dirs[:] = []
+                if os.path.abspath(root) not in referenced_thumbnails and os.path.getmtime(root) <= cutoff:
+                    report["orphan_thumbnails"].append(root)
+                continue
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.getmtime(path) <= cutoff:
+                    report["orphan_thumbnails"].append(path)
+
+    for path in report["orphan_dirs"] + report["orphan_archives"] + report["orphan_blobs"] + report["orphan_thumbnails"]:
+        try:
+            report["total_bytes"] += _get_size(path)
+            if not dry_run:
+                _remove_path(path)
+                report["removed"] += 1
+        except OSError as e:
+            report["errors"].append(f"{path}: {e}")
+
+    # 6. Objek bucket (backend penyimpanan objek): artefak di luar folder analisis yang
+    #    direferensikan, dan blob tanpa referensi
+    storage = get_storage()
+    if storage.is_remote:
+        try:
+            object_sizes: Dict[str, int] = {}
+            object_blobs: Dict[str, List[str]] = {}
+            for path, size, mtime in storage.iter_objects():
+                if mtime > cutoff:
+                    continue
+                object_sizes[path] = size
+                if _is_within(path, BLOB_DIR):
+                    object_blobs.setdefault(os.path.basename(path).split(".")[0], []).append(path)
+                    continue
+                folder = get_analysis_folder(path)
+                if folder and os.path.abspath(folder) not in referenced:
+                    report["orphan_objects"].append(path)
+            object_refcounts = get_file_hash_refcounts(list(object_blobs))
+            for file_hash, paths in object_blobs.items():
+                if object_refcounts.get(file_hash, 0) == 0:
+                    report["orphan_objects"].extend(paths)
+            report["total_bytes"] += sum(object_sizes[path] for path in report["orphan_objects"])
+            if not dry_run and report["orphan_objects"]:
+                storage.delete_objects(report["orphan_objects"])
+                report["removed"] += len(report["orphan_objects"])
+        except Exception as e:
+            report["errors"].append(f"bucket: {e}")
+    return report
+
+class _ArtifactCollector:
+    """
+    Thread latar yang mengosongkan antrean penghapusan artefak dan secara berkala
+    merekonsiliasi arsip dengan database. Dibangunkan segera setelah ada penghapusan.
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._poll_interval = float(GC_CONFIG.get('poll_interval_sec', 30))
+        self._reconcile_interval = float(GC_CONFIG.get('reconcile_interval_hours', 24)) * 3600
+        self._last_reconcile = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="artifact-gc", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Meminta pengumpul memproses antrean sekarang juga."""
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._poll_interval)
+            self._wakeup.clear()
+            try:
+                # Kosongkan antrean per batch agar transaksi penulis tetap pendek
+                while process_artifact_deletions():
+                    pass
+                if self._reconcile_interval > 0 and time.monotonic() - self._last_reconcile >= self._reconcile_interval:
+                    self._last_reconcile = time.monotonic()
+                    report = reconcile_archive(dry_run=False)
+                    if report["removed"]:
+                        print(f"Rekonsiliasi arsip: {report['removed']} artefak yatim ({report['total_bytes'] / 1e6:.1f} MB) dihapus.")
+            except Exception as e:
+                print(f"Error pada pengumpul artefak: {e}")
+
+@st.cache_resource
+def get_artifact_collector() -> _ArtifactCollector:
+    """Membuat thread pengumpul artefak sekali per proses aplikasi."""
+    return _ArtifactCollector()
@@ -1,6 +1,5 @@
 # utils/layout.py
 import streamlit as st
-import os
 import base64
 import mimetypes
 from typing import Tuple
@@ -11,6 +10,7 @@ import plotly.express as px
 
 # Impor konfigurasi terpusat yang sudah dimuat
 from .config import config
+from .display import get_result_display
 
 # Ambil seksi konfigurasi yang relevan untuk mempermudah akses
 PATHS = config.get('paths', {})
@@ -203,18 +203,20 @@ def render_result(result_data: Dict[str, Any]) -> None:
                                       analisis dari database.
     """
     placeholder_path = PATHS.get('placeholder', '')
-    original_path = result_data.get('original_path', '')
-    overlay_path = result_data.get('overlay_path', '')
-
-    # Cek apakah path valid dan filenya ada di disk sebelum digunakan
-    display_original = original_path if original_path and os.path.exists(original_path) else placeholder_path
-    display_overlay = overlay_path if overlay_path and os.path.exists(overlay_path) else placeholder_path
+    original_path = result_data.get('original_path') or ''
+    # Kartu hasil memakai turunan beresolusi tampilan (JPEG kecil, video faststart; lihat utils/display.py),
+    # bukan artefak resolusi penuh yang hanya dipakai untuk ekspor
+    display_original, display_overlay = get_result_display(result_data)
+    display_original = display_original or placeholder_path
+    display_overlay = display_overlay or placeholder_path
     
     # Tentukan tipe media berdasarkan path jika ada, jika tidak anggap bukan video    
     video_extensions = tuple(ANALYSIS_CONFIG.get('video_extensions', []))
     is_video = original_path and original_path.lower().endswith(video_extensions)
 
     st.subheader(f"🖼️ Hasil Analisis: {result_data.get('source_filename', 'N/A')}")
+    if result_data.get('is_stale'):
+        st.warning("Frame terbaru identik dengan frame yang terakhir dianalisis (stream kemungkinan beku). Hasil sebelumnya digunakan kembali.", icon="🧊")
     
     col_g1, col_g2 = st.columns(2)
     with col_g1:
@@ -254,25 +256,26 @@ def render_result(result_data: Dict[str, Any]) -> None:
     st.markdown("<br>", unsafe_allow_html=True)
 
 # --- FUNGSI UNTUK DASBOR STATISTIK ---
-def render_summary_dashboard(data: pd.DataFrame, title: str = "Dasbor Statistik"):
+def render_summary_dashboard(aggregates: Dict[str, Any], title: str = "Dasbor Statistik"):
     """
     Merender dasbor statistik universal dengan gaya visual yang kaya.
     Menggabungkan metrik besar dengan fleksibilitas dinamis.
 
     Args:
-        data (pd.DataFrame): DataFrame yang berisi riwayat analisis.
+        aggregates (Dict[str, Any]): Agregat dari `get_dashboard_aggregates` (SQL)
+            atau `compute_aggregates_from_df` (data sesi di memori).
         title (str): Judul yang akan ditampilkan untuk seksi dasbor.
     """
     section_divider(title, "📈")
 
     # Menggunakan pesan yang lebih spesifik jika data kosong
-    if data.empty:
+    if not aggregates.get("total"):
         st.info("Belum ada riwayat analisis. Dasbor akan muncul di sini setelah analisis pertama Anda.")
         return
 
-    # Hitung metrik utama
-    jumlah_total = len(data)
-    type_counts = data['media_type'].value_counts()
+    # Ambil metrik utama
+    jumlah_total = aggregates["total"]
+    type_counts = aggregates.get("media_type_counts", {})
     
     # Siapkan layout kolom
     dash_col1, dash_col2, dash_col3 = st.columns([0.3, 0.35, 0.35])
@@ -298,21 +301,68 @@ def render_summary_dashboard(data: pd.DataFrame, title: str = "Dasbor Statistik"
 
     with dash_col2:
         st.markdown("#### 📊 Distribusi Tutupan Awan")
-        fig1 = px.histogram(data, x="cloud_coverage", nbins=10, 
-                            labels={"cloud_coverage": "Tutupan Awan (%)"},
-                            color_discrete_sequence=[UI_CONFIG.get('theme', {}).get('primary_color', '#1f77b4')])
-        fig1.update_layout(yaxis_title="Jumlah", margin=dict(l=10, r=10, t=10, b=10), height=250)
+        # Histogram sudah di-bin sebelumnya; tampilkan sebagai bar dengan lebar bin penuh
+        histogram = aggregates.get("coverage_histogram", [])
+        bin_width = 100 / max(1, len(histogram))
+        hist_df = pd.DataFrame({
+            "bin_center": [bin_width * (i + 0.5) for i in range(len(histogram))],
+            "count": histogram,
+        })
+        fig1 = px.bar(hist_df, x="bin_center", y="count",
+                      labels={"bin_center": "Tutupan Awan (%)", "count": "Jumlah"},
+                      color_discrete_sequence=[UI_CONFIG.get('theme', {}).get('primary_color', '#1f77b4')])
+        fig1.update_traces(width=bin_width)
+        fig1.update_layout(bargap=0, yaxis_title="Jumlah", margin=dict(l=10, r=10, t=10, b=10), height=250)
         st.plotly_chart(fig1, use_container_width=True)
 
     with dash_col3:
         st.markdown("#### 🌥️ Komposisi Jenis Awan")
         # Mengatasi error jika 'dominant_cloud_type' kosong
-        if 'dominant_cloud_type' in data and not data['dominant_cloud_type'].empty:
-            fig2 = px.pie(data, names="dominant_cloud_type", hole=0.4,
+        cloud_type_counts = aggregates.get("cloud_type_counts", {})
+        if cloud_type_counts:
+            type_df = pd.DataFrame({
+                "dominant_cloud_type": list(cloud_type_counts.keys()),
+                "count": list(cloud_type_counts.values()),
+            })
+            fig2 = px.pie(type_df, names="dominant_cloud_type", values="count", hole=0.4,
                           labels={"dominant_cloud_type": "Jenis Awan Dominan"},
                           color_discrete_sequence=px.colors.qualitative.Set1)
             fig2.update_traces(textinfo='percent+label', showlegend=False)
             fig2.update_layout(margin=dict(l=10, r=10, t=10, b=30), height=250)
             st.plotly_chart(fig2, use_container_width=True)
         else:
-            st.info("Data jenis awan belum cukup untuk ditampilkan.")
\ No newline at end of file
+            st.info("Data jenis awan belum cukup untuk ditampilkan.")
+
+def render_trend_dashboard(coverage_df: pd.DataFrame, okta_df: pd.DataFrame) -> None:
+    """
+    Merender grafik tren berbasis tabel rollup (deret waktu tutupan awan dan
+    distribusi Okta). Data sudah teragregasi per bucket sehingga grafik tetap
+    ringan meskipun riwayat mentah sangat besar.
+
+    Args:
+        coverage_df (pd.DataFrame): Hasil `get_rollup_timeseries`.
+        okta_df (pd.DataFrame): Hasil `get_rollup_counts('okta', ...)`.
+    """
+    if coverage_df.empty:
+        st.info("Belum ada data pada rentang waktu ini.")
+        return
+
+    trend_col1, trend_col2 = st.columns([0.6, 0.4])
+    with trend_col1:
+        st.markdown("#### 📉 Rata-rata Tutupan Awan")
+        fig1 = px.line(coverage_df, x="bucket_start", y="mean_coverage", color="media_type", markers=True,
+                       labels={"bucket_start": "Waktu", "mean_coverage": "Tutupan Awan (%)", "media_type": "Tipe Media"})
+        fig1.update_layout(margin=dict(l=10, r=10, t=10, b=10), height=300, yaxis_range=[0, 100])
+        st.plotly_chart(fig1, use_container_width=True)
+
+    with trend_col2:
+        st.markdown("#### 🔢 Distribusi Okta")
+        if okta_df.empty:
+            st.info("Data Okta belum tersedia.")
+        else:
+            okta_counts = okta_df.groupby("okta_value", as_index=False)["sample_count"].sum()
+            fig2 = px.bar(okta_counts, x="okta_value", y="sample_count",
+                          labels={"okta_value": "Nilai Okta", "sample_count": "Jumlah"},
+                          color_discrete_sequence=[UI_CONFIG.get('theme', {}).get('primary_color', '#1f77b4')])
+            fig2.update_layout(margin=dict(l=10, r=10, t=10, b=10), height=300, xaxis=dict(dtick=1))
+            st.plotly_chart(fig2, use_container_width=True)
@@ -0,0 +1,76 @@
+# utils/masks.py
+import io
+import os
+import json
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Impor penggambar geometri ROI dari modul segmentasi
+from .segmentation import render_roi_mask
+
+# Ekstensi mask ringkas: bit mask resolusi model + geometri ROI sebagai parameter
+PACKED_MASK_EXTENSION = ".npz"
+
+def save_packed_mask(analysis_data: Dict[str, Any], path: str) -> str:
+    """
+    Menyimpan mask segmentasi dalam format ringkas (.npz):
+    - mask biner pada resolusi MODEL (misal 512x512), dipadatkan 8 piksel per byte (`np.packbits`),
+    - geometri ROI (lingkaran/kotak/poligon) sebagai parameter JSON, bukan raster,
+    - ukuran citra asli dan ukuran mask akhir untuk rekonstruksi.
+    Mask resolusi penuh direkonstruksi saat dibutuhkan oleh `load_mask`.
+
+    Args:
+        analysis_data (dict): Hasil `analyze_single_image` (butuh 'segmentation_mask_model',
+            'roi_geometry', 'image_size', dan 'segmentation_mask').
+        path (str): Path tujuan berkas .npz.
+    """
+    model_mask = np.asarray(analysis_data["segmentation_mask_model"]).astype(bool)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            bits=np.packbits(model_mask, axis=None),
+            model_shape=np.array(model_mask.shape, dtype=np.int32),
+            image_size=np.array(analysis_data["image_size"], dtype=np.int32),
+            mask_shape=np.array(np.shape(analysis_data["segmentation_mask"]), dtype=np.int32),
+            roi=np.array(json.dumps(analysis_data["roi_geometry"]))
+        )
+    os.replace(tmp_path, path)
+    return path
+
+def load_mask_and_roi(path: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Memuat mask biner (0 atau 1, uint8) resolusi penuh beserta mask ROI-nya.
+    Mendukung format ringkas (.npz) maupun mask raster (PNG/WEBP, 0/255);
+    mask raster tidak menyimpan ROI sehingga ROI dikembalikan sebagai None.
+    """
+    if not path.lower().endswith(PACKED_MASK_EXTENSION):
+        with Image.open(path) as img:
+            return (np.array(img.convert("L")) > 0).astype(np.uint8), None
+
+    with np.load(path) as data:
+        model_h, model_w = data["model_shape"].tolist()
+        image_h, image_w = data["image_size"].tolist()
+        mask_h, mask_w = data["mask_shape"].tolist()
+        bits = np.unpackbits(data["bits"], count=model_h * model_w).reshape(model_h, model_w)
+        roi_geometry = json.loads(str(data["roi"]))
+
+    # Rekonstruksi persis seperti di `analyze_single_image`: perbesar (nearest), lalu terapkan ROI
+    full_mask = cv2.resize(bits, (image_w, image_h), interpolation=cv2.INTER_NEAREST)
+    roi_mask = render_roi_mask(roi_geometry)[:mask_h, :mask_w]
+    return (full_mask[:mask_h, :mask_w] * roi_mask).astype(np.uint8), roi_mask
+
+def load_mask(path: str) -> np.ndarray:
+    """Memuat mask biner (0 atau 1, uint8) resolusi penuh dari berkas mask (format apa pun)."""
+    return load_mask_and_roi(path)[0]
+
+def mask_to_png_bytes(path: str) -> bytes:
+    """Mengonversi berkas mask (format apa pun) menjadi PNG grayscale 0/255, misal untuk ekspor."""
+    buffer = io.BytesIO()
+    Image.fromarray(load_mask(path) * 255).save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -27,6 +27,7 @@ from .config import config
 PATHS = config.get('paths', {})
 ANALYSIS_CONFIG = config.get('analysis', {})
 VIDEO_EXTENSIONS = tuple(ANALYSIS_CONFIG.get('video_extensions', ['.mp4']))
+SEG_INPUT_SIZE = config.get('models', {}).get('segmentation', {}).get('input_size', [512, 512])
 
 # --- Fungsi Publik ---
 
@@ -174,7 +175,7 @@ def fetch_live_stream_source(raw_url: str) -> Tuple[Optional[Dict[str, Any]], Op
 
     # --- ALUR UNTUK PLATFORM LAIN (NON-YOUTUBE) ---
     try: # Coba dengan yt-dlp
-        with yt_dlp.YoutubeDL({"format": "best", "quiet": True, "noplaylist": True}) as ydl:
+        with yt_dlp.YoutubeDL({"format": _get_live_format_selector(), "quiet": True, "noplaylist": True}) as ydl:
             info = ydl.extract_info(raw_url, download=False)
             if info and info.get('is_live'):
                 return {
@@ -188,9 +189,10 @@ def fetch_live_stream_source(raw_url: str) -> Tuple[Optional[Dict[str, Any]], Op
         session = Streamlink()
         session.set_option("http-headers", {"User-Agent": "Mozilla/5.0"})
         streams = session.streams(raw_url)
-        if "best" in streams:
+        variant = _select_streamlink_variant(streams)
+        if variant:
             return {
-                "src": streams["best"].url, "title": "Live Stream",
+                "src": streams[variant].url, "title": "Live Stream",
                 "is_live": True, "display_url": display_url
             }, None
     except Exception:
@@ -350,6 +352,48 @@ def get_preview_as_base64(path: str) -> str:
 
 # --- Fungsi Helper Internal (diawali dengan _) ---
 
+def _get_min_video_height() -> int:
+    """
+    Batas bawah tinggi video (px) untuk pemilihan varian stream/unduhan.
+    Tidak pernah lebih kecil dari sisi terpanjang input model segmentasi.
+    """
+    return max(int(ANALYSIS_CONFIG.get('min_video_height', 720)), max(SEG_INPUT_SIZE))
+
+def _get_live_format_selector() -> str:
+    """
+    Selektor format yt-dlp untuk live stream: varian terendah yang masih di atas
+    batas resolusi, atau varian terbaik jika semua varian berada di bawah batas.
+    """
+    min_height = _get_min_video_height()
+    return f"worst[height>={min_height}]/best"
+
+def _get_download_format_selector() -> str:
+    """
+    Selektor format yt-dlp untuk unduhan video. Audio tidak dibutuhkan untuk analisis,
+    jadi format video-saja beresolusi terendah (>= batas) diprioritaskan agar unduhan kecil.
+    """
+    h = _get_min_video_height()
+    return (
+        f"wv[height>={h}][ext=mp4]/w[height>={h}][ext=mp4]/"
+        f"wv[height>={h}]/w[height>={h}]/"
+        f"bv[ext=mp4]/b[ext=mp4]/bv/b"
+    )
+
+def _select_streamlink_variant(streams: Dict[str, Any]) -> Optional[str]:
+    """
+    Memilih nama varian Streamlink (misal '720p', '1080p60') dengan resolusi terendah
+    yang masih di atas batas. Jatuh ke 'best' jika tidak ada varian yang memenuhi.
+    """
+    min_height = _get_min_video_height()
+    candidates = []
+    for name in streams:
+        match = re.match(r"^(\d+)p", name)
+        if match and int(match.group(1)) >= min_height:
+            candidates.append((int(match.group(1)), name))
+    if candidates:
+        return min(candidates)[1]
+    return "best" if "best" in streams else None
+
 def _get_youtube_stream_with_api(video_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
     """
     Mencoba mendapatkan detail live stream menggunakan YouTube Data API v3.
@@ -379,7 +423,7 @@ def _get_youtube_stream_with_api(video_id: str) -> Tuple[Optional[Dict[str, Any]
              return None, "URL adalah video YouTube biasa atau siaran langsung telah berakhir."
 
         # 4. Gunakan yt-dlp untuk mendapatkan URL stream mentah (lebih andal daripada hlsManifestUrl)
-        with yt_dlp.YoutubeDL({'format': 'best', 'quiet': True}) as ydl:
+        with yt_dlp.YoutubeDL({'format': _get_live_format_selector(), 'quiet': True}) as ydl:
             info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
             result = {
                 "src": info["url"], 
@@ -453,7 +497,7 @@ def _handle_video_page(url: str) -> Tuple[List[IO[bytes]], Optional[str]]:
     """Helper untuk memproses halaman web (text/html) dengan yt-dlp."""
     # --- ALUR KHUSUS UNTUK YOUTUBE ---
     try:
-        ydl_opts = {'noplaylist': True, 'quiet': True}
+        ydl_opts = {'noplaylist': True, 'quiet': True, 'format': _get_download_format_selector()}
         
         # Jika YouTube, WAJIBKAN penggunaan API Key
         is_youtube = "youtube.com" in url or "youtu.be" in url
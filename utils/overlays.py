@@ -0,0 +1,86 @@
+# utils/overlays.py
+import os
+import hashlib
+from typing import Dict, Any, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Impor konfigurasi terpusat dan utilitas artefak
+from .config import config
+from .artifacts import get_artifact_extension, save_artifact
+from .system import evict_lru_cache
+from .masks import load_mask_and_roi
+from .processing import create_enhanced_overlay
+from .retention import resolve_artifact_path
+
+# Ambil konfigurasi yang relevan
+OVERLAY_CACHE_DIR = config.get('paths', {}).get('overlay_cache_dir', 'data/cache/overlays')
+ARTIFACT_CONFIG = config.get('artifacts', {})
+
+def _get_cache_path(original_path: str, mask_path: str, max_side: Optional[int] = None) -> str:
+    """
+    Path cache overlay untuk pasangan (citra asli, mask) pada resolusi tertentu. Kunci ikut memuat
+    mtime & ukuran kedua berkas sehingga overlay lama tidak terpakai jika salah satu artefak ditulis ulang.
+    """
+    parts = []
+    for path in (original_path, mask_path):
+        stat = os.stat(path)
+        parts.append(f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+    if max_side:
+        parts.append(f"max_side={max_side}")
+    key = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return os.path.join(OVERLAY_CACHE_DIR, key[:2], f"{key}{get_artifact_extension('overlay')}")
+
+def render_overlay(original_path: str, mask_path: str, max_side: Optional[int] = None) -> str:
+    """
+    Mengembalikan path overlay untuk pasangan (citra asli, mask), merendernya dengan
+    `create_enhanced_overlay` hanya jika belum ada di cache disk. Jika `max_side` diberikan,
+    overlay langsung dirender pada resolusi tampilan (sisi terpanjang <= `max_side`).
+    """
+    cache_path = _get_cache_path(original_path, mask_path, max_side)
+    if os.path.exists(cache_path):
+        try:
+            os.utime(cache_path) # Tandai baru diakses (urutan LRU)
+            return cache_path
+        except OSError:
+            pass # Terhapus oleh eviksi di antara pengecekan; render ulang
+
+    segmentation_mask, roi_mask = load_mask_and_roi(mask_path)
+    with Image.open(original_path) as img:
+        original = img.convert("RGB")
+    if max_side:
+        original.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if roi_mask is None:
+        # Mask raster tidak menyimpan ROI: overlay dibuat tanpa garis batas ROI
+        roi_mask = np.zeros_like(segmentation_mask)
+    if original.size != segmentation_mask.shape[::-1]:
+        # Citra asli diperkecil (retensi arsip / resolusi tampilan): sesuaikan mask ke ukuran citra
+        segmentation_mask = cv2.resize(segmentation_mask, original.size, interpolation=cv2.INTER_NEAREST)
+        roi_mask = cv2.resize(roi_mask, original.size, interpolation=cv2.INTER_NEAREST)
+    save_artifact("overlay", create_enhanced_overlay(original, segmentation_mask, roi_mask), cache_path)
+    evict_lru_cache(OVERLAY_CACHE_DIR, ARTIFACT_CONFIG.get('overlay_cache_max_mb', 512), cache_path)
+    return cache_path
+
+def get_overlay_path(result_data: Dict[str, Any], max_side: Optional[int] = None) -> Optional[str]:
+    """
+    Path overlay untuk satu hasil analisis (baris riwayat atau hasil sesi).
+    Overlay yang tersimpan di arsip (entri lama, video) dipakai langsung; selain itu
+    overlay diturunkan dari citra asli + mask secara lazy (resolusi penuh, atau dibatasi
+    `max_side` untuk tampilan). None jika tidak bisa dibuat.
+    """
+    # Artefak yang sudah dikemas oleh retensi arsip diekstrak dulu (lihat utils/retention.py)
+    overlay_path = resolve_artifact_path(result_data.get('overlay_path'))
+    if overlay_path and os.path.exists(overlay_path):
+        return overlay_path
+
+    original_path = resolve_artifact_path(result_data.get('original_path'))
+    mask_path = resolve_artifact_path(result_data.get('mask_path'))
+    if not (original_path and mask_path and os.path.isfile(original_path) and os.path.isfile(mask_path)):
+        return None
+    try:
+        return render_overlay(original_path, mask_path, max_side)
+    except Exception as e:
+        print(f"Gagal membuat overlay untuk {original_path}: {e}")
+        return None
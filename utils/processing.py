@@ -8,7 +8,7 @@ from typing import Dict, Any, Optional, IO, Tuple
 
 # Impor dari modul utilitas lain dan konfigurasi
 from .config import config
-from .segmentation import prepare_input_tensor, predict_segmentation, detect_circle_roi
+from .segmentation import prepare_input_tensor, predict_segmentation, detect_circle_roi_geometry, render_roi_mask
 from .classification import predict_classification
 
 # Ambil konfigurasi yang relevan
@@ -28,6 +28,40 @@ def get_file_hash(file_like_object: IO[bytes]) -> str:
     file_like_object.seek(0)
     return sha256_hash.hexdigest()
 
+def get_frame_hash(frame: np.ndarray) -> str:
+    """
+    Menghitung hash SHA-256 langsung dari buffer piksel mentah sebuah frame.
+    Digunakan untuk frame live agar tidak perlu meng-encode PNG hanya demi hashing.
+    Dimensi dan tipe data ikut di-hash sehingga frame identik selalu
+    menghasilkan hash yang sama.
+    """
+    sha256_hash = hashlib.sha256()
+    sha256_hash.update(f"{frame.shape}|{frame.dtype}".encode('utf-8'))
+    sha256_hash.update(np.ascontiguousarray(frame).data)
+    return sha256_hash.hexdigest()
+
+def get_frame_fingerprint(frame: np.ndarray, size: int = 32) -> np.ndarray:
+    """
+    Membuat sidik jari ringan dari sebuah frame: citra grayscale yang diperkecil.
+    Digunakan untuk mendeteksi frame beku/duplikat tanpa menjalankan model.
+
+    Args:
+        frame (np.ndarray): Frame BGR (H, W, 3) atau grayscale (H, W).
+        size (int): Sisi (px) sidik jari yang dihasilkan.
+
+    Returns:
+        np.ndarray: Array int16 berukuran (size, size).
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+    return small.astype(np.int16)
+
+def get_fingerprint_distance(fingerprint_a: np.ndarray, fingerprint_b: np.ndarray) -> float:
+    """Menghitung rata-rata selisih absolut (skala 0-255) antara dua sidik jari frame."""
+    if fingerprint_a.shape != fingerprint_b.shape:
+        return float("inf")
+    return float(np.mean(np.abs(fingerprint_a - fingerprint_b)))
+
 def get_analysis_hash(
     file_hash: str,
     pipeline_hash: str,
@@ -159,7 +193,7 @@ def analyze_single_image(
     image: Image.Image,
     seg_model: nn.Module,
     cls_model: Any,
-    user_roi_mask: Optional[np.ndarray] = None
+    user_roi: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """
     Menganalisis satu gambar untuk segmentasi dan klasifikasi.
@@ -169,10 +203,13 @@ def analyze_single_image(
         image (Image.Image): Gambar input dalam format PIL.
         seg_model (nn.Module): Model segmentasi yang sudah dimuat.
         cls_model (Any): Model klasifikasi (YOLO) yang sudah dimuat.
-        user_roi_mask (Optional[np.ndarray]): Mask ROI dari pengguna (jika ada).
+        user_roi (Optional[Dict[str, Any]]): Geometri ROI dari pengguna (jika ada),
+            lihat `canvas_to_roi_geometry`.
 
     Returns:
-        Dict[str, Any]: Dictionary berisi semua hasil analisis.
+        Dict[str, Any]: Dictionary berisi semua hasil analisis, termasuk mask resolusi
+            model ('segmentation_mask_model') dan geometri ROI ('roi_geometry') untuk
+            penyimpanan mask yang ringkas (lihat utils/masks.py).
     """
     # Simpan versi integer (uint8) dari gambar
     np_img_uint8 = np.array(image)
@@ -180,7 +217,8 @@ def analyze_single_image(
     np_img_float = np.array(image) / 255.0
     
     # Tentukan ROI: gunakan dari pengguna jika ada, jika tidak, deteksi otomatis
-    roi_mask = user_roi_mask if user_roi_mask is not None else detect_circle_roi(np_img_float)
+    roi_geometry = user_roi if user_roi is not None else detect_circle_roi_geometry(np_img_float)
+    roi_mask = render_roi_mask(roi_geometry)
     
     # Proses Segmentasi
     # 1. Siapkan tensor input dari gambar asli
@@ -258,5 +296,8 @@ def analyze_single_image(
         "cloud_type_confidences": cloud_type_confidences,
         "raw_predictions": preds,
         "segmentation_mask": final_mask,
-        "roi_mask": roi_mask
+        "roi_mask": roi_mask,
+        "segmentation_mask_model": pred_seg,
+        "roi_geometry": roi_geometry,
+        "image_size": [image.height, image.width]
     }
\ No newline at end of file
@@ -0,0 +1,275 @@
+# utils/retention.py
+import os
+import time
+import shutil
+import hashlib
+import tarfile
+import threading
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+import streamlit as st
+from PIL import Image
+
+# Impor konfigurasi terpusat, fondasi database, blob store, pengumpul artefak, dan backend penyimpanan
+from .config import config
+from .database import get_retention_candidates, update_artifact_locations
+from .blobstore import release_blobs
+from .gc import PACKED_SEPARATOR, get_analysis_folder, is_packed_path
+from .storage import get_storage
+
+# Ambil konfigurasi yang relevan
+PATHS = config.get('paths', {})
+RETENTION_CONFIG = config.get('retention', {})
+ARCHIVE_DIR = PATHS.get('archive_dir', 'data/archive')
+PACK_DIR = PATHS.get('packed_archive', 'data/archive/packed')
+UNPACK_DIR = os.path.join(PATHS.get('temp_dir', 'temp'), "unpacked")
+
+# Tingkat penyimpanan (kolom history.storage_tier)
+TIER_FULL, TIER_COMPACT, TIER_PACKED = 0, 1, 2
+# Overlay video tidak bisa dirender ulang (butuh proses stiker FFmpeg), jadi tidak dibuang
+_REGENERABLE_OVERLAY_TYPES = ("image", "live_frame")
+
+class _IORateLimiter:
+    """Membatasi laju baca/tulis (byte per detik) agar retensi tidak bersaing dengan live capture."""
+
+    def __init__(self, bytes_per_sec: float):
+        self._bytes_per_sec = bytes_per_sec
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes: int):
+        """Mencatat I/O sebanyak `nbytes` dan tidur bila laju melebihi batas."""
+        if self._bytes_per_sec <= 0 or nbytes <= 0:
+            return
+        now = time.monotonic()
+        self._next_free = max(self._next_free, now) + nbytes / self._bytes_per_sec
+        delay = self._next_free - now
+        if delay > 0:
+            time.sleep(delay)
+
+def _get_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def artifact_exists(path: Optional[str]) -> bool:
+    """
+    Cek murah apakah artefak layak di-resolve: ada di disk, dikemas di arsip tar, atau
+    (backend penyimpanan objek) mungkin ada di bucket dan baru dipastikan saat di-resolve.
+    """
+    return bool(path) and (is_packed_path(path) or os.path.exists(path) or get_storage().is_remote)
+
+def resolve_artifact_path(path: Optional[str]) -> Optional[str]:
+    """
+    Mengubah path artefak menjadi path lokal yang bisa dibaca. Artefak yang sudah dikemas
+    ke arsip tar diekstrak sekali ke 'temp/unpacked' (dibersihkan oleh pembersih temp).
+    Artefak yang tidak ada di disk diambil dari backend penyimpanan objek melalui cache
+    bacanya (lihat utils/storage.py). Path biasa dikembalikan apa adanya.
+    """
+    if not is_packed_path(path):
+        if path and not os.path.exists(path) and get_storage().is_remote:
+            return get_storage().get_local_path(path)
+        return path
+    tar_path, member = path.split(PACKED_SEPARATOR, 1)
+    target_dir = os.path.join(UNPACK_DIR, hashlib.sha256(tar_path.encode("utf-8")).hexdigest()[:16])
+    local_path = os.path.join(target_dir, member)
+    if os.path.exists(local_path):
+        os.utime(local_path) # Tandai baru dipakai agar tidak dianggap kedaluwarsa oleh pembersih temp
+        return local_path
+    if not os.path.exists(tar_path):
+        return None
+    try:
+        with tarfile.open(tar_path, "r:*") as tar:
+            # Anggota berupa direktori (mask video) diekstrak beserta seluruh isinya
+            members = [m for m in tar.getmembers() if m.name == member or m.name.startswith(member.rstrip("/") + "/")]
+            # Filter 'data' (Python >= 3.11.4) menolak anggota berbahaya seperti path absolut
+            extract_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+            tar.extractall(target_dir, members=members, **extract_kwargs)
+        # extractall memulihkan mtime asli dari tar (bisa berbulan-bulan lalu); setel ke sekarang
+        # agar hasil ekstraksi tidak langsung dihapus pembersih temp berbasis usia
+        for m in members:
+            extracted = os.path.join(target_dir, m.name)
+            if os.path.lexists(extracted):
+                os.utime(extracted)
+    except (OSError, tarfile.TarError) as e:
+        print(f"Gagal mengekstrak '{member}' dari {tar_path}: {e}")
+        return None
+    return local_path if os.path.exists(local_path) else None
+
+def _downsample_original(path: str, limiter: _IORateLimiter) -> str:
+    """Menulis versi kecil citra asli (JPEG) di sebelahnya. Mengembalikan path baru; berkas lama tidak dihapus."""
+    max_side = int(RETENTION_CONFIG.get('downsample_max_side', 1024))
+    limiter.consume(os.path.getsize(path))
+    with Image.open(path) as img:
+        img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    base, _ = os.path.splitext(path)
+    new_path = f"{base}_small.jpg"
+    tmp_path = f"{new_path}.tmp"
+    img.save(tmp_path, format="JPEG", quality=int(RETENTION_CONFIG.get('downsample_quality', 85)))
+    os.replace(tmp_path, new_path)
+    limiter.consume(os.path.getsize(new_path))
+    return new_path
+
+def _compact_entry(entry: Dict[str, Any], limiter: _IORateLimiter) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Tingkat 1 (ringkas): perkecil citra asli dan buang overlay yang bisa dirender ulang.
+    Mask dipertahankan (sudah ringkas, lihat utils/masks.py).
+
+    Returns:
+        Tuple: (entri yang diperbarui, path lama yang dihapus SETELAH database diperbarui).
+    """
+    entry, obsolete = dict(entry), []
+    is_image = entry["media_type"] in _REGENERABLE_OVERLAY_TYPES
+    original_path, overlay_path = entry.get("original_path"), entry.get("overlay_path")
+
+    if is_image and original_path and os.path.isfile(original_path):
+        entry["original_path"] = _downsample_original(original_path, limiter).replace("\\", "/")
+        obsolete.append(original_path)
+    if is_image and overlay_path:
+        if os.path.exists(overlay_path):
+            limiter.consume(_get_size(overlay_path))
+            obsolete.append(get_analysis_folder(overlay_path) or overlay_path)
+        entry["overlay_path"] = None
+    entry["storage_tier"] = TIER_COMPACT
+    return entry, obsolete
+
+def _remove_paths(paths: List[str]):
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+def _pack_entries(day: str, entries: List[Dict[str, Any]], excluded: List[str], limiter: _IORateLimiter) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Tingkat 2 (dikemas): masukkan folder analisis entri-entri satu hari ke satu arsip tar
+    terkompresi. Path di database diganti menjadi '<tar>::<anggota>'. Path di `excluded`
+    (artefak usang hasil peringkasan) tidak ikut dikemas.
+
+    Returns:
+        Tuple: (entri yang diperbarui, folder yang dihapus SETELAH database diperbarui).
+    """
+    tar_dir = os.path.join(PACK_DIR, day[:4])
+    os.makedirs(tar_dir, exist_ok=True)
+    # Satu tar per batch (bukan per hari) agar run inkremental tidak perlu menambah ke tar yang sudah ada
+    tar_path = os.path.join(tar_dir, f"{day}_{entries[0]['id']}.tar.gz").replace("\\", "/")
+    tmp_path = f"{tar_path}.tmp"
+    excluded_names = {os.path.relpath(path, ARCHIVE_DIR).replace("\\", "/") for path in excluded}
+
+    packed, folders = [], []
+    # dereference: berkas asli bisa berupa tautan ke blob (utils/blobstore.py); isi berkasnya yang
+    # dikemas, bukan tautannya, karena blob dilepas setelah entri berpindah ke tingkat 2
+    with tarfile.open(tmp_path, "w:gz", dereference=True) as tar:
+        for entry in entries:
+            entry = dict(entry)
+            for key in ("original_path", "mask_path", "overlay_path"):
+                path = entry.get(key)
+                folder = get_analysis_folder(path) if path and not is_packed_path(path) else None
+                if not (folder and os.path.exists(path)):
+                    continue
+                if folder not in folders:
+                    limiter.consume(_get_size(folder))
+                    tar.add(folder, arcname=os.path.relpath(folder, ARCHIVE_DIR).replace("\\", "/"),
+                            filter=lambda info: None if info.name in excluded_names else info)
+                    folders.append(folder)
+                member = os.path.relpath(path, ARCHIVE_DIR).replace("\\", "/")
+                entry[key] = f"{tar_path}{PACKED_SEPARATOR}{member}"
+            entry["storage_tier"] = TIER_PACKED
+            packed.append(entry)
+    os.replace(tmp_path, tar_path)
+    return packed, folders
+
+def run_retention_pass(max_rows: Optional[int] = None) -> Dict[str, int]:
+    """
+    Menjalankan satu putaran retensi secara inkremental (tertua dulu, dibatasi `max_rows`):
+    1. Entri lebih tua dari 'full_days'  -> ringkas (tingkat 1).
+    2. Entri lebih tua dari 'pack_days'  -> dikemas ke tar harian (tingkat 2).
+    Database selalu diperbarui SEBELUM berkas lama dihapus, sehingga crash di tengah jalan
+    hanya meninggalkan berkas yatim yang dibersihkan rekonsiliasi arsip (utils/gc.py).
+
+    Returns:
+        Dict[str, int]: Jumlah entri yang diringkas dan dikemas.
+    """
+    limiter = _IORateLimiter(float(RETENTION_CONFIG.get('io_rate_mb_per_sec', 5)) * 1024 * 1024)
+    batch_size = int(RETENTION_CONFIG.get('batch_size', 50))
+    remaining = int(max_rows or RETENTION_CONFIG.get('max_rows_per_run', 1000))
+    now = time.time()
+    stats = {"compacted": 0, "packed": 0}
+
+    full_days = float(RETENTION_CONFIG.get('full_days', 30))
+    while full_days > 0 and remaining > 0:
+        candidates = get_retention_candidates(TIER_COMPACT, int(now - full_days * 86400), min(batch_size, remaining))
+        if not candidates:
+            break
+        updates, obsolete = [], []
+        for entry in candidates:
+            try:
+                updated, old_paths = _compact_entry(entry, limiter)
+                updates.append(updated)
+                obsolete.extend(old_paths)
+            except Exception as e:
+                print(f"Gagal meringkas artefak entri {entry['id']}: {e}")
+        update_artifact_locations(updates)
+        _remove_paths(obsolete)
+        release_blobs([entry["file_hash"] for entry in updates])
+        stats["compacted"] += len(updates)
+        remaining -= len(candidates)
+        if len(updates) < len(candidates):
+            break # Hindari mengulang entri yang gagal terus-menerus dalam satu putaran
+
+    pack_days = float(RETENTION_CONFIG.get('pack_days', 180))
+    while pack_days > 0 and remaining > 0:
+        candidates = get_retention_candidates(TIER_PACKED, int(now - pack_days * 86400), min(batch_size, remaining))
+        if not candidates:
+            break
+        by_day: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        obsolete = []
+        for entry in candidates:
+            try:
+                if entry["storage_tier"] < TIER_COMPACT:
+                    entry, old_paths = _compact_entry(entry, limiter)
+                    obsolete.extend(old_paths)
+                by_day[str(entry["analyzed_at"])[:10]].append(entry)
+            except Exception as e:
+                print(f"Gagal meringkas artefak entri {entry['id']}: {e}")
+        for day, entries in by_day.items():
+            packed, folders = _pack_entries(day, entries, obsolete, limiter)
+            update_artifact_locations(packed)
+            _remove_paths(folders)
+            release_blobs([entry["file_hash"] for entry in packed])
+            stats["packed"] += len(packed)
+        _remove_paths(obsolete)
+        remaining -= len(candidates)
+        if sum(len(entries) for entries in by_day.values()) < len(candidates):
+            break
+    return stats
+
+class _RetentionWorker:
+    """Thread latar yang menjalankan `run_retention_pass` secara berkala."""
+
+    def __init__(self):
+        self._interval = float(RETENTION_CONFIG.get('run_interval_minutes', 60)) * 60
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                stats = run_retention_pass()
+                if stats["compacted"] or stats["packed"]:
+                    print(f"Retensi arsip: {stats['compacted']} entri diringkas, {stats['packed']} entri dikemas.")
+            except Exception as e:
+                print(f"Error pada retensi arsip: {e}")
+            time.sleep(self._interval)
+
+@st.cache_resource
+def get_retention_worker() -> Optional[_RetentionWorker]:
+    """
+    Memulai thread retensi sekali per proses aplikasi. None jika retensi dinonaktifkan atau
+    artefak disimpan di penyimpanan objek (retensi bekerja pada pohon arsip lokal).
+    """
+    if not RETENTION_CONFIG.get('enabled', False) or get_storage().is_remote:
+        return None
+    return _RetentionWorker()
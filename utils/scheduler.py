@@ -0,0 +1,105 @@
+# utils/scheduler.py
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Impor konfigurasi terpusat
+from .config import config
+
+# Ambil konfigurasi yang relevan
+LIVE_CONFIG = config.get('live_monitoring', {})
+
+def get_node_load() -> float:
+    """
+    Mengembalikan beban rata-rata 1 menit per inti CPU (1.0 = semua inti penuh).
+    Mengembalikan 0.0 jika platform tidak mendukung `os.getloadavg` (misal Windows).
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+class AdaptiveScheduler:
+    """
+    Penjadwal siklus live monitoring yang sadar tenggat (deadline-aware).
+
+    Penjadwal melacak rata-rata bergerak (EMA) latensi analisis dan beban node.
+    Interval efektif diregangkan jika analisis lebih lambat dari interval yang
+    diminta atau node sedang jenuh. Siklus yang tenggatnya sudah terlewat
+    di-drop alih-alih dikejar, sehingga antrean kerja tidak menumpuk.
+    """
+
+    def __init__(self, requested_interval: float):
+        self.requested_interval = float(requested_interval)
+        self.ema_alpha = LIVE_CONFIG.get('latency_ema_alpha', 0.3)
+        self.headroom = LIVE_CONFIG.get('latency_headroom', 1.25)
+        self.max_load = LIVE_CONFIG.get('max_load_per_cpu', 1.0)
+        self.max_stretch = LIVE_CONFIG.get('max_interval_stretch', 4.0)
+
+        self.latency_ema: Optional[float] = None
+        self.dropped_ticks = 0
+        self._tick_start: Optional[float] = None
+        self._tick_starts = deque(maxlen=10)
+
+    def start_tick(self) -> None:
+        """Menandai awal sebuah siklus analisis."""
+        self._tick_start = time.monotonic()
+        self._tick_starts.append(self._tick_start)
+
+    def end_tick(self, latency: float) -> None:
+        """Memperbarui EMA latensi dengan durasi analisis siklus yang baru selesai."""
+        if self.latency_ema is None:
+            self.latency_ema = latency
+        else:
+            self.latency_ema = self.ema_alpha * latency + (1 - self.ema_alpha) * self.latency_ema
+
+    def effective_interval(self) -> float:
+        """Menghitung interval yang benar-benar dipakai setelah memperhitungkan latensi & beban node."""
+        interval = self.requested_interval
+
+        # Regangkan interval secara proporsional jika node jenuh (dibatasi max_stretch)
+        load = get_node_load()
+        if self.max_load > 0 and load > self.max_load:
+            interval *= min(load / self.max_load, self.max_stretch)
+
+        # Interval tidak boleh lebih pendek dari latensi analisis (plus cadangan)
+        if self.latency_ema is not None:
+            interval = max(interval, self.latency_ema * self.headroom)
+        return interval
+
+    def next_sleep(self) -> float:
+        """
+        Menghitung durasi tidur hingga tenggat siklus berikutnya.
+        Jika satu atau lebih tenggat sudah terlewat, siklus tersebut di-drop dan
+        penjadwal menunggu slot berikutnya pada grid interval efektif.
+        """
+        if self._tick_start is None:
+            return 0.0
+
+        interval = self.effective_interval()
+        elapsed = time.monotonic() - self._tick_start
+        if elapsed < interval:
+            return interval - elapsed
+
+        missed = int(elapsed // interval)
+        self.dropped_ticks += missed
+        return (missed + 1) * interval - elapsed
+
+    def achieved_interval(self) -> Optional[float]:
+        """Rata-rata jarak waktu antar-awal siklus yang benar-benar tercapai."""
+        if len(self._tick_starts) < 2:
+            return None
+        starts = list(self._tick_starts)
+        return (starts[-1] - starts[0]) / (len(starts) - 1)
+
+    def get_stats(self) -> Dict[str, Optional[float]]:
+        """Mengembalikan ringkasan kadensi untuk ditampilkan di UI."""
+        return {
+            "requested_interval": self.requested_interval,
+            "effective_interval": self.effective_interval(),
+            "achieved_interval": self.achieved_interval(),
+            "latency_ema": self.latency_ema,
+            "node_load": get_node_load(),
+            "dropped_ticks": self.dropped_ticks,
+        }
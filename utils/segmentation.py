@@ -152,15 +152,16 @@ def predict_segmentation(model: CloudDeepLabV3Plus, input_tensor: torch.Tensor)
         pred = model(input_tensor)["out"].squeeze().cpu().numpy()
     return (pred > threshold).astype(np.uint8)
 
-def detect_circle_roi(image_np: np.ndarray) -> np.ndarray:
+def detect_circle_roi_geometry(image_np: np.ndarray) -> Dict[str, Any]:
     """
-    Mendeteksi ROI melingkar dari gambar (misalnya, dari lensa fisheye).
+    Mendeteksi ROI melingkar dari gambar (misalnya, dari lensa fisheye) dan
+    mengembalikannya sebagai parameter geometri, bukan raster.
 
     Args:
         image_np (np.ndarray): Gambar input (H, W, C), dalam rentang float 0-1.
 
     Returns:
-        np.ndarray: Mask biner (0 atau 1) dengan area lingkaran berwarna putih.
+        Dict[str, Any]: Geometri ROI ({"size": [h, w], "shapes": [...]}), lihat `render_roi_mask`.
     """
     img_uint8 = (image_np * 255).astype(np.uint8)
     gray = cv2.cvtColor(img_uint8, cv2.COLOR_RGB2GRAY)
@@ -171,17 +172,47 @@ def detect_circle_roi(image_np: np.ndarray) -> np.ndarray:
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     if not contours:
-        return np.ones((h, w), dtype=np.uint8)
+        return {"size": [h, w], "shapes": [{"type": "full"}]}
         
     largest_contour = max(contours, key=cv2.contourArea)
     ((x, y), radius) = cv2.minEnclosingCircle(largest_contour)
+    return {"size": [h, w], "shapes": [{"type": "circle", "cx": int(x), "cy": int(y), "r": int(radius)}]}
+
+def render_roi_mask(roi_geometry: Dict[str, Any]) -> np.ndarray:
+    """
+    Menggambar geometri ROI menjadi mask biner (0 atau 1) seukuran 'size' geometri.
+    Bentuk yang didukung: full, circle (cx, cy, r), rect (x, y, w, h), polygon (points).
+    """
+    h, w = roi_geometry["size"]
     mask = np.zeros((h, w), dtype=np.uint8)
-    cv2.circle(mask, (int(x), int(y)), int(radius), 1, -1)
+    for shape in roi_geometry.get("shapes", []):
+        shape_type = shape.get("type")
+        if shape_type == "full":
+            mask[:, :] = 1
+        elif shape_type == "circle":
+            cv2.circle(mask, (shape["cx"], shape["cy"]), shape["r"], 1, -1)
+        elif shape_type == "rect":
+            mask[shape["y"]:shape["y"] + shape["h"], shape["x"]:shape["x"] + shape["w"]] = 1
+        elif shape_type == "polygon":
+            cv2.fillPoly(mask, [np.array(shape["points"], dtype=np.int32)], 1)
     return mask
 
-def canvas_to_mask(canvas_result: Any, height: int, width: int) -> np.ndarray:
+def detect_circle_roi(image_np: np.ndarray) -> np.ndarray:
     """
-    Mengonversi hasil dari streamlit-drawable-canvas menjadi mask numpy.
+    Mendeteksi ROI melingkar dari gambar (misalnya, dari lensa fisheye).
+
+    Args:
+        image_np (np.ndarray): Gambar input (H, W, C), dalam rentang float 0-1.
+
+    Returns:
+        np.ndarray: Mask biner (0 atau 1) dengan area lingkaran berwarna putih.
+    """
+    return render_roi_mask(detect_circle_roi_geometry(image_np))
+
+def canvas_to_roi_geometry(canvas_result: Any, height: int, width: int) -> Dict[str, Any]:
+    """
+    Mengonversi hasil dari streamlit-drawable-canvas menjadi geometri ROI
+    (koordinat dalam piksel gambar asli).
 
     Args:
         canvas_result (Any): Objek hasil dari `st_canvas`.
@@ -189,11 +220,11 @@ def canvas_to_mask(canvas_result: Any, height: int, width: int) -> np.ndarray:
         width (int): Lebar gambar asli.
 
     Returns:
-        np.ndarray: Mask biner (0 atau 1) berdasarkan gambar pengguna.
+        Dict[str, Any]: Geometri ROI ({"size": [h, w], "shapes": [...]}).
     """
-    mask = np.zeros((height, width), dtype=np.uint8)
+    geometry = {"size": [height, width], "shapes": []}
     if not (canvas_result and canvas_result.json_data and canvas_result.json_data.get("objects")):
-        return mask
+        return geometry
 
     canvas_h, canvas_w = canvas_result.image_data.shape[:2]
     scale_x, scale_y = width / canvas_w, height / canvas_h
@@ -203,12 +234,12 @@ def canvas_to_mask(canvas_result: Any, height: int, width: int) -> np.ndarray:
         if obj_type == "rect":
             l, t = int(obj["left"] * scale_x), int(obj["top"] * scale_y)
             w, h = int(obj["width"] * scale_x), int(obj["height"] * scale_y)
-            mask[t:t+h, l:l+w] = 1
+            geometry["shapes"].append({"type": "rect", "x": l, "y": t, "w": w, "h": h})
         elif obj_type == "path" and obj.get("path"):
             coords = [[int(item[1] * scale_x), int(item[2] * scale_y)] 
                       for item in obj["path"] if isinstance(item, list) and len(item) >= 3]
             if len(coords) >= 3:
-                cv2.fillPoly(mask, [np.array(coords, dtype=np.int32)], 1)
+                geometry["shapes"].append({"type": "polygon", "points": coords})
         elif obj_type == "line":
             left, top = float(obj.get("left", 0)), float(obj.get("top", 0))
             x1, y1 = int((left + obj["x1"]) * scale_x), int((top + obj["y1"]) * scale_y)
@@ -216,5 +247,19 @@ def canvas_to_mask(canvas_result: Any, height: int, width: int) -> np.ndarray:
             cx, cy = int((x1 + x2) / 2), int((y1 + y2) / 2)
             radius = int(np.sqrt((x2 - x1)**2 + (y2 - y1)**2) / 2)
             if 0 <= cx < width and 0 <= cy < height and radius > 0:
-                cv2.circle(mask, (cx, cy), radius, 1, -1)
-    return mask
\ No newline at end of file
+                geometry["shapes"].append({"type": "circle", "cx": cx, "cy": cy, "r": radius})
+    return geometry
+
+def canvas_to_mask(canvas_result: Any, height: int, width: int) -> np.ndarray:
+    """
+    Mengonversi hasil dari streamlit-drawable-canvas menjadi mask numpy.
+
+    Args:
+        canvas_result (Any): Objek hasil dari `st_canvas`.
+        height (int): Tinggi gambar asli.
+        width (int): Lebar gambar asli.
+
+    Returns:
+        np.ndarray: Mask biner (0 atau 1) berdasarkan gambar pengguna.
+    """
+    return render_roi_mask(canvas_to_roi_geometry(canvas_result, height, width))
@@ -0,0 +1,380 @@
+# utils/storage.py
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, IO, Iterator, List, Optional, Tuple
+
+import streamlit as st
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+except ImportError: # boto3 opsional; hanya dibutuhkan untuk backend 's3'
+    boto3 = TransferConfig = None
+
+# Impor konfigurasi terpusat, utilitas cache disk, dan tata letak blob store
+from .config import config
+from .system import evict_lru_cache
+from .blobstore import get_blob_path
+
+# Ambil konfigurasi yang relevan
+PATHS = config.get('paths', {})
+STORAGE_CONFIG = config.get('storage', {})
+CACHE_DIR = PATHS.get('storage_cache_dir', 'data/cache/storage')
+
+# Kolom riwayat yang menunjuk ke artefak
+_ARTIFACT_KEYS = ("original_path", "mask_path", "overlay_path")
+# Kode error S3 untuk objek yang tidak ada
+_NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+# Metadata objek penunjuk: citra/video asli yang ditautkan ke blob disimpan sebagai objek kosong
+# yang menunjuk ke kunci konten blob, sehingga isi berkas asli hanya ada sekali di bucket
+_BLOB_METADATA_KEY = "blob-key"
+
+def _normalize(path: str) -> str:
+    """Path artefak relatif terhadap direktori kerja dengan pemisah '/', sama seperti yang disimpan di database."""
+    return os.path.relpath(path).replace("\\", "/")
+
+def _remove_local(path: str):
+    """Menghapus berkas/direktori lokal; path yang sudah tidak ada dianggap berhasil."""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return str(code) in _NOT_FOUND_CODES
+
+class LocalStorage:
+    """
+    Driver disk lokal (perilaku bawaan aplikasi): kunci artefak adalah path relatif
+    terhadap direktori kerja, persis seperti yang disimpan di database.
+    """
+    is_remote = False
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    @contextmanager
+    def open_read(self, path: str) -> Iterator[IO[bytes]]:
+        """Membuka artefak untuk dibaca secara streaming."""
+        with open(path, "rb") as f:
+            yield f
+
+    @contextmanager
+    def open_write(self, path: str) -> Iterator[IO[bytes]]:
+        """Menulis artefak secara streaming; berkas baru terlihat setelah konteks selesai tanpa error."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                yield f
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def publish(self, local_path: str, blob_path: Optional[str] = None):
+        """Artefak sudah berada di lokasi akhirnya; tidak ada yang perlu diunggah."""
+        return None
+
+    def get_local_path(self, path: str) -> Optional[str]:
+        return path if os.path.exists(path) else None
+
+    def delete(self, path: str):
+        """Menghapus artefak (berkas, atau direktori beserta isinya)."""
+        _remove_local(path)
+
+class S3Storage:
+    """
+    Driver penyimpanan objek berbasis API S3 (AWS S3, MinIO, Ceph RGW, dll.) untuk beberapa
+    replika aplikasi yang berbagi satu bucket. Kunci objek = awalan + path artefak relatif,
+    sehingga path di database tidak berubah. Artefak dibaca melalui cache lokal (read-through,
+    LRU) agar replika tidak mengunduh ulang artefak yang sering dibuka.
+
+    Berkas asli yang ditautkan ke blob store diunggah SEKALI per isi, ke kunci path blob-nya
+    ('.../blobs/ab/cd/<hash>.<ext>'); kunci artefak per analisis hanya berisi objek penunjuk.
+    Blob store lokal (paths.blob_archive) tetap ada di setiap replika sebagai indeks dedupe sisi
+    tulis: dilepas bersama referensi terakhirnya dan disapu rekonsiliasi arsip seperti pada disk lokal.
+    """
+    is_remote = True
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        cache_dir: str = CACHE_DIR,
+        cache_max_mb: float = 4096,
+        multipart_threshold_mb: float = 16,
+        multipart_chunk_mb: float = 16,
+        max_concurrency: int = 4,
+        client: Any = None
+    ):
+        """
+        Args:
+            bucket (str): Nama bucket.
+            prefix (str): Awalan kunci objek (misal nama lingkungan).
+            endpoint_url (str, optional): Endpoint S3-compatible, misal 'http://localhost:9000' untuk MinIO.
+            region_name (str, optional): Region bucket.
+            cache_dir (str): Direktori cache baca lokal.
+            cache_max_mb (float): Batas ukuran cache baca.
+            multipart_threshold_mb (float): Berkas yang lebih besar diunggah/diunduh secara multipart.
+            multipart_chunk_mb (float): Ukuran tiap bagian multipart.
+            max_concurrency (int): Jumlah bagian multipart yang ditransfer bersamaan.
+            client: Klien S3 yang sudah dibuat (misal untuk pengujian); default dibuat dengan boto3.
+        """
+        if client is None:
+            if boto3 is None:
+                raise ImportError("Backend penyimpanan 's3' membutuhkan paket 'boto3' (pip install -r requirements-s3.txt).")
+            # Kredensial mengikuti rantai bawaan boto3 (variabel lingkungan AWS_*, ~/.aws, IAM role)
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix.strip("/")
+        self._cache_dir = cache_dir
+        self._cache_max_mb = cache_max_mb
+        self._multipart_threshold = int(float(multipart_threshold_mb) * 1024 * 1024)
+        self._transfer_config = TransferConfig(
+            multipart_threshold=self._multipart_threshold,
+            multipart_chunksize=int(float(multipart_chunk_mb) * 1024 * 1024),
+            max_concurrency=int(max_concurrency)
+        ) if TransferConfig else None
+
+    def _key(self, path: str) -> str:
+        return "/".join(part for part in (self._prefix, _normalize(path)) if part)
+
+    def _path(self, key: str) -> str:
+        """Kebalikan `_key`: path artefak dari kunci objek."""
+        return key[len(self._prefix) + 1:] if self._prefix else key
+
+    def _cache_path(self, path: str) -> str:
+        return os.path.join(self._cache_dir, _normalize(path))
+
+    def _list_objects(self, prefix: str) -> Iterator[Dict[str, Any]]:
+        """Semua objek di bawah `prefix` (per halaman, tanpa batas 1000 objek)."""
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=prefix):
+            yield from page.get("Contents", [])
+
+    def _list_keys(self, prefix: str) -> Iterator[str]:
+        return (obj["Key"] for obj in self._list_objects(prefix))
+
+    def _resolve_key(self, key: str) -> str:
+        """Kunci yang memuat isi objek: kunci blob untuk objek penunjuk, selain itu kunci itu sendiri."""
+        head = self._client.head_object(Bucket=self._bucket, Key=key)
+        return head.get("Metadata", {}).get(_BLOB_METADATA_KEY) or key
+
+    def _publish_blob(self, blob_path: str) -> str:
+        """
+        Mengunggah blob ke kunci kontennya hanya jika belum ada. Blob yang sudah ada disalin ke
+        dirinya sendiri agar LastModified-nya baru, sehingga pelepasan blob di replika lain
+        (yang melewati objek dalam masa tenggang) tidak menghapusnya sebelum entri ini di-commit.
+        """
+        key = self._key(blob_path)
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=key)
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+            self._client.upload_file(blob_path, self._bucket, key, Config=self._transfer_config)
+            return key
+        self._client.copy_object(
+            Bucket=self._bucket, Key=key, CopySource={"Bucket": self._bucket, "Key": key},
+            Metadata={}, MetadataDirective="REPLACE"
+        )
+        return key
+
+    def _download(self, key: str, target: str):
+        """Mengunduh satu objek (multipart untuk objek besar) ke `target` secara atomik."""
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        try:
+            self._client.download_file(self._bucket, key, tmp_path, Config=self._transfer_config)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def exists(self, path: str) -> bool:
+        key = self._key(path)
+        try:
+            self._client.head_object(Bucket=self._bucket, Key=key)
+            return True
+        except Exception as e:
+            if not _is_not_found(e):
+                raise
+        # Artefak berupa direktori (mask video) disimpan sebagai objek-objek di bawah awalan
+        return next(self._list_keys(key + "/"), None) is not None
+
+    @contextmanager
+    def open_read(self, path: str) -> Iterator[IO[bytes]]:
+        """Membuka objek untuk dibaca secara streaming langsung dari penyimpanan (tanpa cache)."""
+        body = self._client.get_object(Bucket=self._bucket, Key=self._resolve_key(self._key(path)))["Body"]
+        try:
+            yield body
+        finally:
+            body.close()
+
+    @contextmanager
+    def open_write(self, path: str) -> Iterator[IO[bytes]]:
+        """
+        Menulis objek secara streaming. Data ditampung di memori hingga ambang multipart lalu
+        di disk sementara, kemudian diunggah (multipart untuk data besar) saat konteks selesai.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=self._multipart_threshold) as f:
+            yield f
+            f.seek(0)
+            self._client.upload_fileobj(f, self._bucket, self._key(path), Config=self._transfer_config)
+
+    def publish(self, local_path: str, blob_path: Optional[str] = None):
+        """
+        Mengunggah artefak lokal (berkas atau direktori) ke kunci path-nya sendiri, lalu
+        memindahkan salinan lokal ke cache baca agar disk replika tetap dibatasi kuota cache.
+        Jika `blob_path` diberikan (artefak adalah tautan ke blob tersebut), isi blob diunggah
+        sekali ke kunci kontennya dan kunci artefak hanya berisi objek penunjuk.
+        """
+        if blob_path:
+            self._client.put_object(
+                Bucket=self._bucket, Key=self._key(local_path), Body=b"",
+                Metadata={_BLOB_METADATA_KEY: self._publish_blob(blob_path)}
+            )
+        else:
+            if os.path.isdir(local_path):
+                files = [os.path.join(root, name) for root, _, names in os.walk(local_path) for name in names]
+            else:
+                files = [local_path]
+            for file_path in files:
+                self._client.upload_file(file_path, self._bucket, self._key(file_path), Config=self._transfer_config)
+
+        cache_path = self._cache_path(local_path)
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        if os.path.lexists(cache_path):
+            _remove_local(cache_path)
+        shutil.move(local_path, cache_path)
+        try:
+            os.rmdir(os.path.dirname(local_path)) # Folder analisis lokal yang kini kosong
+        except OSError:
+            pass
+        evict_lru_cache(self._cache_dir, self._cache_max_mb, cache_path)
+
+    def get_local_path(self, path: str) -> Optional[str]:
+        """
+        Path lokal artefak di cache baca, diunduh lebih dulu jika belum ada.
+        None jika objek tidak ada di penyimpanan.
+        """
+        cache_path = self._cache_path(path)
+        key = self._key(path)
+        if os.path.isfile(cache_path):
+            os.utime(cache_path) # Tandai baru diakses (urutan LRU)
+            return cache_path
+
+        if not os.path.isdir(cache_path):
+            try:
+                self._download(self._resolve_key(key), cache_path)
+                evict_lru_cache(self._cache_dir, self._cache_max_mb, cache_path)
+                return cache_path
+            except Exception as e:
+                if not _is_not_found(e):
+                    raise
+
+        # Direktori (mask video): lengkapi anggota yang belum ada atau sudah tergusur dari cache
+        member_keys = list(self._list_keys(key + "/"))
+        if not member_keys:
+            return None
+        for member_key in member_keys:
+            target = os.path.join(cache_path, member_key[len(key) + 1:])
+            if os.path.isfile(target):
+                os.utime(target)
+            else:
+                self._download(member_key, target)
+        evict_lru_cache(self._cache_dir, self._cache_max_mb, cache_path)
+        return cache_path
+
+    def delete(self, path: str):
+        """Menghapus objek artefak (beserta semua objek di bawahnya untuk direktori) dan salinan lokalnya."""
+        key = self._key(path)
+        keys = [key] + list(self._list_keys(key + "/"))
+        for start in range(0, len(keys), 1000): # Batas delete_objects per permintaan
+            self._client.delete_objects(
+                Bucket=self._bucket,
+                Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]], "Quiet": True}
+            )
+        _remove_local(self._cache_path(path))
+        _remove_local(path)
+
+    def iter_objects(self, path_prefix: str = "") -> Iterator[Tuple[str, int, float]]:
+        """(path artefak, ukuran byte, waktu ubah epoch) setiap objek di bawah `path_prefix` (untuk rekonsiliasi)."""
+        prefix = self._key(path_prefix) if path_prefix else (f"{self._prefix}/" if self._prefix else "")
+        for obj in self._list_objects(prefix):
+            yield self._path(obj["Key"]), int(obj.get("Size", 0)), obj["LastModified"].timestamp()
+
+    def delete_objects(self, paths: List[str]):
+        """
+        Menghapus objek tepat pada path yang diberikan beserta salinannya di cache baca. Berbeda
+        dengan `delete`, berkas kerja lokal di path yang sama (misal blob lokal) tidak disentuh.
+        """
+        keys = [self._key(path) for path in paths]
+        for start in range(0, len(keys), 1000):
+            self._client.delete_objects(
+                Bucket=self._bucket,
+                Delete={"Objects": [{"Key": k} for k in keys[start:start + 1000]], "Quiet": True}
+            )
+        for path in paths:
+            _remove_local(self._cache_path(path))
+
+@st.cache_resource
+def get_storage():
+    """
+    Backend penyimpanan artefak sesuai 'storage.backend' ('local' atau 's3'), dibuat sekali
+    per proses aplikasi.
+    """
+    backend = str(STORAGE_CONFIG.get('backend', 'local')).lower()
+    if backend == 'local':
+        return LocalStorage()
+    if backend != 's3':
+        raise ValueError(f"Backend penyimpanan tidak dikenal: '{backend}' (pilihan: 'local', 's3').")
+
+    s3_config = STORAGE_CONFIG.get('s3', {})
+    return S3Storage(
+        bucket=s3_config['bucket'],
+        prefix=s3_config.get('prefix') or "",
+        endpoint_url=s3_config.get('endpoint_url'),
+        region_name=s3_config.get('region_name'),
+        cache_dir=CACHE_DIR,
+        cache_max_mb=float(STORAGE_CONFIG.get('cache_max_mb', 4096)),
+        multipart_threshold_mb=float(s3_config.get('multipart_threshold_mb', 16)),
+        multipart_chunk_mb=float(s3_config.get('multipart_chunk_mb', 16)),
+        max_concurrency=int(s3_config.get('max_concurrency', 4))
+    )
+
+def _get_linked_blob(path: str, file_hash: Optional[str]) -> Optional[str]:
+    """Path blob jika `path` adalah tautan (hardlink/symlink) ke blob `file_hash`; None untuk salinan biasa."""
+    if not file_hash or not os.path.isfile(path):
+        return None
+    blob_path = get_blob_path(file_hash, os.path.splitext(path)[1])
+    return blob_path if os.path.exists(blob_path) and os.path.samefile(path, blob_path) else None
+
+def publish_artifacts(result_data: Dict[str, Any]) -> List[str]:
+    """
+    Mengunggah artefak satu hasil analisis ke backend penyimpanan (no-op untuk disk lokal).
+    Panggil SETELAH artefak selesai ditulis dan SEBELUM entri riwayat di-commit, agar replika
+    lain tidak pernah melihat entri yang artefaknya belum ada di penyimpanan.
+
+    Returns:
+        List[str]: Path artefak yang diunggah.
+    """
+    storage = get_storage()
+    if not storage.is_remote:
+        return []
+    published = []
+    for key in _ARTIFACT_KEYS:
+        path = result_data.get(key)
+        if path and os.path.exists(path):
+            blob_path = _get_linked_blob(path, result_data.get("file_hash")) if key == "original_path" else None
+            storage.publish(path, blob_path)
+            published.append(path)
+    return published
@@ -1,62 +1,197 @@
 # utils/system.py
 import os
 import time
-from typing import List
+import threading
+from typing import Dict, Any, List, Optional
+
+import streamlit as st
 
 # Impor konfigurasi terpusat
 from .config import config
 
-def cleanup_temp_files(age_hours: int = 1) -> None:
-    """
-    Membersihkan file dan direktori kosong di dalam folder temp utama
-    yang lebih tua dari batas usia yang ditentukan.
+# Ambil konfigurasi yang relevan
+JANITOR_CONFIG = config.get('temp_janitor', {})
 
-    Fungsi ini akan menelusuri subdirektori yang relevan seperti 'reports',
-    'downloads', dan 'live_session_artefacts' secara rekursif.
+# Satu eviksi cache pada satu waktu; penulisan ke cache boleh bersamaan (berkas ditulis atomik)
+_eviction_lock = threading.Lock()
+# Perkiraan ukuran berjalan per direktori cache (byte), agar direktori hanya ditelusuri saat melewati batas
+_cache_sizes: Dict[str, int] = {}
+# Eviksi menurunkan cache hingga fraksi batas ini, sehingga sisipan berikutnya tidak langsung memicu penelusuran lagi
+_EVICTION_LOW_WATERMARK = 0.9
+
+def cleanup_temp_files(
+    age_hours: Optional[float] = None,
+    quota_mb: Optional[float] = None,
+    min_age_minutes: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Membersihkan folder temp utama dalam SATU kali penelusuran:
+    1. Hapus file yang lebih tua dari batas usia.
+    2. Jika total ukuran masih melebihi kuota, hapus file tertua lebih dulu hingga di bawah kuota
+       (file yang baru saja diubah dilewati karena mungkin masih ditulis/dipakai).
+    3. Hapus direktori kosong dari dalam ke luar.
 
     Args:
-        age_hours (int): Batas usia file dalam jam sebelum dihapus.
+        age_hours (float, optional): Batas usia file dalam jam sebelum dihapus.
+        quota_mb (float, optional): Batas ukuran total folder temp (0 = tanpa kuota).
+        min_age_minutes (float, optional): Usia minimum file yang boleh dihapus demi kuota.
+
+    Returns:
+        Dict[str, Any]: Ringkasan (total_bytes, file_count, deleted_files, deleted_dirs, freed_bytes).
     """
     # Ambil direktori temp utama dari config
     temp_dir = config.get('paths', {}).get('temp_dir', 'temp')
-    
+    age_seconds = float(age_hours if age_hours is not None else JANITOR_CONFIG.get('max_age_hours', 1)) * 3600
+    quota_bytes = float(quota_mb if quota_mb is not None else JANITOR_CONFIG.get('quota_mb', 2048)) * 1024 * 1024
+    min_age_seconds = float(min_age_minutes if min_age_minutes is not None else JANITOR_CONFIG.get('min_age_minutes', 5)) * 60
+    report = {"total_bytes": 0, "file_count": 0, "deleted_files": 0, "deleted_dirs": 0, "freed_bytes": 0}
+
     # Langsung keluar jika direktori temp tidak ada
     if not os.path.isdir(temp_dir):
-        return
+        return report
 
-    try:
-        age_seconds = age_hours * 3600
-        now = time.time()
-        deleted_files_count = 0
-        deleted_dirs_count = 0
+    now = time.time()
+    files: List[tuple] = []
+    dirs: List[str] = []
 
-        # --- TAHAP 1: Hapus semua FILE lama di dalam temp_dir dan subfolder-nya ---
-        for root, _, files in os.walk(temp_dir):
-            for name in files:
-                file_path = os.path.join(root, name)
+    def _remove(path: str, size: int):
+        try:
+            os.remove(path)
+            report["deleted_files"] += 1
+            report["freed_bytes"] += size
+            report["total_bytes"] -= size
+        except OSError:
+            pass
+
+    try:
+        # --- TAHAP 1: Satu kali penelusuran; file yang kedaluwarsa langsung dihapus ---
+        stack = [temp_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
                 try:
-                    if os.path.isfile(file_path):
-                        if (now - os.path.getmtime(file_path)) > age_seconds:
-                            os.remove(file_path)
-                            deleted_files_count += 1
-                except FileNotFoundError:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        dirs.append(entry.path)
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
                     continue
+                report["total_bytes"] += stat.st_size
+                report["file_count"] += 1
+                if now - stat.st_mtime > age_seconds:
+                    _remove(entry.path, stat.st_size)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
 
-        # --- TAHAP 2: Hapus semua DIREKTORI KOSONG dari dalam ke luar ---
-        for root, _, _ in os.walk(temp_dir, topdown=False):
-            # Pengaman: Jangan hapus folder temp utama itu sendiri
-            if root == temp_dir:
-                continue
-            
+        # --- TAHAP 2: Tegakkan kuota, file tertua lebih dulu ---
+        if quota_bytes > 0 and report["total_bytes"] > quota_bytes:
+            for mtime, size, path in sorted(files):
+                if report["total_bytes"] <= quota_bytes:
+                    break
+                if now - mtime < min_age_seconds:
+                    break # Sisa file terlalu baru (kemungkinan sedang dipakai)
+                _remove(path, size)
+
+        # --- TAHAP 3: Hapus semua DIREKTORI KOSONG dari dalam ke luar ---
+        # (urutan terbalik: subdirektori selalu tercatat setelah induknya)
+        for dir_path in reversed(dirs):
             try:
-                if not os.listdir(root):
-                    os.rmdir(root)
-                    deleted_dirs_count += 1
+                os.rmdir(dir_path) # Hanya berhasil jika direktori kosong
+                report["deleted_dirs"] += 1
             except OSError:
                 continue
 
-        if deleted_files_count > 0 or deleted_dirs_count > 0:
-            print(f"Pembersihan otomatis: {deleted_files_count} file dan {deleted_dirs_count} direktori kosong telah dihapus dari folder '{temp_dir}'.")
-            
+        if report["deleted_files"] > 0 or report["deleted_dirs"] > 0:
+            print(f"Pembersihan otomatis: {report['deleted_files']} file ({report['freed_bytes'] / 1e6:.1f} MB) dan {report['deleted_dirs']} direktori kosong telah dihapus dari folder '{temp_dir}'.")
+
     except Exception as e:
-        print(f"Error saat membersihkan file sementara: {e}")
\ No newline at end of file
+        print(f"Error saat membersihkan file sementara: {e}")
+    return report
+
+def _get_path_size(path: str) -> int:
+    """Ukuran berkas, atau total ukuran isi direktori."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+def evict_lru_cache(cache_dir: str, max_mb: float, keep_path: str):
+    """
+    Menghapus berkas cache yang paling lama tidak diakses hingga ukuran `cache_dir` di bawah
+    `max_mb`. `keep_path` (berkas/direktori yang baru dibuat, beserta isinya) tidak pernah dihapus.
+
+    Ukuran cache dilacak sebagai total berjalan yang ditambah ukuran `keep_path` setiap sisipan;
+    direktori hanya ditelusuri (dan total dikoreksi) saat total melewati batas. Penghapusan di luar
+    fungsi ini tidak dikurangkan, sehingga total hanya bisa terlalu besar (penelusuran lebih awal),
+    tidak pernah terlalu kecil.
+    """
+    max_bytes = float(max_mb) * 1024 * 1024
+    cache_key = os.path.abspath(cache_dir)
+    with _eviction_lock:
+        if cache_key in _cache_sizes:
+            try:
+                _cache_sizes[cache_key] += _get_path_size(keep_path)
+            except OSError:
+                pass
+            if _cache_sizes[cache_key] <= max_bytes:
+                return
+
+        entries, total_size = [], 0
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+        if total_size > max_bytes:
+            target_bytes = max_bytes * _EVICTION_LOW_WATERMARK
+            # LRU: mtime diperbarui setiap cache hit, jadi mtime tertua = paling lama tidak diakses
+            for _, size, path in sorted(entries):
+                if path == keep_path or path.startswith(keep_path + os.sep):
+                    continue
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    continue
+                if total_size <= target_bytes:
+                    break
+        _cache_sizes[cache_key] = total_size
+
+class _TempJanitor:
+    """
+    Thread latar tunggal yang menjalankan `cleanup_temp_files` paling banyak sekali per periode,
+    sehingga latensi interaksi UI tidak lagi bergantung pada ukuran folder temp.
+    """
+
+    def __init__(self):
+        self._interval = float(JANITOR_CONFIG.get('interval_minutes', 10)) * 60
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_run: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="temp-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.last_report = cleanup_temp_files()
+            self.last_run = time.time()
+            time.sleep(self._interval)
+
+@st.cache_resource
+def get_temp_janitor() -> _TempJanitor:
+    """Memulai pembersih folder temp di latar sekali per proses aplikasi."""
+    return _TempJanitor()
@@ -0,0 +1,149 @@
+# utils/thumbnails.py
+import os
+import base64
+import hashlib
+import mimetypes
+from typing import Dict, Any, IO, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Impor konfigurasi terpusat dan utilitas artefak
+from .config import config
+from .artifacts import get_artifact_extension, save_artifact
+from .masks import load_mask_and_roi
+from .media import get_preview_as_pil, get_preview_as_base64
+from .processing import create_enhanced_overlay
+from .retention import artifact_exists, is_packed_path, resolve_artifact_path
+from .gc import get_thumbnail_group
+from .system import evict_lru_cache
+
+# Ambil konfigurasi yang relevan
+THUMBNAIL_DIR = config.get('paths', {}).get('thumbnail_dir', 'data/cache/thumbnails')
+ARTIFACT_CONFIG = config.get('artifacts', {})
+
+def _get_max_size() -> Tuple[int, int]:
+    return tuple(ARTIFACT_CONFIG.get('thumbnail_max_size', [320, 320]))
+
+def _stat_key(*paths: str) -> str:
+    """
+    Kunci thumbnail dari path + mtime + ukuran artefak sumber (berubah jika artefak ditulis ulang).
+    Artefak di arsip tar retensi atau di penyimpanan objek tidak pernah ditulis ulang, jadi cukup
+    dikunci oleh path-nya (tanpa perlu diekstrak/diunduh hanya untuk mengecek thumbnail).
+    """
+    parts = []
+    for path in paths:
+        if is_packed_path(path) or not os.path.exists(path):
+            parts.append(path)
+            continue
+        stat = os.stat(path)
+        parts.append(f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+def _get_store_path(key: str, artifact_path: Optional[str] = None) -> str:
+    """
+    Path thumbnail di store. Thumbnail artefak disimpan di folder milik artefak tersebut
+    (lihat `get_thumbnail_group`) agar ikut dihapus pengumpul artefak; thumbnail unggahan
+    antrean disimpan terpisah dan hanya dibatasi usia/LRU.
+    """
+    extension = get_artifact_extension('thumbnail')
+    if artifact_path:
+        return os.path.join(get_thumbnail_group(artifact_path), f"{key}{extension}")
+    return os.path.join(THUMBNAIL_DIR, "uploads", key[:2], f"{key}{extension}")
+
+def _get_cached(thumb_path: str) -> Optional[str]:
+    """Mengembalikan thumbnail yang sudah ada (dan menandainya baru diakses untuk urutan LRU)."""
+    try:
+        os.utime(thumb_path)
+        return thumb_path
+    except OSError:
+        return None
+
+def _save_thumbnail(image: Image.Image, thumb_path: str) -> str:
+    save_artifact("thumbnail", image, thumb_path)
+    evict_lru_cache(THUMBNAIL_DIR, ARTIFACT_CONFIG.get('thumbnail_cache_max_mb', 256), thumb_path)
+    return thumb_path
+
+def get_thumbnail_path(path: Optional[str]) -> Optional[str]:
+    """
+    Thumbnail untuk satu artefak (gambar, video, atau direktori frame). Dibuat sekali
+    lalu dibaca dari store. None jika artefak tidak ada atau gagal dibaca.
+    """
+    if not artifact_exists(path):
+        return None
+    try:
+        thumb_path = _get_store_path(_stat_key(path), path)
+        if cached := _get_cached(thumb_path):
+            return cached
+        path = resolve_artifact_path(path)
+        if not path:
+            return None
+        pil_img = get_preview_as_pil(path, max_size=_get_max_size())
+        if pil_img is None:
+            return None
+        return _save_thumbnail(pil_img, thumb_path)
+    except Exception as e:
+        print(f"Gagal membuat thumbnail untuk '{path}': {e}")
+        return None
+
+def get_result_thumbnail(result_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Thumbnail overlay untuk satu hasil analisis. Overlay yang tersimpan di arsip (entri lama,
+    video) diperkecil langsung; overlay turunan dirender pada resolusi thumbnail dari citra
+    asli + mask, tanpa membuat overlay resolusi penuh.
+    """
+    overlay_path = result_data.get('overlay_path')
+    if overlay_path and artifact_exists(overlay_path):
+        return get_thumbnail_path(overlay_path)
+
+    original_path, mask_path = result_data.get('original_path'), result_data.get('mask_path')
+    if not all(artifact_exists(path) for path in (original_path, mask_path)):
+        return None
+    try:
+        thumb_path = _get_store_path(_stat_key(original_path, mask_path), original_path)
+        if cached := _get_cached(thumb_path):
+            return cached
+
+        # Artefak yang sudah dikemas oleh retensi arsip diekstrak hanya saat thumbnail belum ada
+        original_path, mask_path = resolve_artifact_path(original_path), resolve_artifact_path(mask_path)
+        if not (original_path and mask_path and os.path.isfile(original_path) and os.path.isfile(mask_path)):
+            return None
+
+        segmentation_mask, roi_mask = load_mask_and_roi(mask_path)
+        with Image.open(original_path) as img:
+            original = img.convert("RGB")
+        # Perkecil citra, lalu sesuaikan mask ke ukuran yang sama (citra asli bisa sudah
+        # diperkecil oleh retensi arsip sehingga ukurannya tidak lagi sama dengan mask)
+        original.thumbnail(_get_max_size(), Image.Resampling.LANCZOS)
+        size = original.size
+        small_mask = cv2.resize(segmentation_mask, size, interpolation=cv2.INTER_NEAREST)
+        small_roi = cv2.resize(roi_mask, size, interpolation=cv2.INTER_NEAREST) if roi_mask is not None else np.zeros_like(small_mask)
+        return _save_thumbnail(create_enhanced_overlay(original, small_mask, small_roi), thumb_path)
+    except Exception as e:
+        print(f"Gagal membuat thumbnail overlay untuk '{original_path}': {e}")
+        return None
+
+def get_upload_thumbnail(file: IO[bytes], file_hash: str) -> Optional[str]:
+    """Thumbnail untuk berkas unggahan di antrean (belum punya path di disk), dikunci oleh hash kontennya."""
+    thumb_path = _get_store_path(file_hash)
+    if cached := _get_cached(thumb_path):
+        return cached
+    try:
+        file.seek(0)
+        pil_img = get_preview_as_pil(file, max_size=_get_max_size())
+        file.seek(0)
+        if pil_img is None:
+            return None
+        return _save_thumbnail(pil_img, thumb_path)
+    except Exception as e:
+        print(f"Gagal membuat thumbnail untuk '{getattr(file, 'name', file_hash)}': {e}")
+        return None
+
+def get_thumbnail_as_base64(thumb_path: Optional[str]) -> str:
+    """Data URI Base64 dari berkas thumbnail apa adanya (tanpa decode/encode ulang); placeholder jika tidak ada."""
+    if not (thumb_path and os.path.exists(thumb_path)):
+        return get_preview_as_base64(None)
+    mime_type = mimetypes.guess_type(thumb_path)[0] or "image/jpeg"
+    with open(thumb_path, "rb") as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode()}"